@@ -0,0 +1 @@
+"""Microbenchmarks; run each module with python -m benchmarks.<name>."""
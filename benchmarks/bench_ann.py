@@ -0,0 +1,129 @@
+"""Compare recall@k and query latency of the vector store backends.
+
+Builds Chroma, the exact NumPy index and HNSW (over a sweep of ef_search)
+on the same synthetic clustered vectors, and measures recall against exact
+search plus per-query latency, unfiltered and with a metadata filter that
+keeps about 10% of the rows. MiniLM-sized (384-d) vectors by default.
+
+Usage:
+    python -m benchmarks.bench_ann [--rows 40000] [--dim 384] [--queries 200] [--k 4]
+                                   [--m 16] [--ef-construction 200] [--ef 16,32,64,128] [--skip-chroma]
+"""
+import argparse
+import tempfile
+import time
+import numpy as np
+from ingestion.metadata import MetadataColumns
+from ingestion.vector_index import HNSWIndex, NumpyIndex
+
+
+def make_vectors(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Unit vectors grouped around topic centres.
+
+    Sentence embeddings vary along few directions, so points spread over a
+    low-rank subspace plus a little isotropic noise; uniform random vectors
+    would understate what an ANN index achieves on real chunks.
+    """
+    rng = np.random.default_rng(seed)
+    basis_rng = np.random.default_rng(1234)
+    centers = basis_rng.normal(size=(clusters, dim))
+    basis = basis_rng.normal(size=(24, dim))
+    vectors = (
+        centers[rng.integers(0, clusters, rows)]
+        + 0.4 * rng.normal(size=(rows, 24)) @ basis
+        + 0.1 * rng.normal(size=(rows, dim))
+    )
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(a[:k]) & set(b)) / k for a, b in zip(found, truth)]))
+
+
+def timed(search, queries: np.ndarray):
+    """Run one search per query; return (results, p50 ms, p95 ms)."""
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.array(results), np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def report(name: str, build_s: float, results: np.ndarray, truth: np.ndarray, p50: float, p95: float) -> None:
+    print(f"{name:<22} build {build_s:>7.2f} s   recall@k {recall(results, truth):>6.3f}   p50 {p50:>7.3f} ms   p95 {p95:>7.3f} ms")
+
+
+def chroma_backend(vectors: np.ndarray, metadatas):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="bench_ann_"))
+    collection = client.create_collection("bench_ann")
+    ids = [str(i) for i in range(len(vectors))]
+    step = client.max_batch_size
+    for start in range(0, len(vectors), step):
+        collection.add(ids=ids[start:start + step], embeddings=vectors[start:start + step].tolist(), metadatas=metadatas[start:start + step])
+
+    def search(query, k, where=None):
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, where=where, include=[])
+        return [int(i) for i in result["ids"][0]]
+    return search
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=40000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ef", default="16,32,64,128", help="Comma-separated ef_search values")
+    parser.add_argument("--skip-chroma", action="store_true")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.rows, args.dim, args.clusters, seed=0)
+    queries = make_vectors(args.queries, args.dim, args.clusters, seed=1)
+    metadatas = [{"company": f"company_{i % 10}", "year": 2020 + i % 6} for i in range(args.rows)]
+    where = {"company": {"$eq": "company_3"}}
+    rows = MetadataColumns(metadatas).rows(where)
+    k = args.k
+
+    started = time.perf_counter()
+    exact = NumpyIndex()
+    exact.build(vectors)
+    numpy_build = time.perf_counter() - started
+    truth = exact.search(queries, k)[0]
+    truth_filtered = exact.search(queries, k, rows)[0]
+
+    print(f"{args.rows} vectors x {args.dim} dims, {args.queries} queries, k={k}; filter keeps {len(rows)} rows")
+    for label, row_filter, expected in (("unfiltered", None, truth), ("filtered", rows, truth_filtered)):
+        print(f"\n-- {label}")
+        results, p50, p95 = timed(lambda q: exact.search(q, k, row_filter)[0][0], queries)
+        report("numpy (exact)", numpy_build, results, expected, p50, p95)
+
+        if not args.skip_chroma:
+            if label == "unfiltered":
+                started = time.perf_counter()
+                chroma_search = chroma_backend(vectors, metadatas)
+                chroma_build = time.perf_counter() - started
+            results, p50, p95 = timed(lambda q: chroma_search(q, k, None if row_filter is None else where), queries)
+            report("chroma", chroma_build, results, expected, p50, p95)
+
+        if label == "unfiltered":
+            started = time.perf_counter()
+            hnsw = HNSWIndex(m=args.m, ef_construction=args.ef_construction)
+            hnsw.build(vectors)
+            hnsw_build = time.perf_counter() - started
+        for ef in [int(value) for value in args.ef.split(",")]:
+            hnsw.set_ef(ef)
+            results, p50, p95 = timed(lambda q: hnsw.search(q, k, row_filter)[0][0], queries)
+            report(f"hnsw M={args.m} ef={ef}", hnsw_build, results, expected, p50, p95)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Measure BM25 indexing and query latency on a synthetic corpus.
+
+Chunks draw words from a Zipf distribution (like real text, a few terms
+are very common and most are rare), and queries mix common and rare terms.
+Reports commit time plus p50/p95 query latency, unfiltered and with a
+metadata filter.
+
+Usage:
+    python -m benchmarks.bench_bm25 [--chunks 200000] [--words 120] [--vocab 50000] [--queries 200] [--k 20]
+"""
+import argparse
+import time
+import numpy as np
+from ingestion.bm25 import BM25Index
+
+
+def make_corpus(chunks: int, words: int, vocab: int, seed: int):
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=(chunks, words)), vocab) - 1
+    texts = [" ".join(f"w{rank}" for rank in row) for row in ranks]
+    metadatas = [{"company": f"company_{i % 10}"} for i in range(chunks)]
+    return texts, metadatas
+
+
+def timed(search, queries):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--words", type=int, default=120)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    texts, metadatas = make_corpus(args.chunks, args.words, args.vocab, seed=0)
+    index = BM25Index()
+    started = time.perf_counter()
+    index.add([str(i) for i in range(args.chunks)], texts, metadatas)
+    add_s = time.perf_counter() - started
+    started = time.perf_counter()
+    index.commit()
+    commit_s = time.perf_counter() - started
+
+    rng = np.random.default_rng(1)
+    queries = [
+        " ".join(f"w{rank}" for rank in np.concatenate([rng.integers(0, 50, 2), rng.integers(50, args.vocab, 3)]))
+        for _ in range(args.queries)
+    ]
+    where = {"company": {"$eq": "company_3"}}
+
+    stats = index.stats()
+    print(f"{args.chunks} chunks, {stats['terms']} terms, {stats['postings']} postings; "
+          f"add {add_s:.2f} s, commit {commit_s:.2f} s")
+    for label, clause in (("unfiltered", None), ("filtered", where)):
+        p50, p95 = timed(lambda q: index.search(q, args.k, clause), queries)
+        print(f"{label:<12} p50 {p50:>7.3f} ms   p95 {p95:>7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
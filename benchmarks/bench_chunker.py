@@ -0,0 +1,97 @@
+"""Measure chunking throughput on a synthetic corpus.
+
+Compares the previous chunker (a new RecursiveCharacterTextSplitter per
+document, one process) with text_processor.chunk_corpus (shared splitter,
+offsets, process pool). The corpus is generated and chunked in batches so
+a 1 GB run does not need the whole corpus in memory.
+
+Usage:
+    python -m benchmarks.bench_chunker --size-mb 1024 [--doc-kb 256] [--workers 0] [--mode chars]
+"""
+import argparse
+import random
+import time
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+import config
+from ingestion import text_processor
+
+_WORDS = (
+    "revenue growth margin quarter market share competitor cloud platform customers "
+    "guidance operating income forecast region demand pricing subscription enterprise "
+    "analytics expansion headcount churn retention pipeline backlog innovation"
+).split()
+
+
+def make_document(size: int, rng: random.Random) -> str:
+    """Filing-like text: sentences grouped into paragraphs."""
+    parts = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(8, 24))).capitalize() + ". "
+        if rng.random() < 0.15:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence)
+    return "".join(parts)[:size]
+
+
+def legacy_chunk(texts, chunk_size: int, chunk_overlap: int) -> int:
+    """The previous chunk_documents: one new splitter per document."""
+    count = 0
+    for text in texts:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+        count += len(splitter.split_text(text))
+    return count
+
+
+def run(name: str, chunk_batch, batches) -> None:
+    chars = chunks = 0
+    elapsed = 0.0
+    for texts in batches():
+        started = time.perf_counter()
+        chunks += chunk_batch(texts)
+        elapsed += time.perf_counter() - started
+        chars += sum(len(text) for text in texts)
+    mb = chars / 1e6
+    print(f"{name:<14} {mb:>8.0f} MB {elapsed:>8.1f} s {mb / elapsed:>8.1f} MB/s {chunks / elapsed:>10.0f} chunks/s"
+          f"   1 GB in ~{1000 / (mb / elapsed):.0f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=64, help="Corpus size (1024 for the 1 GB run)")
+    parser.add_argument("--doc-kb", type=int, default=256, help="Size of each synthetic document")
+    parser.add_argument("--batch-mb", type=float, default=64, help="Corpus generated and chunked per batch")
+    parser.add_argument("--workers", type=int, default=0, help="Chunking processes (0 = one per core)")
+    parser.add_argument("--mode", choices=["chars", "tokens"], default="chars")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    doc_size = args.doc_kb * 1000
+    docs_total = max(1, int(args.size_mb * 1e6 / doc_size))
+    docs_per_batch = max(1, int(args.batch_mb * 1e6 / doc_size))
+    workers = args.workers or None
+
+    def batches():
+        rng = random.Random(0)
+        for start in range(0, docs_total, docs_per_batch):
+            yield [make_document(doc_size, rng) for _ in range(min(docs_per_batch, docs_total - start))]
+
+    def corpus_batch(texts):
+        return sum(len(chunks) for chunks in text_processor.chunk_corpus(
+            texts, config.CHUNK_SIZE, config.CHUNK_OVERLAP, args.mode, workers=workers
+        ))
+
+    print(f"{docs_total} documents x {args.doc_kb} KB, chunk_size={config.CHUNK_SIZE}, overlap={config.CHUNK_OVERLAP}, mode={args.mode}")
+    if not args.skip_legacy and args.mode == "chars":
+        run("legacy", lambda texts: legacy_chunk(texts, config.CHUNK_SIZE, config.CHUNK_OVERLAP), batches)
+    run("chunk_corpus", corpus_batch, batches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare prompt size with and without context packing on a synthetic eval set.
+
+Generates market reports (one fact sentence per company metric, plus a
+disclaimer paragraph every report repeats), chunks them the way ingestion
+does and retrieves with BM25 for one question per fact. For each question
+it reports the prompt tokens of the plain concatenation of the retrieved
+chunks and of the packed context, and whether the fact sentence (the answer)
+is still in the prompt, so smaller prompts cannot come from dropping answers.
+
+Usage:
+    python -m benchmarks.bench_context [--companies 40] [--k 4,8] [--budget 1500]
+"""
+import argparse
+import random
+import time
+import numpy as np
+import config
+from langchain.schema import Document
+from chains.context_packer import estimate_tokens, pack_context
+from chains.qa_chain import _render_prompt
+from ingestion.bm25 import BM25Index
+from ingestion.metadata import chunk_metadata
+from ingestion.text_processor import chunk_text_with_offsets
+
+_METRICS = ("revenue", "operating margin", "market share", "customer count", "headcount", "R&D spend")
+_FILLER = (
+    "Demand in the enterprise segment remained steady while pricing pressure increased in mid-market deals. "
+    "Management expects the pipeline to convert at historical rates, subject to macroeconomic conditions. "
+    "The product roadmap focuses on workflow automation, analytics and integrations with partner platforms. "
+)
+_DISCLAIMER = (
+    "This report contains forward-looking statements that involve risks and uncertainties. Actual results may "
+    "differ materially from those projected. Figures are unaudited and may be revised in later filings. "
+)
+
+
+def make_reports(companies: int, seed: int):
+    """Reports and (question, answer sentence, file name) facts."""
+    rng = random.Random(seed)
+    reports, facts = [], []
+    for i in range(companies):
+        name = f"Company{i:03d}"
+        file_name = f"company{i:03d}_q3_2025.txt"
+        paragraphs = [f"{name} Market Report - Q3 2025\n"]
+        for metric in _METRICS:
+            value = f"{rng.randint(2, 95)}.{rng.randint(0, 9)}"
+            sentence = f"{name} reported {metric} of {value} in Q3 2025."
+            paragraphs.append(sentence + " " + _FILLER * rng.randint(1, 3))
+            facts.append((f"What was {name}'s {metric} in Q3 2025?", sentence, file_name))
+        paragraphs.append(_DISCLAIMER * 2)
+        reports.append((file_name, "\n\n".join(paragraphs)))
+    return reports, facts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--companies", type=int, default=40)
+    parser.add_argument("--k", default="4,8", help="Comma-separated chunk counts to retrieve")
+    parser.add_argument("--budget", type=int, default=config.CONTEXT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    reports, facts = make_reports(args.companies, seed=0)
+    index = BM25Index()
+    chunks = {}
+    for file_name, text in reports:
+        pieces = chunk_text_with_offsets(text)
+        metadatas = chunk_metadata(file_name, text, pieces, time.time())
+        ids = [f"{file_name}:{i}" for i in range(len(pieces))]
+        index.add(ids, [piece.text for piece in pieces], metadatas)
+        chunks.update({chunk_id: Document(page_content=piece.text, metadata=metadata)
+                       for chunk_id, piece, metadata in zip(ids, pieces, metadatas)})
+    index.commit()
+    print(f"{len(reports)} reports, {len(chunks)} chunks, {len(facts)} questions; budget {args.budget} tokens")
+
+    for k in [int(value) for value in args.k.split(",")]:
+        raw_tokens, packed_tokens, raw_hits, packed_hits, pack_ms = [], [], 0, 0, []
+        for question, answer, _ in facts:
+            docs = [chunks[chunk_id] for chunk_id, _ in index.search(question, k)]
+            raw = "\n\n".join(doc.page_content for doc in docs)
+            started = time.perf_counter()
+            packed = pack_context(docs, budget=args.budget)
+            pack_ms.append((time.perf_counter() - started) * 1000)
+            raw_tokens.append(estimate_tokens(_render_prompt(question, raw)))
+            packed_tokens.append(estimate_tokens(_render_prompt(question, packed.text)))
+            raw_hits += answer in raw
+            packed_hits += answer in packed.text
+        print(f"k={k:<3} prompt tokens: plain {np.mean(raw_tokens):>7.1f}  packed {np.mean(packed_tokens):>7.1f}  "
+              f"({1 - np.mean(packed_tokens) / np.mean(raw_tokens):.1%} smaller)   "
+              f"answer in prompt: plain {raw_hits}/{len(facts)}  packed {packed_hits}/{len(facts)}   "
+              f"pack p50 {np.percentile(pack_ms, 50):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
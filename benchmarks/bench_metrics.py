@@ -0,0 +1,59 @@
+"""Measure the per-span overhead of the request instrumentation.
+
+Times an empty block with and without a span around it, from one thread
+and from several threads recording into the same histogram, and reports
+the difference per span.
+
+Usage:
+    python -m benchmarks.bench_metrics [--spans 200000] [--threads 4]
+"""
+import argparse
+import threading
+import time
+from utils.metrics import REGISTRY, span
+
+
+def per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def bare(n: int) -> None:
+    for _ in range(n):
+        pass
+
+
+def spanned(n: int) -> None:
+    for _ in range(n):
+        with span("bench"):
+            pass
+
+
+def threaded(n: int, threads: int) -> float:
+    workers = [threading.Thread(target=spanned, args=(n,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (n * threads) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    spanned(1000)  # create the histogram child before timing
+    baseline = per_call_us(bare, args.spans)
+    single = per_call_us(spanned, args.spans)
+    contended = threaded(args.spans // args.threads, args.threads)
+    print(f"{args.spans} spans: {single - baseline:.2f} us per span (one thread), "
+          f"{contended - baseline:.2f} us per span ({args.threads} threads)")
+    REGISTRY.clear()
+
+
+if __name__ == "__main__":
+    main()
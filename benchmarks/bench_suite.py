@@ -0,0 +1,401 @@
+"""Offline end-to-end benchmark: ingestion plus load on every endpoint, against a stub Gemini.
+
+Generates a synthetic corpus of market reports (--chunks from 10^3 to
+10^6), ingests it the way the app does (create_vector_store: load, chunk,
+embed, Chroma upsert, BM25 and the in-process index) with a hashing
+encoder standing in for the embedding model, then drives each endpoint
+through the FastAPI app with --concurrency requests in flight. Gemini is
+replaced by benchmarks.stub_gemini with a fixed latency model, so runs
+need no network or API keys and are comparable across machines and
+commits.
+
+Writes a JSON report: ingestion chunks/s, p50/p95/p99 latency and
+throughput per endpoint, time-to-first-token for streams, mean time per
+pipeline stage and peak RSS. With --baseline, the run is compared against
+an earlier report and the exit status is 1 if any metric regressed by
+more than --tolerance.
+
+Usage:
+    python -m benchmarks.bench_suite [--chunks 1000] [--requests 50] [--concurrency 8]
+        [--endpoints qa,qa_stream,qa_batch,summary,extract,auto] [--store hnsw]
+        [--ttft-ms 200] [--tokens-per-s 100] [--output bench_results.json]
+        [--baseline bench_baseline.json] [--tolerance 0.15]
+    python -m benchmarks.bench_suite --compare bench_results.json --baseline bench_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import config
+from benchmarks.stub_gemini import StubGemini
+
+ENDPOINTS = ("qa", "qa_stream", "qa_batch", "summary", "extract", "auto")
+_METRICS = ("revenue", "operating margin", "market share", "customer count", "headcount", "R&D spend")
+_QUESTION_BATCH = 8
+_EXTRACT_SCHEMA = {"company_name": "string", "quarter": "string", "revenue": "number", "key_risks": "array"}
+
+# Metrics compared against a baseline, and whether higher is better
+_COMPARED = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput_rps": True}
+
+
+class HashingEncoder:
+    """
+    Stand-in for the SentenceTransformer: normalized hashed bag of words.
+
+    Deterministic and fast, so ingestion numbers measure the pipeline (chunking,
+    batching, Chroma writes, indexing) rather than the model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._buckets = {}
+
+    def _bucket(self, word: str) -> int:
+        bucket = self._buckets.get(word)
+        if bucket is None:
+            bucket = zlib.crc32(word.encode("utf-8")) % self.dim
+            self._buckets[word] = bucket
+        return bucket
+
+    def encode(self, texts, batch_size: int = 64, show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, self._bucket(word)] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def write_corpus(directory: str, chunks: int, seed: int, chunks_per_file: int = 50) -> Tuple[int, List[dict]]:
+    """
+    Write reports totalling about ``chunks`` chunks at the configured chunk size.
+
+    File names carry company, quarter and year (``company0007_q3_2025.txt``)
+    so chunks get filterable metadata. Returns the file count and the facts
+    (company, quarter, year, metric) that questions are drawn from.
+    """
+    rng = np.random.default_rng(seed)
+    stride = max(1, config.CHUNK_SIZE - config.CHUNK_OVERLAP)
+    files = max(1, -(-chunks // chunks_per_file))
+    per_file = max(1, chunks // files)
+    facts = []
+    for i in range(files):
+        company, quarter, year = f"company{i // 8:04d}", f"Q{i % 4 + 1}", 2024 + (i // 4) % 2
+        lines = [f"# {company} {quarter} {year} market report"]
+        size = 0
+        while size < per_file * stride:
+            metric = _METRICS[len(lines) % len(_METRICS)]
+            value, change = rng.integers(1, 900), rng.integers(-20, 40)
+            words = " ".join(f"w{rank}" for rank in np.minimum(rng.zipf(1.3, 60), 20000))
+            line = (f"{company} reported {metric} of ${value}M in {quarter} {year}, "
+                    f"{'up' if change >= 0 else 'down'} {abs(change)}% from the prior quarter. {words}.")
+            lines.append(line)
+            size += len(line) + 1
+            if len(facts) < 10000:
+                facts.append({"company": company, "quarter": quarter, "year": year, "metric": metric})
+        with open(os.path.join(directory, f"{company}_{quarter.lower()}_{year}.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    return files, facts
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+            "mean_ms": round(float(np.mean(values)), 2), "max_ms": round(float(np.max(values)), 2)}
+
+
+def _sse_events(body: str) -> List[Tuple[str, Any]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines.get("data", "null"))))
+    return events
+
+
+def _check(endpoint: str, response) -> Tuple[bool, Dict[str, Any]]:
+    """Whether the response succeeded, plus server-side timings for streams and batches."""
+    if response.status_code != 200:
+        return False, {}
+    if endpoint == "qa_stream":
+        events = _sse_events(response.text)
+        done = dict(events).get("done") or {}
+        return all(event != "error" for event, _ in events), {"ttft_ms": done.get("ttft_ms")}
+    if endpoint == "qa_batch":
+        lines = [json.loads(line) for line in response.text.splitlines() if line]
+        return lines[-1].get("failed") == 0, {}
+    body = response.json()
+    if endpoint == "qa" or (endpoint == "auto" and body.get("route") == "qa"):
+        answer = (body.get("result") or body).get("answer", "")
+        return not answer.startswith("Error"), {}
+    return True, {}
+
+
+def request_builders(facts: List[dict], corpus_dir: str) -> Dict[str, Callable[[int], Tuple[str, dict]]]:
+    """Per endpoint, a function from request number to (path, JSON body); the same number always builds the same request."""
+    texts = []
+    for name in sorted(os.listdir(corpus_dir))[:50]:
+        with open(os.path.join(corpus_dir, name), encoding="utf-8") as f:
+            texts.append(f.read())
+
+    def question(i: int) -> str:
+        fact = facts[i * 7919 % len(facts)]
+        return f"What was {fact['company']}'s {fact['metric']} in {fact['quarter']} {fact['year']}? (#{i})"
+
+    def passage(i: int) -> str:
+        # Mostly single-call summaries; every fourth one is long enough for map-reduce
+        text = texts[i % len(texts)]
+        length = 9000 if i % 4 == 3 else 800 + i * 397 % 1700
+        return text[:length]
+
+    return {
+        "qa": lambda i: ("/api/v1/qa", {"question": question(i)}),
+        "qa_stream": lambda i: ("/api/v1/qa/stream", {"question": question(i)}),
+        "qa_batch": lambda i: ("/api/v1/qa/batch", {"questions": [question(i * _QUESTION_BATCH + j) for j in range(_QUESTION_BATCH)]}),
+        "summary": lambda i: ("/api/v1/summary", {"text": passage(i), "max_length": 150}),
+        "extract": lambda i: ("/api/v1/extract", {"text": passage(i)[:2000], "schema": _EXTRACT_SCHEMA}),
+        "auto": lambda i: ("/api/v1/auto", {"question": question(i)}),
+    }
+
+
+async def run_load(client, endpoint: str, build: Callable[[int], Tuple[str, dict]], requests: int, concurrency: int) -> dict:
+    """Closed-loop load: ``concurrency`` clients each send their next request as soon as the last returns."""
+    latencies, ttfts = [], []
+    errors = 0
+    numbers = iter(range(requests))
+
+    async def client_loop():
+        nonlocal errors
+        for i in numbers:
+            path, body = build(i)
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok, timings = _check(endpoint, response)
+            except Exception as e:
+                print(f"⚠️  {endpoint} request failed: {str(e)}")
+                ok, timings = False, {}
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += 0 if ok else 1
+            if timings.get("ttft_ms") is not None:
+                ttfts.append(timings["ttft_ms"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(max(1, concurrency))])
+    wall = time.perf_counter() - started
+    result = {"requests": requests, "errors": errors, "wall_s": round(wall, 3),
+              "throughput_rps": round(requests / wall, 2) if wall > 0 else None, **percentiles(latencies)}
+    if endpoint == "qa_batch":
+        result["questions_per_s"] = round(requests * _QUESTION_BATCH / wall, 2) if wall > 0 else None
+    if ttfts:
+        result["ttft"] = percentiles(ttfts)
+    return result
+
+
+def stage_means() -> Dict[str, Dict[str, dict]]:
+    """Mean milliseconds and count per endpoint and stage, from the request metrics."""
+    from utils.metrics import STAGE_SECONDS
+
+    stages = {}
+    for (endpoint, stage), (count, total) in STAGE_SECONDS.totals().items():
+        if count:
+            stages.setdefault(endpoint, {})[stage] = {"count": count, "mean_ms": round(total / count * 1000, 3)}
+    return stages
+
+
+def _configure(workdir: str, args) -> None:
+    """Point every data path at the work directory and pick the benchmarked features."""
+    config.DOCUMENTS_DIR = os.path.join(workdir, "documents")
+    config.VECTORSTORE_DIR = os.path.join(workdir, "vectorstore")
+    config.CHROMA_PERSIST_DIR = os.path.join(config.VECTORSTORE_DIR, "chroma_db")
+    config.VECTOR_INDEX_DIR = os.path.join(config.VECTORSTORE_DIR, "index")
+    config.BM25_INDEX_PATH = os.path.join(config.VECTORSTORE_DIR, "bm25")
+    config.INGEST_MANIFEST_PATH = os.path.join(config.VECTORSTORE_DIR, "ingest_manifest.json")
+    config.VECTOR_STORE_TYPE = args.store
+    config.LLM_CACHE_DISK_PATH = ""
+    # Every request should reach the stub unless caching is what is being measured
+    config.LLM_CACHE_ENABLED = args.cache
+    config.SEMANTIC_CACHE_ENABLED = args.cache
+    # The cross-encoder needs a model download
+    config.RERANK_ENABLED = False
+    # Measure the app, not the account's Gemini quota
+    config.LLM_REQUESTS_PER_MINUTE = 0
+    config.LLM_TOKENS_PER_MINUTE = 0
+    os.makedirs(config.DOCUMENTS_DIR, exist_ok=True)
+    os.makedirs(config.VECTORSTORE_DIR, exist_ok=True)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception:
+        return ""
+
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as workdir:
+        _configure(workdir, args)
+        from ingestion import vector_store
+
+        started = time.perf_counter()
+        files, facts = write_corpus(config.DOCUMENTS_DIR, args.chunks, args.seed)
+        corpus_s = time.perf_counter() - started
+        print(f"📝 Wrote {files} reports in {corpus_s:.1f} s")
+
+        vector_store._embedding_model = HashingEncoder()
+        started = time.perf_counter()
+        store = vector_store.create_vector_store()
+        ingest_s = time.perf_counter() - started
+        chunks = store._collection.count()
+        vector_store.get_store_registry().swap(store)
+        ingestion = {
+            "files": files,
+            "chunks": chunks,
+            "seconds": round(ingest_s, 3),
+            "chunks_per_s": round(chunks / ingest_s, 1) if ingest_s > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"🧩 Ingested {chunks} chunks in {ingest_s:.1f} s ({ingestion['chunks_per_s']} chunks/s)")
+
+        import httpx
+        from main import app
+        from utils.metrics import REGISTRY
+
+        # One log line per request would drown the report
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        REGISTRY.clear()
+        stub = StubGemini(ttft_ms=args.ttft_ms, tokens_per_s=args.tokens_per_s, output_tokens=args.output_tokens,
+                          jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+        builders = request_builders(facts, config.DOCUMENTS_DIR)
+
+        async def drive():
+            results = {}
+            async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+                for endpoint in args.endpoints:
+                    requests = max(1, args.requests // _QUESTION_BATCH) if endpoint == "qa_batch" else args.requests
+                    results[endpoint] = await run_load(client, endpoint, builders[endpoint], requests, args.concurrency)
+                    r = results[endpoint]
+                    print(f"🚀 {endpoint:<10} {r['requests']:>5} req  {r['throughput_rps']:>7} req/s  "
+                          f"p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  errors {r['errors']}")
+            return results
+
+        with stub.installed():
+            endpoints = asyncio.run(drive())
+
+    return {
+        "version": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "compare")},
+        "ingestion": ingestion,
+        "endpoints": endpoints,
+        "stages": stage_means(),
+        "stub": stub.stats(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """
+    Metric-by-metric comparison with a baseline report.
+
+    Returns one row per metric present in both, with ``regressed`` set when
+    it got worse by more than ``tolerance`` (a fraction of the baseline).
+    """
+    pairs = [("ingestion.chunks_per_s", results["ingestion"].get("chunks_per_s"), baseline["ingestion"].get("chunks_per_s"), True),
+             ("peak_rss_mb", results.get("peak_rss_mb"), baseline.get("peak_rss_mb"), False)]
+    for endpoint, current in results["endpoints"].items():
+        previous = baseline["endpoints"].get(endpoint)
+        if previous is None:
+            continue
+        for metric, higher_is_better in _COMPARED.items():
+            pairs.append((f"{endpoint}.{metric}", current.get(metric), previous.get(metric), higher_is_better))
+
+    rows = []
+    for name, current, previous, higher_is_better in pairs:
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        rows.append({"metric": name, "baseline": previous, "current": current,
+                     "change": round(change, 4), "regressed": worse > tolerance})
+    return rows
+
+
+def _print_comparison(rows: List[dict], tolerance: float) -> None:
+    print(f"\nComparison with baseline (tolerance {tolerance:.0%}):")
+    for row in rows:
+        flag = "❌ REGRESSED" if row["regressed"] else "✅"
+        print(f"  {row['metric']:<28} {row['baseline']:>10} -> {row['current']:>10}  {row['change']:+8.1%}  {flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=1000, help="Corpus size in chunks (1000 to 1000000)")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per endpoint (qa_batch sends requests/8 batches of 8)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--endpoints", type=lambda s: [e for e in s.split(",") if e], default=list(ENDPOINTS))
+    parser.add_argument("--store", choices=("chroma", "numpy", "hnsw"), default=config.VECTOR_STORE_TYPE)
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM response and semantic caches on")
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="Stub Gemini time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=100.0, help="Stub Gemini generation speed")
+    parser.add_argument("--output-tokens", type=int, default=60, help="Stub Gemini reply length")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--compare", help="Compare this report with --baseline without running")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative regression")
+    args = parser.parse_args()
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        with open(args.compare, encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📊 Wrote {args.output} (peak RSS {results['peak_rss_mb']} MB)")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        settings, previous = results.get("settings", {}), baseline.get("settings", {})
+        differing = sorted(key for key in set(settings) | set(previous) if settings.get(key) != previous.get(key))
+        if differing:
+            print(f"⚠️  Baseline was run with different settings ({', '.join(differing)}); differences may not be regressions")
+        rows = compare(results, baseline, args.tolerance)
+        _print_comparison(rows, args.tolerance)
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
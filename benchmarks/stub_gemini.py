@@ -0,0 +1,159 @@
+"""Offline stand-in for the Gemini API, for benchmarks and load tests.
+
+``StubGemini`` replaces the Gemini client pool and model discovery in
+``chains.gemini_helper``, so every chain runs unchanged (response cache,
+retries, streaming, metrics) while generation costs a configurable delay
+instead of a network call: ``ttft_ms`` before the first token, then
+``tokens_per_s``. Replies are deterministic and shaped like real ones:
+JSON with the schema's fields for extraction prompts, one tool name for
+routing prompts and prose otherwise.
+
+Usage:
+    with StubGemini(ttft_ms=200, tokens_per_s=100).installed():
+        ...  # answer_question_async(...), the FastAPI app, etc.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+import config
+from chains import gemini_helper
+
+_SCHEMA_FIELD = re.compile(r'^\s+"(\w+)": <(\w+)>$', re.MULTILINE)
+_WORDS = (
+    "revenue grew steadily while operating margin improved as the company expanded its enterprise customer base "
+    "and invested in product analytics pricing discipline and partner integrations across core markets"
+).split()
+_FIELD_VALUES = {"string": "stub", "number": 42, "integer": 42, "boolean": True, "array": [], "object": {}}
+
+
+class _Text:
+    """Response or stream chunk with the ``text`` attribute the SDK exposes."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StubStream:
+    def __init__(self, pieces: List[str], delays: List[float]):
+        self._pieces = pieces
+        self._delays = delays
+
+    async def __aiter__(self):
+        for piece, delay in zip(self._pieces, self._delays):
+            await asyncio.sleep(delay)
+            yield _Text(piece)
+
+
+class _StubModel:
+    """Mimics ``genai.GenerativeModel`` for the calls gemini_helper makes."""
+
+    def __init__(self, stub: "StubGemini", name: str):
+        self._stub = stub
+        self.model_name = name
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        text, delay = self._stub._reply(prompt)
+        time.sleep(delay)
+        return _Text(text)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, request_options=None):
+        text, delay = self._stub._reply(prompt)
+        if not stream:
+            await asyncio.sleep(delay)
+            return _Text(text)
+        pieces, delays = self._stub._split(text)
+        return _StubStream(pieces, delays)
+
+
+class StubGemini:
+    """
+    Simulated Gemini backend with a fixed latency model.
+
+    Args:
+        ttft_ms: Delay before the first token.
+        tokens_per_s: Generation speed after the first token (words count as tokens).
+        output_tokens: Length of prose replies.
+        jitter: Relative random spread applied to each delay (0.1 = +/-10%).
+        error_rate: Fraction of calls that raise, to exercise retry and error paths.
+        seed: Seed for jitter and errors, so runs are repeatable.
+    """
+
+    models = ["gemini-2.5-flash", "gemini-1.5-flash-002", "gemini-pro"]
+
+    def __init__(self, ttft_ms: float = 200.0, tokens_per_s: float = 100.0, output_tokens: int = 60,
+                 jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0, chunk_tokens: int = 8):
+        self.ttft_ms = ttft_ms
+        self.tokens_per_s = tokens_per_s
+        self.output_tokens = output_tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_tokens = chunk_tokens
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "errors": 0, "prompt_chars": 0, "output_tokens": 0}
+
+    def _scale(self, seconds: float) -> float:
+        if not self.jitter:
+            return seconds
+        with self._lock:
+            return seconds * (1 + self._rng.uniform(-self.jitter, self.jitter))
+
+    def _reply(self, prompt: str):
+        """Reply text and total generation delay for a prompt; raises for simulated failures."""
+        prompt = str(prompt)
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["prompt_chars"] += len(prompt)
+            failed = self.error_rate > 0 and self._rng.random() < self.error_rate
+            if failed:
+                self._stats["errors"] += 1
+        if failed:
+            raise RuntimeError("503 Service Unavailable (stub Gemini simulated failure)")
+
+        if "Output format (valid JSON only)" in prompt:
+            fields = {name: _FIELD_VALUES.get(kind, None) for name, kind in _SCHEMA_FIELD.findall(prompt)}
+            text = json.dumps(fields)
+        elif "respond with only one word" in prompt:
+            text = "qa"
+        else:
+            text = " ".join(_WORDS[i % len(_WORDS)] for i in range(self.output_tokens)) + "."
+        tokens = len(text.split())
+        with self._lock:
+            self._stats["output_tokens"] += tokens
+        return text, self._scale(self.ttft_ms / 1000 + tokens / self.tokens_per_s)
+
+    def _split(self, text: str):
+        """Stream pieces of chunk_tokens words, with the delay before each."""
+        words = text.split(" ")
+        pieces = [" ".join(words[i:i + self.chunk_tokens]) + " " for i in range(0, len(words), self.chunk_tokens)]
+        pieces[-1] = pieces[-1].rstrip()
+        delays = [self._scale(self.ttft_ms / 1000)]
+        delays += [self._scale(self.chunk_tokens / self.tokens_per_s) for _ in pieces[1:]]
+        return pieces, delays
+
+    def model(self, name: str) -> _StubModel:
+        return _StubModel(self, name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+    @contextmanager
+    def installed(self) -> Iterator["StubGemini"]:
+        """Route gemini_helper's client pool and model discovery to this stub for the block."""
+        saved = (config.GEMINI_API_KEY, gemini_helper.get_generative_model, gemini_helper._fetch_models)
+        config.GEMINI_API_KEY = "stub-gemini-key"
+        gemini_helper.get_generative_model = self.model
+        gemini_helper._fetch_models = lambda: list(self.models)
+        gemini_helper.refresh_model_cache()
+        try:
+            yield self
+        finally:
+            config.GEMINI_API_KEY, gemini_helper.get_generative_model, gemini_helper._fetch_models = saved
+            gemini_helper._model_cache.update({"models": [], "ok": False, "expires_at": 0.0})
+            gemini_helper._resolved_models.clear()
@@ -1,15 +1,14 @@
 """Autonomous router chain to select the best tool for a user query."""
 from typing import Literal
-from chains.gemini_helper import ask_gemini
+from chains.gemini_helper import ask_gemini, ask_gemini_async
+from chains.local_router import get_local_router
+import config
+from utils.concurrency import run_in_embedding_pool
+from utils.metrics import span
 
 
-def route_query(user_input: str) -> Literal["qa", "summary", "extract"]:
-    """
-    Decide which tool to use: qa, summary, or extract.
-
-    Uses a lightweight Gemini model prompt to pick the tool.
-    Returns strictly one of: "qa", "summary", "extract".
-    """
+def build_router_prompt(user_input: str) -> str:
+    """Build the one-word routing prompt for Gemini."""
     instruction = (
         "You are a router that decides which tool best answers a user query.\n"
         "Tools:\n- qa: answer questions using retrieval over documents\n"
@@ -19,7 +18,7 @@ def route_query(user_input: str) -> Literal["qa", "summary", "extract"]:
         "No punctuation, no extra words."
     )
 
-    prompt = f"""
+    return f"""
 {instruction}
 
 User query:
@@ -28,8 +27,9 @@ User query:
 Answer (one word):
 """.strip()
 
-    # Prefer a fast model; gemini_helper will normalize and fallback as needed
-    response = ask_gemini(prompt, model="gemini-1.5-flash", temperature=0.0)
+
+def parse_route(response: str) -> Literal["qa", "summary", "extract"]:
+    """Map the router's reply to one of the tool names."""
     answer = (response or "").strip().lower()
 
     if "extract" in answer:
@@ -39,3 +39,56 @@ Answer (one word):
     return "qa"
 
 
+def _local_route(user_input: str):
+    """Return (local route, confident) from the local router, or (None, False) when it is disabled."""
+    if not config.ROUTER_LOCAL_ENABLED:
+        return None, False
+    local = get_local_router()
+    with span("local_route"):
+        route, confidence = local.route(user_input)
+    if local.is_confident(confidence):
+        local.record(route)
+        return route, True
+    return route, False
+
+
+def _record_fallback(local_route, llm_route: str) -> None:
+    if local_route is not None:
+        get_local_router().record(local_route, llm_route)
+
+
+def route_query(user_input: str, use_cache: bool = True) -> Literal["qa", "summary", "extract"]:
+    """
+    Decide which tool to use: qa, summary, or extract.
+
+    The local router (keyword rules, length heuristics, embedding
+    centroids) decides when it is confident; otherwise a lightweight
+    Gemini model prompt picks the tool.
+    Returns strictly one of: "qa", "summary", "extract".
+    """
+    local_route, confident = _local_route(user_input)
+    if confident:
+        return local_route
+
+    # Prefer a fast model; gemini_helper will normalize and fallback as needed
+    response = ask_gemini(build_router_prompt(user_input), model="gemini-1.5-flash", temperature=0.0, use_cache=use_cache)
+    route = parse_route(response)
+    _record_fallback(local_route, route)
+    return route
+
+
+async def route_query_async(user_input: str, use_cache: bool = True) -> Literal["qa", "summary", "extract"]:
+    """
+    Async variant of route_query.
+
+    The local router runs in the embedding pool: its centroid vote encodes
+    the query (and the seed examples on first use) with sentence-transformers.
+    """
+    local_route, confident = await run_in_embedding_pool(_local_route, user_input)
+    if confident:
+        return local_route
+
+    response = await ask_gemini_async(build_router_prompt(user_input), model="gemini-1.5-flash", temperature=0.0, use_cache=use_cache)
+    route = parse_route(response)
+    _record_fallback(local_route, route)
+    return route
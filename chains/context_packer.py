@@ -0,0 +1,228 @@
+"""Assemble retrieved chunks into a compact, token-budgeted prompt context."""
+import re
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+import config
+
+# Gemini averages about 4 characters per token on English text; counting
+# exactly would need a network round trip per prompt
+CHARS_PER_TOKEN = 4
+
+# Passages are joined with this separator in the prompt
+PASSAGE_SEPARATOR = "\n\n"
+
+# Word n-gram size used to detect near-duplicate passages
+_SHINGLE_SIZE = 5
+
+# A passage cut to fit the budget must keep at least this many tokens
+_MIN_PARTIAL_TOKENS = 48
+
+# Sentences shorter than this are never dropped as repeats ("Q3 2025.", headings)
+_MIN_SENTENCE_WORDS = 6
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"[.!?](?:\s|$)")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])(\s+)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated Gemini token count of text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+class Passage(NamedTuple):
+    """A span of one source built from one or more retrieved chunks."""
+    text: str
+    source: Optional[str]
+    rank: int            # best retrieval rank among its chunks (0 = most relevant)
+    chunks: int          # number of retrieved chunks merged into it
+
+
+class PackedContext(NamedTuple):
+    """Prompt context and what packing did to the retrieved chunks."""
+    text: str
+    passages: List[Passage]
+    usage: Dict[str, int]
+
+
+def _span(doc) -> Optional[tuple]:
+    # Chunks carry [start, end) offsets into their source since metadata was added
+    metadata = getattr(doc, "metadata", None) or {}
+    start, end = metadata.get("start"), metadata.get("end")
+    if not isinstance(start, int) or not isinstance(end, int) or start < 0 or end - start != len(doc.page_content):
+        return None
+    return start, end
+
+
+def merge_chunks(docs: list) -> List[Passage]:
+    """
+    Merge overlapping or adjacent chunks of the same source into passages.
+
+    Chunks without usable offsets stay passages of their own. Merged text is
+    in document order; each passage keeps the best rank of its chunks.
+
+    Args:
+        docs: Retrieved documents, most relevant first.
+
+    Returns:
+        Passages, most relevant first.
+    """
+    passages = []
+    by_source = {}
+    for rank, doc in enumerate(docs):
+        span = _span(doc)
+        source = (getattr(doc, "metadata", None) or {}).get("source")
+        if span is None or source is None:
+            passages.append(Passage(doc.page_content, source, rank, 1))
+        else:
+            by_source.setdefault(source, []).append((span[0], span[1], rank, doc.page_content))
+
+    for source, spans in by_source.items():
+        spans.sort()
+        text, end, best, count = spans[0][3], spans[0][1], spans[0][2], 1
+        for start, next_end, rank, content in spans[1:]:
+            # The splitter strips whitespace, so chunks a separator apart are adjacent
+            if start <= end + 1:
+                if next_end > end:
+                    text += content[end - start:] if start <= end else " " + content
+                    end = next_end
+                best, count = min(best, rank), count + 1
+            else:
+                passages.append(Passage(text, source, best, count))
+                text, end, best, count = content, next_end, rank, 1
+        passages.append(Passage(text, source, best, count))
+
+    passages.sort(key=lambda passage: passage.rank)
+    return passages
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+
+def _drop_repeated_sentences(text: str, seen: set) -> str:
+    """Remove sentences already in the context (boilerplate, disclaimers); adds the kept ones to seen."""
+    parts = _SENTENCE_SPLIT.split(text)
+    kept = []
+    for i in range(0, len(parts), 2):
+        sentence = parts[i]
+        words = _WORD.findall(sentence.lower())
+        key = " ".join(words)
+        if len(words) >= _MIN_SENTENCE_WORDS:
+            if key in seen:
+                continue
+            seen.add(key)
+        if kept:
+            kept.append(parts[i - 1])
+        kept.append(sentence)
+    return "".join(kept).strip()
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, at a sentence end if one is close, else at a word boundary."""
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(head)]
+    if sentence_ends and sentence_ends[-1] >= max_chars // 2:
+        return head[:sentence_ends[-1]].rstrip()
+    space = head.rfind(" ")
+    return (head[:space] if space > 0 else head).rstrip() + " ..."
+
+
+def pack_context(docs: list, budget: int = None, dedup_threshold: float = None) -> PackedContext:
+    """
+    Build the prompt context from retrieved chunks within a token budget.
+
+    Overlapping and adjacent chunks of one source are merged, sentences
+    already in the context are removed, passages that still mostly repeat
+    kept text are dropped, and the rest are added most relevant first until
+    the budget is spent (the last one may be cut at a sentence end).
+
+    Args:
+        docs: Retrieved documents, most relevant first.
+        budget: Max context tokens. Defaults to config.CONTEXT_TOKEN_BUDGET (0 = no limit).
+        dedup_threshold: Fraction of a passage's word 5-grams already in the
+            context above which it is dropped. Defaults to config.CONTEXT_DEDUP_THRESHOLD.
+
+    Returns:
+        The context text, the passages used and token/drop counts.
+    """
+    budget = config.CONTEXT_TOKEN_BUDGET if budget is None else budget
+    dedup_threshold = config.CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+    separator_tokens = estimate_tokens(PASSAGE_SEPARATOR)
+
+    passages = merge_chunks(docs)
+    seen = set()
+    seen_sentences = set()
+    kept = []
+    tokens = 0
+    duplicates = truncated = skipped = 0
+    for passage in passages:
+        # Checked against a copy: sentences of a passage that is dropped below do not count as seen
+        sentences = set(seen_sentences)
+        text = _drop_repeated_sentences(passage.text, sentences)
+        # Once repeated sentences are gone, a few words left over are fragments cut at chunk edges
+        fragments_only = text != passage.text and len(_WORD.findall(text)) < _MIN_SENTENCE_WORDS
+        shingles = _shingles(text)
+        if fragments_only or not shingles or len(shingles & seen) >= dedup_threshold * len(shingles):
+            duplicates += 1
+            continue
+        passage = passage._replace(text=text)
+
+        cost = estimate_tokens(passage.text) + (separator_tokens if kept else 0)
+        if budget and tokens + cost > budget:
+            room = budget - tokens - (separator_tokens if kept else 0)
+            if room < _MIN_PARTIAL_TOKENS:
+                skipped += 1
+                continue
+            passage = passage._replace(text=_truncate(passage.text, room * CHARS_PER_TOKEN))
+            cost = estimate_tokens(passage.text) + (separator_tokens if kept else 0)
+            truncated += 1
+        kept.append(passage)
+        seen |= shingles
+        seen_sentences = sentences
+        tokens += cost
+
+    text = PASSAGE_SEPARATOR.join(passage.text for passage in kept)
+    usage = {
+        "chunks": len(docs),
+        "retrieved_tokens": sum(estimate_tokens(doc.page_content) for doc in docs),
+        "passages": len(kept),
+        "merged_chunks": len(docs) - len(passages),
+        "duplicates_dropped": duplicates,
+        "truncated": truncated,
+        "over_budget": skipped,
+        "context_tokens": estimate_tokens(text),
+    }
+    return PackedContext(text, kept, usage)
+
+
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "retrieved_tokens": 0, "context_tokens": 0, "prompt_tokens": 0,
+          "merged_chunks": 0, "duplicates_dropped": 0, "truncated": 0}
+
+
+def record_usage(usage: Dict[str, Any]) -> None:
+    """Add one request's packing usage to the running totals."""
+    with _stats_lock:
+        _stats["requests"] += 1
+        for key in ("retrieved_tokens", "context_tokens", "prompt_tokens", "merged_chunks", "duplicates_dropped", "truncated"):
+            _stats[key] += usage.get(key, 0)
+
+
+def context_stats() -> dict:
+    """Average prompt and context sizes, and how much packing saved."""
+    with _stats_lock:
+        stats = dict(_stats)
+    requests = stats["requests"]
+    stats["token_budget"] = config.CONTEXT_TOKEN_BUDGET
+    for key in ("retrieved_tokens", "context_tokens", "prompt_tokens"):
+        stats[f"avg_{key}"] = round(stats[key] / requests, 1) if requests else None
+    stats["context_reduction"] = (
+        round(1 - stats["context_tokens"] / stats["retrieved_tokens"], 3) if stats["retrieved_tokens"] else None
+    )
+    return stats
@@ -1,8 +1,9 @@
 """Extraction chain for structured data extraction using Gemini."""
 import json
 from typing import Dict, Any
-from chains.gemini_helper import ask_gemini
+from chains.gemini_helper import ask_gemini, ask_gemini_async
 import config
+from utils.metrics import span
 
 
 def structured_extraction_prompt(text: str, schema: dict, description: str = "Extract structured information") -> str:
@@ -45,18 +46,8 @@ Begin extraction:"""
     return prompt
 
 
-def extract_structured_data(text: str, schema: Dict[str, Any], description: str = "Extract structured information") -> Dict[str, Any]:
-    """
-    Extract structured data from text according to a schema using Gemini.
-    
-    Args:
-        text: Unstructured text to extract from.
-        schema: JSON schema defining the structure.
-        description: Description of what to extract.
-        
-    Returns:
-        Dictionary containing extracted structured data.
-    """
+def _precheck(text: str, schema: Dict[str, Any]):
+    """Return an error result if extraction cannot run, else None."""
     if not text or len(text.strip()) == 0:
         return {"error": "No text provided for extraction."}
     
@@ -66,68 +57,125 @@ def extract_structured_data(text: str, schema: Dict[str, Any], description: str
     if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "your_actual_gemini_key_here":
         return {"error": "GEMINI_API_KEY not configured"}
     
-    try:
-        # Create structured prompt
-        prompt = structured_extraction_prompt(text, schema, description)
-        
-        # Get response from Gemini
-        result = ask_gemini(prompt, temperature=0.1)
-        
-        if not result:
-            return {"error": "No response from Gemini"}
-        
-        # Try to parse JSON from result
-        result = result.strip()
+    return None
+
+
+def parse_extraction_response(result: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse Gemini's extraction output into a dict with every schema field.
+    
+    Args:
+        result: Raw response text from Gemini.
+        schema: JSON schema the output should follow.
         
-        # Remove markdown code blocks if present
-        if result.startswith("```json"):
-            result = result[7:]
-        elif result.startswith("```"):
-            result = result[3:]
-        if result.endswith("```"):
-            result = result[:-3]
-        result = result.strip()
+    Returns:
+        Extracted data, or a dict with an 'error' key.
+    """
+    if not result:
+        return {"error": "No response from Gemini"}
+    
+    # Try to parse JSON from result
+    result = result.strip()
+    
+    # Remove markdown code blocks if present
+    if result.startswith("```json"):
+        result = result[7:]
+    elif result.startswith("```"):
+        result = result[3:]
+    if result.endswith("```"):
+        result = result[:-3]
+    result = result.strip()
+    
+    # Parse JSON
+    try:
+        extracted_data = json.loads(result)
         
-        # Parse JSON
-        try:
-            extracted_data = json.loads(result)
+        # Validate against schema
+        if isinstance(extracted_data, dict):
+            # Ensure all schema fields are present
+            for key in schema.keys():
+                if key not in extracted_data:
+                    extracted_data[key] = None
+            return extracted_data
+        else:
+            return {"error": "Extracted data is not a valid object.", "raw": result}
             
-            # Validate against schema
-            if isinstance(extracted_data, dict):
+    except json.JSONDecodeError as e:
+        # Try to find JSON in the response
+        try:
+            # Look for JSON object in the text
+            start = result.find("{")
+            end = result.rfind("}") + 1
+            if start >= 0 and end > start:
+                json_str = result[start:end]
+                extracted_data = json.loads(json_str)
                 # Ensure all schema fields are present
                 for key in schema.keys():
                     if key not in extracted_data:
                         extracted_data[key] = None
                 return extracted_data
             else:
-                return {"error": "Extracted data is not a valid object.", "raw": result}
-                
-        except json.JSONDecodeError as e:
-            # Try to find JSON in the response
-            try:
-                # Look for JSON object in the text
-                start = result.find("{")
-                end = result.rfind("}") + 1
-                if start >= 0 and end > start:
-                    json_str = result[start:end]
-                    extracted_data = json.loads(json_str)
-                    # Ensure all schema fields are present
-                    for key in schema.keys():
-                        if key not in extracted_data:
-                            extracted_data[key] = None
-                    return extracted_data
-                else:
-                    print(f"⚠️  JSON decode error: {str(e)}")
-                    print(f"⚠️  Raw response: {result[:500]}")
-                    return {"error": f"Could not parse JSON: {str(e)}", "raw": result}
-            except Exception as parse_error:
-                print(f"⚠️  JSON parse error: {str(parse_error)}")
+                print(f"⚠️  JSON decode error: {str(e)}")
                 print(f"⚠️  Raw response: {result[:500]}")
                 return {"error": f"Could not parse JSON: {str(e)}", "raw": result}
+        except Exception as parse_error:
+            print(f"⚠️  JSON parse error: {str(parse_error)}")
+            print(f"⚠️  Raw response: {result[:500]}")
+            return {"error": f"Could not parse JSON: {str(e)}", "raw": result}
+
+
+def _error_result(e: Exception) -> Dict[str, Any]:
+    error_msg = f"Error during extraction: {str(e)}"
+    print(f"❌ {error_msg}")
+    import traceback
+    traceback.print_exc()
+    return {"error": error_msg}
+
+
+def extract_structured_data(text: str, schema: Dict[str, Any], description: str = "Extract structured information", use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Extract structured data from text according to a schema using Gemini.
+    
+    Args:
+        text: Unstructured text to extract from.
+        schema: JSON schema defining the structure.
+        description: Description of what to extract.
+        use_cache: Allow the response to come from the LLM response cache.
+        
+    Returns:
+        Dictionary containing extracted structured data.
+    """
+    error = _precheck(text, schema)
+    if error:
+        return error
+    
+    try:
+        # Create structured prompt
+        with span("prompt_build"):
+            prompt = structured_extraction_prompt(text, schema, description)
+        
+        # Get response from Gemini
+        result = ask_gemini(prompt, temperature=0.1, use_cache=use_cache)
+        
+        with span("json_parse"):
+            return parse_extraction_response(result, schema)
+        
+    except Exception as e:
+        return _error_result(e)
+
+
+async def extract_structured_data_async(text: str, schema: Dict[str, Any], description: str = "Extract structured information", use_cache: bool = True) -> Dict[str, Any]:
+    """Async variant of extract_structured_data using the async Gemini client."""
+    error = _precheck(text, schema)
+    if error:
+        return error
+    
+    try:
+        with span("prompt_build"):
+            prompt = structured_extraction_prompt(text, schema, description)
+        result = await ask_gemini_async(prompt, temperature=0.1, use_cache=use_cache)
+        with span("json_parse"):
+            return parse_extraction_response(result, schema)
         
     except Exception as e:
-        error_msg = f"Error during extraction: {str(e)}"
-        print(f"❌ {error_msg}")
-        import traceback
-        traceback.print_exc()
-        return {"error": error_msg}
+        return _error_result(e)
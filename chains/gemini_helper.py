@@ -1,8 +1,17 @@
 """Helper functions for Google Gemini API integration."""
 import google.generativeai as genai
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional
 import config
+from chains.context_packer import estimate_tokens
+from chains.llm_cache import get_response_cache, make_cache_key
+from chains.llm_client import get_llm_client
+from utils.metrics import record_cache_lookup, record_llm_call, span
 
 load_dotenv()
 
@@ -14,22 +23,144 @@ else:
     print("⚠️  GEMINI_API_KEY not configured")
 
 
+# Model discovery cache: list_models() is a network round trip, so its result
+# is kept for MODEL_CACHE_TTL seconds (MODEL_CACHE_NEGATIVE_TTL after a failure).
+_model_cache_lock = threading.Lock()
+_model_cache = {"models": [], "ok": False, "expires_at": 0.0}
+_resolved_models: Dict[str, str] = {}
+_model_cache_stats = {"hits": 0, "misses": 0, "refreshes": 0, "failures": 0}
+
+# Reusable GenerativeModel instances keyed by model name
+_model_pool: Dict[str, "genai.GenerativeModel"] = {}
+_model_pool_lock = threading.Lock()
+
+_refresh_thread: Optional[threading.Thread] = None
+_refresh_stop = threading.Event()
+
+
+def _fetch_models() -> List[str]:
+    """Fetch generateContent-capable models from the API (raises on failure)."""
+    available = []
+    for model in genai.list_models():
+        if 'generateContent' in model.supported_generation_methods:
+            # Remove 'models/' prefix
+            name = model.name.replace('models/', '')
+            available.append(name)
+    return available
+
+
 def list_available_models():
     """List all available Gemini models."""
     try:
-        models = genai.list_models()
-        available = []
-        for model in models:
-            if 'generateContent' in model.supported_generation_methods:
-                # Remove 'models/' prefix
-                name = model.name.replace('models/', '')
-                available.append(name)
-        return available
+        return _fetch_models()
     except Exception as e:
         print(f"Error listing models: {str(e)}")
         return []
 
 
+def refresh_model_cache() -> List[str]:
+    """
+    Re-run model discovery and update the cache.
+    
+    On failure the last good list (if any) is kept, and the failure is cached
+    for MODEL_CACHE_NEGATIVE_TTL seconds so callers do not retry on every call.
+    """
+    try:
+        models = _fetch_models()
+        ok = bool(models)
+    except Exception as e:
+        print(f"Error listing models: {str(e)}")
+        models = []
+        ok = False
+    
+    with _model_cache_lock:
+        _model_cache_stats["refreshes"] += 1
+        if ok:
+            _model_cache["models"] = models
+            _model_cache["ok"] = True
+            _model_cache["expires_at"] = time.monotonic() + config.MODEL_CACHE_TTL
+        else:
+            _model_cache_stats["failures"] += 1
+            _model_cache["expires_at"] = time.monotonic() + config.MODEL_CACHE_NEGATIVE_TTL
+        _resolved_models.clear()
+        return list(_model_cache["models"])
+
+
+def get_available_models(force_refresh: bool = False) -> List[str]:
+    """Get the cached list of available models, refreshing it when expired."""
+    with _model_cache_lock:
+        fresh = time.monotonic() < _model_cache["expires_at"]
+        if fresh and not force_refresh:
+            _model_cache_stats["hits"] += 1
+            return list(_model_cache["models"])
+        _model_cache_stats["misses"] += 1
+    return refresh_model_cache()
+
+
+def get_generative_model(model_name: str) -> "genai.GenerativeModel":
+    """Get a pooled GenerativeModel instance for the given model name."""
+    llm = _model_pool.get(model_name)
+    if llm is None:
+        with _model_pool_lock:
+            llm = _model_pool.get(model_name)
+            if llm is None:
+                # GenerativeModel expects just the model name without 'models/' prefix
+                llm = genai.GenerativeModel(model_name)
+                _model_pool[model_name] = llm
+    return llm
+
+
+def warm_up_models(models: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Resolve models and build their clients ahead of the first request.
+    
+    Args:
+        models: Preferred model names to resolve. Defaults to config.LLM_MODEL.
+        
+    Returns:
+        Mapping of preferred name to resolved model name.
+    """
+    resolved = {}
+    for preferred in models or [config.LLM_MODEL]:
+        actual = get_best_available_model(preferred)
+        get_generative_model(actual)
+        resolved[preferred] = actual
+    return resolved
+
+
+def _refresh_loop(interval: float):
+    while not _refresh_stop.wait(interval):
+        refresh_model_cache()
+
+
+def start_model_refresh(interval: float = None) -> None:
+    """Start a daemon thread that refreshes the model cache in the background."""
+    global _refresh_thread
+    if interval is None:
+        interval = config.MODEL_REFRESH_INTERVAL
+    if interval <= 0 or (_refresh_thread is not None and _refresh_thread.is_alive()):
+        return
+    _refresh_stop.clear()
+    _refresh_thread = threading.Thread(target=_refresh_loop, args=(interval,), name="gemini-model-refresh", daemon=True)
+    _refresh_thread.start()
+
+
+def stop_model_refresh() -> None:
+    """Stop the background refresh thread."""
+    _refresh_stop.set()
+
+
+def model_cache_stats() -> dict:
+    """Hit/miss counters for model discovery and the client pool size."""
+    with _model_cache_lock:
+        stats = dict(_model_cache_stats)
+        stats["models_cached"] = len(_model_cache["models"])
+        stats["last_refresh_ok"] = _model_cache["ok"]
+        stats["resolved"] = dict(_resolved_models)
+    stats["pooled_clients"] = len(_model_pool)
+    return stats
+
+
 def normalize_model_name(model: str) -> str:
     """
     Normalize model name to correct format for Gemini API.
@@ -83,11 +214,23 @@ def get_best_available_model(preferred: str = None) -> str:
     if not preferred:
         preferred = config.LLM_MODEL
     
-    available = list_available_models()
+    available = get_available_models()
     
     if not available:
         return "gemini-pro"  # Ultimate fallback
     
+    resolved = _resolved_models.get(preferred)
+    if resolved is not None:
+        return resolved
+    
+    resolved = _resolve_model(preferred, available)
+    with _model_cache_lock:
+        _resolved_models[preferred] = resolved
+    return resolved
+
+
+def _resolve_model(preferred: str, available: List[str]) -> str:
+    """Pick the preferred model from the available list, or a fallback."""
     # Try preferred model
     normalized = normalize_model_name(preferred)
     if normalized in available:
@@ -111,7 +254,164 @@ def get_best_available_model(preferred: str = None) -> str:
     return available[0]
 
 
-def ask_gemini(prompt: str, model: str = None, temperature: float = 0.4) -> str:
+def _model_cache_fresh() -> bool:
+    return time.monotonic() < _model_cache["expires_at"]
+
+
+def _generation_config(temperature: float):
+    return genai.types.GenerationConfig(
+        temperature=temperature,
+    )
+
+
+def _cache_lookup(prompt: str, actual_model: str, temperature: float, use_cache: bool):
+    """Return (cache, key, cached_text); cache is None when caching is off or bypassed."""
+    cache = get_response_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    key = make_cache_key(prompt, actual_model, {"temperature": temperature})
+    cached = cache.get(key)
+    record_cache_lookup("llm_response", cached is not None)
+    if cached is not None:
+        record_llm_call("cached")
+    return cache, key, cached
+
+
+@contextmanager
+def _llm_call():
+    """Time one Gemini call as the "llm_call" stage and count its outcome."""
+    try:
+        with span("llm_call"):
+            yield
+    except Exception:
+        record_llm_call("error")
+        raise
+    record_llm_call("ok")
+
+
+def generate_text(prompt: str, model: str = None, temperature: float = 0.4, use_cache: bool = True) -> str:
+    """
+    Run a single Gemini generation and return the stripped text.
+    
+    Unlike ask_gemini, errors are raised to the caller once the shared client
+    (see chains.llm_client) has used up its retries. Successful responses
+    are served from / stored in the response cache unless use_cache is False.
+    """
+    actual_model = get_best_available_model(model or config.LLM_MODEL)
+    cache, key, cached = _cache_lookup(prompt, actual_model, temperature, use_cache)
+    if cached is not None:
+        return cached
+    
+    llm = get_generative_model(actual_model)
+    client = get_llm_client()
+    
+    def attempt(timeout: float) -> str:
+        response = llm.generate_content(
+            prompt, generation_config=_generation_config(temperature), request_options={"timeout": timeout}
+        )
+        return (response.text or "").strip()
+    
+    with _llm_call():
+        text = client.call(attempt, tokens=estimate_tokens(prompt))
+    client.charge(estimate_tokens(text))
+    if cache is not None and text:
+        cache.set(key, text)
+    return text
+
+
+async def generate_text_async(prompt: str, model: str = None, temperature: float = 0.4, use_cache: bool = True) -> str:
+    """Async variant of generate_text using the native async Gemini client."""
+    model = model or config.LLM_MODEL
+    if _model_cache_fresh():
+        actual_model = get_best_available_model(model)
+    else:
+        # Discovery is a blocking network call; keep it off the event loop
+        actual_model = await asyncio.to_thread(get_best_available_model, model)
+    cache, key, cached = _cache_lookup(prompt, actual_model, temperature, use_cache)
+    if cached is not None:
+        return cached
+    
+    llm = get_generative_model(actual_model)
+    client = get_llm_client()
+    
+    async def attempt() -> str:
+        response = await llm.generate_content_async(prompt, generation_config=_generation_config(temperature))
+        return (response.text or "").strip()
+    
+    with _llm_call():
+        text = await client.call_async(attempt, tokens=estimate_tokens(prompt))
+    client.charge(estimate_tokens(text))
+    if cache is not None and text:
+        cache.set(key, text)
+    return text
+
+
+async def stream_text_async(prompt: str, model: str = None, temperature: float = 0.4, use_cache: bool = True) -> AsyncIterator[str]:
+    """
+    Stream a Gemini generation as text pieces, as they arrive.
+    
+    A cached response is yielded as a single piece; a completed stream is
+    stored in the response cache. Errors are raised to the caller.
+    """
+    model = model or config.LLM_MODEL
+    if _model_cache_fresh():
+        actual_model = get_best_available_model(model)
+    else:
+        actual_model = await asyncio.to_thread(get_best_available_model, model)
+    cache, key, cached = _cache_lookup(prompt, actual_model, temperature, use_cache)
+    if cached is not None:
+        yield cached
+        return
+    
+    llm = get_generative_model(actual_model)
+    client = get_llm_client()
+    pieces = []
+    
+    async def start():
+        return await llm.generate_content_async(prompt, generation_config=_generation_config(temperature), stream=True)
+    
+    # Spans the whole stream, so it includes the time the consumer takes per piece
+    stream = client.stream_async(start, tokens=estimate_tokens(prompt))
+    with _llm_call():
+        try:
+            async for chunk in stream:
+                text = chunk.text
+                if text:
+                    pieces.append(text)
+                    yield text
+        finally:
+            # Frees the call slot right away if the consumer stops early
+            await stream.aclose()
+    
+    full_text = "".join(pieces).strip()
+    client.charge(estimate_tokens(full_text))
+    if cache is not None and full_text:
+        cache.set(key, full_text)
+
+
+def _error_message(error: Exception, model: str) -> str:
+    """Turn a Gemini exception into the error string returned to callers."""
+    error_msg = str(error)
+    
+    # If model not found, provide helpful error
+    if "not found" in error_msg.lower() or "404" in error_msg:
+        actual_model = get_best_available_model(model)
+        print(f"❌ Model '{actual_model}' not found.")
+        print("📋 Fetching available models...")
+        available = get_available_models(force_refresh=True)
+        if available:
+            print("✅ Available models:")
+            for m in available[:5]:
+                print(f"   - {m}")
+        
+        return f"Error: Model not available. Please update LLM_MODEL in .env to one of: {', '.join(available[:3]) if available else 'gemini-pro'}"
+    
+    error_msg_full = f"Error calling Gemini API: {error_msg}"
+    print(error_msg_full)
+    return error_msg_full
+
+
+def ask_gemini(prompt: str, model: str = None, temperature: float = 0.4, use_cache: bool = True) -> str:
     """
     Ask Gemini a question and get a response.
     
@@ -119,6 +419,7 @@ def ask_gemini(prompt: str, model: str = None, temperature: float = 0.4) -> str:
         prompt: The prompt/question to send to Gemini
         model: Model name (defaults to config.LLM_MODEL)
         temperature: Temperature for generation (0.0-1.0)
+        use_cache: Serve/store the response in the response cache
         
     Returns:
         Response text from Gemini
@@ -126,40 +427,31 @@ def ask_gemini(prompt: str, model: str = None, temperature: float = 0.4) -> str:
     if not model:
         model = config.LLM_MODEL
     
-    # Get best available model
-    actual_model = get_best_available_model(model)
-    
     try:
-        # GenerativeModel expects just the model name without 'models/' prefix
-        llm = genai.GenerativeModel(actual_model)
-        
-        response = llm.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=temperature,
-            )
-        )
-        
-        if response.text:
-            return response.text.strip()
-        else:
-            return "No response generated from Gemini"
-            
+        text = generate_text(prompt, model=model, temperature=temperature, use_cache=use_cache)
+        return text or "No response generated from Gemini"
     except Exception as e:
-        error_msg = str(e)
-        
-        # If model not found, provide helpful error
-        if "not found" in error_msg.lower() or "404" in error_msg:
-            print(f"❌ Model '{actual_model}' not found.")
-            print("📋 Fetching available models...")
-            available = list_available_models()
-            if available:
-                print("✅ Available models:")
-                for m in available[:5]:
-                    print(f"   - {m}")
-            
-            return f"Error: Model not available. Please update LLM_MODEL in .env to one of: {', '.join(available[:3]) if available else 'gemini-pro'}"
+        return _error_message(e, model)
+
+
+async def ask_gemini_async(prompt: str, model: str = None, temperature: float = 0.4, use_cache: bool = True) -> str:
+    """
+    Async variant of ask_gemini that does not block the event loop.
+    
+    Args:
+        prompt: The prompt/question to send to Gemini
+        model: Model name (defaults to config.LLM_MODEL)
+        temperature: Temperature for generation (0.0-1.0)
+        use_cache: Serve/store the response in the response cache
         
-        error_msg_full = f"Error calling Gemini API: {error_msg}"
-        print(error_msg_full)
-        return error_msg_full
+    Returns:
+        Response text from Gemini
+    """
+    if not model:
+        model = config.LLM_MODEL
+    
+    try:
+        text = await generate_text_async(prompt, model=model, temperature=temperature, use_cache=use_cache)
+        return text or "No response generated from Gemini"
+    except Exception as e:
+        return await asyncio.to_thread(_error_message, e, model)
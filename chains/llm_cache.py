@@ -0,0 +1,193 @@
+"""Content-addressed cache for Gemini responses."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import config
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so prompts that differ only in spacing share a cache entry."""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(prompt: str, model: str, generation_config: Dict[str, Any]) -> str:
+    """
+    Build the cache key for a generation.
+
+    Args:
+        prompt: Prompt text (normalized before hashing).
+        model: Resolved model name.
+        generation_config: Generation parameters such as temperature.
+
+    Returns:
+        Hex SHA-256 digest identifying the request.
+    """
+    payload = json.dumps({
+        "prompt": hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest(),
+        "model": model,
+        "config": generation_config,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier response cache: an in-memory LRU plus an optional SQLite file.
+
+    Entries expire after ``ttl`` seconds. The memory tier holds at most
+    ``max_entries`` responses and the disk tier at most ``max_disk_entries``;
+    the least recently used (memory) or oldest (disk) entries are evicted.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400, disk_path: Optional[str] = None, max_disk_entries: int = 100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_entries = 0
+        self._stats = {"hits": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0, "evictions": 0, "expired": 0, "writes": 0}
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path: str) -> None:
+        os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(disk_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+        self._db.commit()
+        self._disk_entries = self._count_disk()
+
+    def _count_disk(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if now - created_at <= self.ttl:
+                        self._put_memory(key, value, created_at)
+                        self._stats["hits"] += 1
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._disk_entries -= 1
+                    self._stats["expired"] += 1
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """Store a response in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            self._stats["writes"] += 1
+            if self._db is not None:
+                exists = self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+                self._db.execute("INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)", (key, value, now))
+                if exists is None:
+                    self._disk_entries += 1
+                if self._disk_entries > self.max_disk_entries:
+                    self._prune_disk()
+                self._db.commit()
+
+    def _prune_disk(self) -> None:
+        """
+        Evict the oldest disk entries down to 99% of max_disk_entries.
+
+        The running count is re-read first, since other workers may share the
+        file; pruning below the limit means the delete runs once per ~1% of
+        inserts instead of on every insert.
+        """
+        count = self._count_disk()
+        target = self.max_disk_entries - self.max_disk_entries // 100
+        if count > self.max_disk_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY created_at LIMIT ?)",
+                (count - target,)
+            )
+            self._stats["evictions"] += count - target
+            count = target
+        self._disk_entries = count
+
+    def _put_memory(self, key: str, value: str, created_at: float) -> None:
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        """Drop every cached response."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+                self._disk_entries = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._disk_entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Global response cache instance (created on first use)
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get the shared response cache, or None when caching is disabled."""
+    global _response_cache
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+                    ttl=config.LLM_CACHE_TTL,
+                    disk_path=config.LLM_CACHE_DISK_PATH or None,
+                    max_disk_entries=config.LLM_CACHE_MAX_DISK_ENTRIES
+                )
+    return _response_cache
+
+
+def response_cache_stats() -> dict:
+    """Stats for the shared cache (or a disabled marker)."""
+    cache = get_response_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
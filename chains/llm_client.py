@@ -0,0 +1,578 @@
+"""Shared admission control for Gemini calls: rate limits, concurrency, retries, circuit breaker and deadlines."""
+import asyncio
+import contextvars
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from google.api_core import exceptions as google_exceptions
+import config
+from utils.metrics import observe_stage, record_llm_retry
+
+T = TypeVar("T")
+
+# Error classes that are retried; anything else (bad request, auth, safety blocks) fails at once
+RETRYABLE = ("rate_limit", "unavailable", "timeout")
+
+# Error classes that count towards opening the circuit breaker
+_BREAKER_ERRORS = ("unavailable", "timeout")
+
+# HTTP statuses and gRPC status codes that are worth retrying; any other status is a client error
+_STATUS_CLASSES = {429: "rate_limit", 500: "unavailable", 502: "unavailable", 503: "unavailable", 504: "timeout"}
+_GRPC_CLASSES = {"RESOURCE_EXHAUSTED": "rate_limit", "UNAVAILABLE": "unavailable", "DEADLINE_EXCEEDED": "timeout"}
+_LEADING_STATUS = re.compile(r"^\s*(\d{3})\b")
+_GRPC_STATUS = re.compile(r"\b(RESOURCE_EXHAUSTED|UNAVAILABLE|DEADLINE_EXCEEDED)\b")
+
+# Absolute time.monotonic() deadline for the LLM calls of the current request, if one is set
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling Gemini while the circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call cannot start or finish before its deadline."""
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Map a Gemini exception to an error class: rate_limit, unavailable, timeout or client.
+
+    google.api_core exceptions are classified by their HTTP status. Other
+    exceptions fall back to a gRPC status code, or a status number leading
+    the message ("503 Service Unavailable"); numbers or words elsewhere in a
+    message (a 400 that mentions "500 tokens") do not count.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, google_exceptions.GoogleAPICallError):
+        return _STATUS_CLASSES.get(error.code, "client")
+    if isinstance(error, ConnectionError):
+        return "unavailable"
+    code = getattr(error, "code", None)
+    if callable(code):  # grpc.RpcError exposes code() -> StatusCode
+        try:
+            return _GRPC_CLASSES.get(getattr(code(), "name", ""), "client")
+        except Exception:
+            code = None
+    if isinstance(code, int):
+        return _STATUS_CLASSES.get(code, "client")
+    message = str(error)
+    match = _LEADING_STATUS.match(message)
+    if match:
+        return _STATUS_CLASSES.get(int(match.group(1)), "client")
+    match = _GRPC_STATUS.search(message)
+    if match:
+        return _GRPC_CLASSES[match.group(1)]
+    return "client"
+
+
+def retry_delay(attempt: int, error_class: str, error: Exception = None, base: float = None, cap: float = None) -> float:
+    """
+    Exponential backoff with jitter for the given attempt (0-based).
+
+    Rate-limit errors back off four times longer and honour the retry delay
+    the server sends with a 429.
+    """
+    base = config.LLM_RETRY_BASE_DELAY if base is None else base
+    cap = config.LLM_RETRY_MAX_DELAY if cap is None else cap
+    delay = base * (2 ** attempt)
+    if error_class == "rate_limit":
+        match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error or ""))
+        delay = max(delay * 4, float(match.group(1)) if match else 0.0)
+    delay = min(delay, cap)
+    return delay + random.uniform(0, delay / 2)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Give every LLM call made in the block (and its retries) at most `seconds` in total."""
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens per minute, holding up to one minute's worth.
+
+    Callers reserve tokens and sleep for the returned delay, so waiting
+    happens outside the lock and requests are admitted in arrival order.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float, max_wait: float = None) -> Optional[float]:
+        """Take `amount` tokens and return the seconds to wait for them, or None if that exceeds max_wait."""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (amount - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= amount
+            return wait
+
+    def refund(self, amount: float) -> None:
+        if self.rate > 0:
+            with self._lock:
+                self._tokens = min(self.capacity, self._tokens + min(amount, self.capacity))
+
+    def charge(self, amount: float) -> None:
+        """Take tokens used after the fact (response tokens); later callers wait for the debt."""
+        if self.rate > 0:
+            with self._lock:
+                self._refill(time.monotonic())
+                self._tokens = max(-self.capacity, self._tokens - amount)
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class _Waiter:
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.granted = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class Slots:
+    """
+    Counting semaphore shared by worker threads and event loops, granting slots in FIFO order.
+
+    Sync generate_text calls (summary thread pools) and async calls on any
+    event loop draw from the same limit, which asyncio.Semaphore cannot do.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._in_use = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, waiter: _Waiter) -> bool:
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def _abandon(self, waiter: _Waiter) -> bool:
+        """Withdraw a waiter that stopped waiting; True if it was granted a slot meanwhile."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        waiter = _Waiter()
+        if self._try_acquire(waiter):
+            return True
+        if waiter.event.wait(timeout):
+            return True
+        return self._abandon(waiter)
+
+    async def acquire_async(self, timeout: float = None) -> bool:
+        waiter = _Waiter(asyncio.get_running_loop())
+        if self._try_acquire(waiter):
+            return True
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._abandon(waiter)
+        except asyncio.CancelledError:
+            if self._abandon(waiter):
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Hand the slot to the oldest waiter, or free it."""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                try:
+                    waiter.wake()
+                except RuntimeError:
+                    continue  # its event loop is closed
+                waiter.granted = True
+                return
+            self._in_use -= 1
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after `failure_threshold` consecutive server errors or timeouts.
+
+    After `reset_timeout` seconds one probe call is let through (half-open);
+    its success closes the breaker and its failure re-opens it. A probe that
+    never reports back (cancelled, deadline) is replaced after another
+    `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+            if self.state == "half_open":
+                now = time.monotonic()
+                if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                    return False
+                self._probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold > 0:
+                if self.state != "open":
+                    self._opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._probe_started = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, "times_opened": self._opened}
+
+
+class LLMClient:
+    """
+    Admission control around every Gemini call.
+
+    A call first passes the circuit breaker, then reserves one request and
+    its estimated prompt tokens from the per-minute buckets, then waits for
+    one of `max_concurrency` slots. Retryable errors (see RETRYABLE) are
+    retried with backoff, each attempt re-admitted, until `max_retries` or
+    the deadline runs out; the deadline is the tighter of `timeout` and any
+    request deadline set with `deadline()`. Rate limits of 0 are disabled.
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_retries: int = 3, timeout: float = 60.0, breaker_failures: int = 5, breaker_reset: float = 30.0):
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.slots = Slots(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "attempts": 0, "succeeded": 0, "failed": 0, "rejected": 0, "deadline_exceeded": 0,
+            "rate_limited": 0, "queued": 0, "queue_seconds": 0.0, "max_queue_seconds": 0.0,
+        }
+        self._retries: Dict[str, int] = {}
+
+    # --- bookkeeping ---
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def _expires_at(self) -> float:
+        expires_at = time.monotonic() + self.timeout
+        request_deadline = _deadline.get()
+        return expires_at if request_deadline is None else min(expires_at, request_deadline)
+
+    def _deadline_error(self, what: str) -> DeadlineExceededError:
+        self._count("deadline_exceeded")
+        return DeadlineExceededError(f"LLM call deadline exceeded {what}")
+
+    def _reserve(self, tokens: int, expires_at: float) -> float:
+        """Reserve rate-limit budget; returns the seconds to wait before the call may start."""
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError("Gemini circuit breaker is open after repeated failures; retry later")
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            raise self._deadline_error("before the call started")
+        request_wait = self.requests.reserve(1, remaining)
+        token_wait = self.tokens.reserve(tokens, remaining) if request_wait is not None else None
+        if token_wait is None:
+            if request_wait is not None:
+                self.requests.refund(1)
+            raise self._deadline_error("waiting for the rate limit")
+        wait = max(request_wait, token_wait)
+        if wait > 0:
+            self._count("rate_limited")
+        return wait
+
+    def _refund(self, tokens: int) -> None:
+        """Return budget reserved for a call that never started."""
+        self.requests.refund(1)
+        self.tokens.refund(tokens)
+
+    def _admitted(self, queued_since: float) -> None:
+        waited = time.monotonic() - queued_since
+        observe_stage("llm_queue", waited)
+        with self._lock:
+            self._stats["attempts"] += 1
+            self._stats["queue_seconds"] += waited
+            self._stats["max_queue_seconds"] = max(self._stats["max_queue_seconds"], waited)
+            if waited > 0.001:
+                self._stats["queued"] += 1
+
+    def _on_error(self, error: Exception, attempt: int, expires_at: float) -> Optional[float]:
+        """Record a failed attempt; returns the backoff before retrying, or None to give up."""
+        error_class = classify_error(error)
+        if error_class in _BREAKER_ERRORS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()  # Gemini answered, even if with an error
+        if error_class not in RETRYABLE or attempt >= self.max_retries:
+            return None
+        delay = retry_delay(attempt, error_class, error)
+        if time.monotonic() + delay >= expires_at:
+            return None
+        with self._lock:
+            self._retries[error_class] = self._retries.get(error_class, 0) + 1
+        record_llm_retry(error_class)
+        return delay
+
+    def _on_success(self) -> None:
+        self.breaker.record_success()
+        self._count("succeeded")
+
+    def charge(self, tokens: int) -> None:
+        """Count response tokens against the tokens-per-minute budget."""
+        self.tokens.charge(tokens)
+
+    # --- call paths ---
+
+    def call(self, fn: Callable[[float], T], tokens: int = 0) -> T:
+        """
+        Run a blocking Gemini call under the limits, retrying transient errors.
+
+        Args:
+            fn: Makes one attempt; receives the seconds left before the deadline
+                (pass it on as the request timeout)
+            tokens: Estimated prompt tokens, for the tokens-per-minute limit
+        """
+        self._count("calls")
+        expires_at = self._expires_at()
+        for attempt in range(self.max_retries + 1):
+            self._admit(tokens, expires_at)
+            try:
+                result = fn(max(0.0, expires_at - time.monotonic()))
+            except Exception as e:
+                delay = self._on_error(e, attempt, expires_at)
+                if delay is None:
+                    self._count("failed")
+                    raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                self.slots.release()
+            time.sleep(delay)
+
+    def _admit(self, tokens: int, expires_at: float) -> None:
+        queued_since = time.monotonic()
+        wait = self._reserve(tokens, expires_at)
+        try:
+            time.sleep(wait)
+            acquired = self.slots.acquire(max(0.0, expires_at - time.monotonic()))
+        except BaseException:
+            self._refund(tokens)
+            raise
+        if not acquired:
+            self._refund(tokens)
+            raise self._deadline_error("waiting for a free slot")
+        self._admitted(queued_since)
+
+    async def _admit_async(self, tokens: int, expires_at: float) -> None:
+        queued_since = time.monotonic()
+        wait = self._reserve(tokens, expires_at)
+        try:
+            await asyncio.sleep(wait)
+            acquired = await self.slots.acquire_async(max(0.0, expires_at - time.monotonic()))
+        except BaseException:
+            # Cancelled (e.g. the client disconnected) before the call started
+            self._refund(tokens)
+            raise
+        if not acquired:
+            self._refund(tokens)
+            raise self._deadline_error("waiting for a free slot")
+        self._admitted(queued_since)
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        """Async variant of call; each attempt is cancelled when the deadline passes."""
+        self._count("calls")
+        expires_at = self._expires_at()
+        for attempt in range(self.max_retries + 1):
+            await self._admit_async(tokens, expires_at)
+            try:
+                result = await asyncio.wait_for(fn(), max(0.0, expires_at - time.monotonic()))
+            except Exception as e:
+                delay = self._on_error(e, attempt, expires_at)
+                if delay is None:
+                    self._count("failed")
+                    raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                self.slots.release()
+            await asyncio.sleep(delay)
+
+    async def stream_async(self, start: Callable[[], Awaitable[AsyncIterator[T]]], tokens: int = 0) -> AsyncIterator[T]:
+        """
+        Stream a Gemini response under the limits.
+
+        Opening the stream and waiting for its first piece are retried like
+        call_async; once a piece has been yielded errors are raised, since the
+        consumer has already seen part of the answer. The slot is held until
+        the stream ends.
+        """
+        self._count("calls")
+        expires_at = self._expires_at()
+        for attempt in range(self.max_retries + 1):
+            await self._admit_async(tokens, expires_at)
+            try:
+                remaining = max(0.0, expires_at - time.monotonic())
+                iterator = (await asyncio.wait_for(start(), remaining)).__aiter__()
+                first = await asyncio.wait_for(iterator.__anext__(), max(0.0, expires_at - time.monotonic()))
+                self.breaker.record_success()
+                break
+            except StopAsyncIteration:
+                self.slots.release()
+                self._on_success()
+                return
+            except Exception as e:
+                self.slots.release()
+                delay = self._on_error(e, attempt, expires_at)
+                if delay is None:
+                    self._count("failed")
+                    raise
+            except BaseException:
+                self.slots.release()
+                raise
+            await asyncio.sleep(delay)
+
+        try:
+            yield first
+            async for piece in iterator:
+                yield piece
+        except Exception as e:
+            if classify_error(e) in _BREAKER_ERRORS:
+                self.breaker.record_failure()
+            self._count("failed")
+            raise
+        else:
+            self._count("succeeded")
+        finally:
+            self.slots.release()
+
+    def stats(self) -> dict:
+        """Call, retry and queueing counters plus the current limiter and breaker state."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["retries"] = dict(self._retries)
+        attempts = stats["attempts"]
+        stats["avg_queue_ms"] = round(stats["queue_seconds"] / attempts * 1000, 2) if attempts else 0.0
+        stats["max_queue_ms"] = round(stats.pop("max_queue_seconds") * 1000, 2)
+        stats.pop("queue_seconds")
+        stats.update({
+            "max_concurrency": self.slots.limit,
+            "in_flight": self.slots.in_use,
+            "waiting": self.slots.waiting,
+            "requests_per_minute": self.requests.per_minute,
+            "tokens_per_minute": self.tokens.per_minute,
+            "circuit": self.breaker.stats(),
+        })
+        return stats
+
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Get or create the process-wide Gemini client limits."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient(
+                    max_concurrency=config.LLM_MAX_CONCURRENCY,
+                    requests_per_minute=config.LLM_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=config.LLM_TOKENS_PER_MINUTE,
+                    max_retries=config.LLM_MAX_RETRIES,
+                    timeout=config.LLM_CALL_TIMEOUT,
+                    breaker_failures=config.LLM_BREAKER_FAILURES,
+                    breaker_reset=config.LLM_BREAKER_RESET
+                )
+    return _client
+
+
+def llm_client_stats() -> dict:
+    """Client counters (without creating the client)."""
+    if _client is None:
+        return {"created": False}
+    return {"created": True, **_client.stats()}
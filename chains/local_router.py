@@ -0,0 +1,227 @@
+"""Local tool router: keyword rules, input-length heuristics and embedding centroids."""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+import config
+
+ROUTES = ("qa", "summary", "extract")
+
+# (route, compiled pattern, weight); matched on the lowercased input
+ROUTE_RULES = [
+    ("summary", re.compile(r"\b(summar(y|ies|ise|ize|ized|ising|izing)|tl;?dr|condense|recap|overview|gist|key (points|takeaways|highlights))\b"), 2.0),
+    ("summary", re.compile(r"\bin (a few|one|two|three|\d+) (words|sentences|paragraphs|bullet points)\b"), 1.0),
+    ("extract", re.compile(r"\b(extract|json|schema|fields?|structured|parse|pull out|tabulate|key-value)\b"), 2.0),
+    ("extract", re.compile(r"\b(list|find|get) (all|every|each) (of )?(the )?(names|dates|numbers|figures|entities|companies|amounts|metrics)\b"), 1.5),
+    ("qa", re.compile(r"^\s*(what|who|whom|when|where|why|how|which|is|are|does|do|did|can|could|should|would|was|were|will)\b"), 1.5),
+    ("qa", re.compile(r"\?\s*$"), 1.0),
+]
+
+# Pasted documents rather than questions
+_LONG_INPUT_CHARS = 1500
+_SHORT_INPUT_CHARS = 200
+
+# Seed prompts for the nearest-centroid classifier
+CENTROID_EXAMPLES = {
+    "qa": [
+        "What is the company's market share?",
+        "Who are the main competitors?",
+        "How much revenue did the company report last quarter?",
+        "When was the product launched?",
+    ],
+    "summary": [
+        "Summarize this report in a few sentences.",
+        "Give me the key takeaways from the following text.",
+        "Condense this earnings call transcript.",
+        "Write a short overview of this document.",
+    ],
+    "extract": [
+        "Extract the company name, revenue and growth rate as JSON.",
+        "Pull out all dates and amounts from this text.",
+        "Return the fields ceo, headquarters and founded year.",
+        "Parse the competitors and their market shares into structured data.",
+    ],
+}
+
+# Weight of the centroid vote relative to one strong keyword rule
+_CENTROID_WEIGHT = 1.5
+_CENTROID_TEMPERATURE = 0.05
+
+
+class LocalRouter:
+    """
+    Routes a query to qa, summary or extract without calling the LLM.
+
+    Keyword rules and length heuristics are scored first; if they are not
+    decisive and an embedding function is available, a nearest-centroid
+    vote over the sentence-transformers embeddings is added. The result
+    carries a confidence (the winning route's share of the total score),
+    so callers can fall back to the LLM router when it is low. Decisions
+    are cached per normalized input.
+    """
+
+    def __init__(self, min_confidence: float = 0.6, cache_size: int = 2048, embed_fn: Callable[[List[str]], Optional[np.ndarray]] = None):
+        self.min_confidence = min_confidence
+        self.cache_size = cache_size
+        self.embed_fn = embed_fn
+        self._centroids = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "cache_hits": 0,
+            "local": 0,
+            "llm_fallbacks": 0,
+            "compared": 0,
+            "agreed": 0,
+            "local_time_ms": 0.0,
+        }
+
+    def route(self, user_input: str) -> Tuple[str, float]:
+        """
+        Pick a route locally.
+
+        Args:
+            user_input: The user's query or text.
+
+        Returns:
+            (route, confidence) with confidence in [0, 1].
+        """
+        key = " ".join((user_input or "").lower().split())
+        with self._lock:
+            self._stats["calls"] += 1
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                return cached
+
+        started = time.perf_counter()
+        decision = self._classify(key, len(user_input or ""))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self._stats["local_time_ms"] += elapsed_ms
+            if self.cache_size > 0:
+                self._cache[key] = decision
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return decision
+
+    def is_confident(self, confidence: float) -> bool:
+        return confidence >= self.min_confidence
+
+    def record(self, local_route: str, llm_route: Optional[str] = None) -> None:
+        """Record how a request was routed; pass llm_route when the LLM was consulted."""
+        with self._lock:
+            if llm_route is None:
+                self._stats["local"] += 1
+                return
+            self._stats["llm_fallbacks"] += 1
+            self._stats["compared"] += 1
+            if llm_route == local_route:
+                self._stats["agreed"] += 1
+
+    def stats(self) -> dict:
+        """Cache hit rate, local vs LLM decisions and agreement with the LLM."""
+        with self._lock:
+            stats = dict(self._stats)
+        computed = stats["calls"] - stats["cache_hits"]
+        stats["cache_hit_rate"] = round(stats["cache_hits"] / stats["calls"], 3) if stats["calls"] else 0.0
+        stats["llm_agreement"] = round(stats["agreed"] / stats["compared"], 3) if stats["compared"] else None
+        stats["avg_local_ms"] = round(stats.pop("local_time_ms") / computed, 3) if computed else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def _classify(self, text: str, length: int) -> Tuple[str, float]:
+        scores = self._rule_scores(text, length)
+        route, confidence = _best(scores)
+        if not self.is_confident(confidence):
+            similarities = self._centroid_similarities(text)
+            if similarities is not None:
+                # Softmax over cosine similarities, spread across routes as one vote
+                weights = np.exp((similarities - similarities.max()) / _CENTROID_TEMPERATURE)
+                weights = weights / weights.sum()
+                for name, weight in zip(ROUTES, weights):
+                    scores[name] += _CENTROID_WEIGHT * float(weight)
+                route, confidence = _best(scores)
+        return route, confidence
+
+    def _rule_scores(self, text: str, length: int) -> Dict[str, float]:
+        scores = {name: 0.0 for name in ROUTES}
+        for name, pattern, weight in ROUTE_RULES:
+            if pattern.search(text):
+                scores[name] += weight
+        if length >= _LONG_INPUT_CHARS and scores["extract"] == 0:
+            scores["summary"] += 1.0
+        elif length <= _SHORT_INPUT_CHARS and scores["qa"] > 0:
+            scores["qa"] += 0.5
+        return scores
+
+    def _centroid_similarities(self, text: str) -> Optional[np.ndarray]:
+        if self.embed_fn is None or not text:
+            return None
+        if self._centroids is None:
+            centroids = []
+            for name in ROUTES:
+                vectors = self.embed_fn(CENTROID_EXAMPLES[name])
+                if vectors is None:
+                    return None
+                centroids.append(_normalize(np.asarray(vectors, dtype=np.float32).mean(axis=0)))
+            self._centroids = np.vstack(centroids)
+        vectors = self.embed_fn([text])
+        if vectors is None:
+            return None
+        return self._centroids @ _normalize(np.asarray(vectors, dtype=np.float32)[0])
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _best(scores: Dict[str, float]) -> Tuple[str, float]:
+    total = sum(scores.values())
+    if total <= 0:
+        return "qa", 0.0
+    route = max(ROUTES, key=lambda name: scores[name])
+    return route, scores[route] / total
+
+
+def _loaded_embeddings(texts: List[str]) -> Optional[np.ndarray]:
+    # Only use the embedding model if it is already loaded; routing never pays for loading it
+    from ingestion import vector_store
+    service = vector_store._embedding_service
+    if service is None:
+        return None
+    return service.embed_queries(texts)
+
+
+_local_router: Optional[LocalRouter] = None
+_local_router_lock = threading.Lock()
+
+
+def get_local_router() -> LocalRouter:
+    """Get or create the shared local router."""
+    global _local_router
+    if _local_router is None:
+        with _local_router_lock:
+            if _local_router is None:
+                _local_router = LocalRouter(
+                    min_confidence=config.ROUTER_MIN_CONFIDENCE,
+                    cache_size=config.ROUTER_CACHE_SIZE,
+                    embed_fn=_loaded_embeddings
+                )
+    return _local_router
+
+
+def router_stats() -> dict:
+    """Local router counters (without creating the router)."""
+    if _local_router is None:
+        return {"enabled": config.ROUTER_LOCAL_ENABLED, "calls": 0}
+    return {"enabled": config.ROUTER_LOCAL_ENABLED, **_local_router.stats()}
@@ -1,43 +1,247 @@
-"""RAG-based Q&A chain implementation using Gemini and Chroma."""
-from typing import Optional, Dict, List
-from chains.gemini_helper import ask_gemini
+"""RAG-based Q&A chain implementation using Gemini, dense and BM25 retrieval."""
+import time
+from typing import Any, AsyncIterator, Callable, Optional, Dict, List, Tuple
+import numpy as np
+from langchain.schema import Document
+from chains.context_packer import estimate_tokens, pack_context, record_usage
+from chains.gemini_helper import ask_gemini, ask_gemini_async, stream_text_async
+from chains.reranker import get_reranker
+from chains.semantic_cache import get_semantic_cache, make_scope
 import config
-from ingestion.vector_store import get_vector_store
+from ingestion.bm25 import get_bm25_index
+from ingestion.metadata import build_where
+from ingestion.vector_store import corpus_version, get_vector_store
+from utils.concurrency import map_in_order, run_in_embedding_pool
+from utils.metrics import record_cache_lookup, span
 
 
-def answer_question(question: str) -> dict:
-    """
-    Answer a question using the RAG pipeline with Gemini.
-    
-    Args:
-        question: The question to answer.
-        
-    Returns:
-        Dictionary with 'answer' and 'source_documents' keys.
-    """
+def _precheck(vectorstore) -> Optional[dict]:
+    """Return an error result if the chain cannot run, else None."""
     if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "your_actual_gemini_key_here":
         return {
             "answer": "Error: GEMINI_API_KEY not configured. Please set it in .env file",
             "source_documents": []
         }
-    
-    vectorstore = get_vector_store()
+
     if vectorstore is None:
         return {
             "answer": "Error: Vector store not available. Please ensure documents are loaded.",
             "source_documents": []
         }
-    
-    try:
-        # Retrieve relevant documents
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
-        relevant_docs = retriever.get_relevant_documents(question)
-        
-        # Build context from retrieved documents
-        context = "\n\n".join([doc.page_content for doc in relevant_docs])
-        
-        # Create prompt for Gemini
-        prompt = f"""Use the following pieces of context to answer the question at the end.
+
+    return None
+
+
+def _dense_search(vectorstore, question: str, k: int, where: Optional[Dict[str, Any]]) -> list:
+    # Embed and search separately where the store allows, so each is timed as its own stage
+    embeddings = getattr(vectorstore, "_embedding_function", None)
+    if hasattr(vectorstore, "search_by_vectors") and hasattr(embeddings, "embed_query_array"):
+        with span("embedding"):
+            vector = embeddings.embed_query_array(question)
+        with span("vector_search"):
+            return vectorstore.search_by_vectors(vector, k, where)[0]
+    if hasattr(vectorstore, "similarity_search_by_vector") and hasattr(embeddings, "embed_query"):
+        with span("embedding"):
+            vector = embeddings.embed_query(question)
+        with span("vector_search"):
+            return vectorstore.similarity_search_by_vector(vector, k=k, filter=where)
+
+    search_kwargs = {"k": k}
+    if where:
+        search_kwargs["filter"] = where
+    retriever = vectorstore.as_retriever(search_kwargs=search_kwargs)
+    with span("vector_search"):
+        return retriever.get_relevant_documents(question)
+
+
+def resolve_weights(weights: Optional[Dict[str, float]] = None) -> Tuple[float, float]:
+    """
+    Dense and BM25 fusion weights: config defaults, overridden per request.
+
+    Raises:
+        ValueError: On unknown retrievers, negative weights or all-zero weights.
+    """
+    resolved = {"dense": config.HYBRID_DENSE_WEIGHT, "bm25": config.HYBRID_BM25_WEIGHT}
+    for name, weight in (weights or {}).items():
+        if name not in resolved:
+            raise ValueError(f"Unknown retriever weight '{name}'. Allowed: dense, bm25")
+        if weight is None or weight < 0:
+            raise ValueError(f"Weight for '{name}' must be a non-negative number")
+        resolved[name] = float(weight)
+    if resolved["dense"] <= 0 and resolved["bm25"] <= 0:
+        raise ValueError("At least one retriever weight must be positive")
+    return resolved["dense"], resolved["bm25"]
+
+
+def reciprocal_rank_fusion(rankings: List[list], weights: List[float], rrf_k: int = None) -> List[Tuple[Any, float]]:
+    """
+    Fuse ranked lists of keys with weighted reciprocal-rank fusion.
+
+    Each key scores sum(weight / (rrf_k + rank)) over the lists it appears
+    in (ranks start at 1). Ties keep first-seen order.
+
+    Returns:
+        (key, score) pairs, best first.
+    """
+    rrf_k = config.RRF_K if rrf_k is None else rrf_k
+    scores = {}
+    for ranking, weight in zip(rankings, weights):
+        if weight <= 0:
+            continue
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def _doc_key(metadata: Optional[Dict[str, Any]], fallback: str) -> tuple:
+    # The same chunk must get the same key from either retriever
+    if metadata and "source" in metadata and "chunk_index" in metadata:
+        return metadata["source"], metadata["chunk_index"]
+    return ("", fallback)
+
+
+def _fetch_chunks(vectorstore, chunk_ids: List[str]) -> Dict[str, Document]:
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is None or not chunk_ids:
+        return {}
+    found = collection.get(ids=chunk_ids, include=["documents", "metadatas"])
+    return {
+        chunk_id: Document(page_content=text, metadata=metadata or {})
+        for chunk_id, text, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+    }
+
+
+def _fuse(vectorstore, bm25, dense_docs: list, keyword_hits: List[Tuple[str, float]], k: int, dense_weight: float, bm25_weight: float) -> list:
+    """Fuse dense documents with BM25 hits; texts are fetched only for keyword-only winners."""
+    dense_by_key = {}
+    for doc in dense_docs:
+        dense_by_key.setdefault(_doc_key(doc.metadata, doc.page_content), doc)
+    keyword_by_key = {}
+    for chunk_id, _ in keyword_hits:
+        keyword_by_key.setdefault(_doc_key(bm25.metadata(chunk_id), chunk_id), chunk_id)
+
+    fused = reciprocal_rank_fusion([list(dense_by_key), list(keyword_by_key)], [dense_weight, bm25_weight])[:k]
+    missing = [keyword_by_key[key] for key, _ in fused if key not in dense_by_key]
+    fetched = _fetch_chunks(vectorstore, missing)
+
+    docs = []
+    for key, _ in fused:
+        doc = dense_by_key.get(key) or fetched.get(keyword_by_key.get(key))
+        if doc is not None:
+            docs.append(doc)
+    return docs
+
+
+def retrieve_documents(vectorstore, question: str, k: int = None, filters: Optional[Dict[str, Any]] = None,
+                       weights: Optional[Dict[str, float]] = None, bm25=None, reranker=None) -> list:
+    """
+    Retrieve the k most relevant chunks for a question, optionally restricted by metadata filters.
+
+    With a BM25 index, dense and keyword results (HYBRID_CANDIDATES deep)
+    are fused by reciprocal-rank fusion; a weight of 0 turns a retriever off.
+    With a re-ranker, RERANK_CANDIDATES chunks are fetched and the
+    cross-encoder picks the best k (RERANK_TOP_K by default); if it would
+    exceed its latency budget the first RETRIEVAL_K candidates are used.
+
+    Args:
+        vectorstore: Vector store to search.
+        question: The question.
+        k: Number of chunks. Defaults to config.RETRIEVAL_K (config.RERANK_TOP_K when re-ranking).
+        filters: Metadata filters, e.g. {"company": "innovate"}.
+        weights: Fusion weights, e.g. {"dense": 1.0, "bm25": 0.5}. Defaults from config.
+        bm25: Keyword index; dense-only retrieval without one.
+        reranker: Cross-encoder re-ranker; retrieval order is kept without one.
+    """
+    def dense_search(questions, depth, where):
+        return [_dense_search(vectorstore, questions[0], depth, where)]
+
+    return _retrieve(vectorstore, [question], k, filters, weights, bm25, reranker, dense_search)[0]
+
+
+def retrieve_documents_batch(vectorstore, questions: List[str], k: int = None, filters: Optional[Dict[str, Any]] = None,
+                             weights: Optional[Dict[str, float]] = None, bm25=None, reranker=None) -> List[list]:
+    """
+    Retrieve the k most relevant chunks for each of several questions.
+
+    All questions are embedded in one encode call and searched with one
+    index (or Chroma) query, then fused with BM25 per question as in
+    retrieve_documents; the re-ranker scores every question's candidates
+    together. Stores without batch support fall back to one search per
+    question.
+    """
+    if not questions:
+        return []
+
+    def dense_search(questions, depth, where):
+        return _dense_search_batch(vectorstore, questions, depth, where)
+
+    return _retrieve(vectorstore, questions, k, filters, weights, bm25, reranker, dense_search)
+
+
+def _retrieve(vectorstore, questions: List[str], k: Optional[int], filters, weights, bm25, reranker, dense_search) -> List[list]:
+    """Dense candidates, fused with BM25 when available, then re-ranked when a re-ranker is given."""
+    fallback_k = k or config.RETRIEVAL_K
+    if reranker is not None:
+        k = k or config.RERANK_TOP_K
+        depth = max(k, config.RERANK_CANDIDATES)
+    else:
+        k = depth = fallback_k
+    where = build_where(filters)
+    dense_weight, bm25_weight = resolve_weights(weights)
+    hybrid = bm25 is not None and bm25_weight > 0 and len(bm25) > 0
+    fetch = max(depth, config.HYBRID_CANDIDATES) if hybrid else depth
+
+    if hybrid and dense_weight <= 0:
+        dense = [[] for _ in questions]
+    else:
+        dense = dense_search(questions, fetch, where)
+    if hybrid:
+        with span("keyword_search"):
+            keyword_hits = [bm25.search(question, fetch, where) for question in questions]
+        candidates = [
+            _fuse(vectorstore, bm25, docs, hits, depth, dense_weight, bm25_weight)
+            for docs, hits in zip(dense, keyword_hits)
+        ]
+    else:
+        candidates = dense
+    if reranker is None:
+        return candidates
+    with span("rerank"):
+        return reranker.rerank_many(questions, candidates, k, fallback_k)
+
+
+def _dense_search_batch(vectorstore, questions: List[str], k: int, where: Optional[Dict[str, Any]]) -> List[list]:
+    embeddings = getattr(vectorstore, "_embedding_function", None)
+    if hasattr(vectorstore, "search_by_vectors") and hasattr(embeddings, "embed_queries_array"):
+        with span("embedding"):
+            vectors = embeddings.embed_queries_array(questions)
+        with span("vector_search"):
+            return vectorstore.search_by_vectors(vectors, k, where)
+
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is None or not hasattr(embeddings, "embed_queries_array"):
+        return [_dense_search(vectorstore, question, k, where) for question in questions]
+
+    n_results = min(k, collection.count())
+    if n_results == 0:
+        return [[] for _ in questions]
+    with span("embedding"):
+        vectors = embeddings.embed_queries_array(questions)
+    with span("vector_search"):
+        results = collection.query(
+            query_embeddings=vectors.tolist(),
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas"]
+        )
+    return [
+        [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+        for texts, metadatas in zip(results["documents"], results["metadatas"])
+    ]
+
+
+def _render_prompt(question: str, context: str) -> str:
+    return f"""Use the following pieces of context to answer the question at the end.
 If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
 
 Context:
@@ -46,25 +250,286 @@ Context:
 Question: {question}
 
 Answer based on the context:"""
-        
+
+
+def build_qa_prompt(question: str, relevant_docs: list) -> str:
+    """Build the Gemini prompt from the question and retrieved chunks (packed within the context budget)."""
+    return _render_prompt(question, pack_context(relevant_docs).text)
+
+
+def _prepare_prompt(question: str, relevant_docs: list) -> Tuple[str, Dict[str, int]]:
+    """Prompt and its token usage for one request; the usage is added to the running context stats."""
+    with span("prompt_build"):
+        packed = pack_context(relevant_docs)
+        prompt = _render_prompt(question, packed.text)
+        usage = {**packed.usage, "prompt_tokens": estimate_tokens(prompt)}
+    record_usage(usage)
+    return prompt, usage
+
+
+def format_sources(relevant_docs: list) -> List[Dict[str, Any]]:
+    """Format retrieved chunks as source snippets (with their metadata) for the response."""
+    sources = []
+    for doc in relevant_docs[:3]:  # Limit to top 3 sources
+        source = {"page_content": doc.page_content[:200] + "..."}
+        if getattr(doc, "metadata", None):
+            source["metadata"] = dict(doc.metadata)
+        sources.append(source)
+    return sources
+
+
+def _error_result(e: Exception) -> dict:
+    error_msg = f"Error processing question: {str(e)}"
+    print(error_msg)
+    return {
+        "answer": error_msg,
+        "source_documents": []
+    }
+
+
+def _question_vectors(vectorstore, questions: List[str]):
+    """Question embeddings from the store's embedding function, or None if it has none."""
+    embeddings = getattr(vectorstore, "_embedding_function", None)
+    if hasattr(embeddings, "embed_queries_array"):
+        return embeddings.embed_queries_array(questions)
+    if hasattr(embeddings, "embed_query"):
+        return np.array([embeddings.embed_query(question) for question in questions], dtype=np.float32)
+    return None
+
+
+def _with_shared_indexes(retrieve: Callable, *args, **kwargs) -> list:
+    """
+    Call retrieve_documents(_batch) with the shared BM25 index and re-ranker.
+
+    The async chains run this in the embedding pool, so the lookups (which
+    reload the index after another worker's sync and load the cross-encoder
+    on first use) stay off the event loop.
+    """
+    return retrieve(*args, bm25=get_bm25_index(), reranker=get_reranker(), **kwargs)
+
+
+def _semantic_lookup(vectorstore, questions: List[str], use_cache: bool, scope: str):
+    """
+    Look questions up in the semantic cache.
+
+    Returns:
+        (cache, version, vectors, hits); cache is None when the lookup was
+        skipped, and hits holds one SemanticHit or None per question.
+    """
+    cache = get_semantic_cache() if use_cache else None
+    if cache is None:
+        return None, None, None, [None] * len(questions)
+    with span("embedding"):
+        vectors = _question_vectors(vectorstore, questions)
+    if vectors is None:
+        return None, None, None, [None] * len(questions)
+    with span("semantic_cache"):
+        version = corpus_version()
+        hits = [cache.get(vector, question, scope, version) for vector, question in zip(vectors, questions)]
+    for hit in hits:
+        record_cache_lookup("semantic", hit is not None)
+    return cache, version, vectors, hits
+
+
+def _is_answer(answer: str) -> bool:
+    # Gemini failures come back as text; they must not be served to later questions
+    return bool(answer) and not answer.startswith("Error") and answer != "No response generated from Gemini"
+
+
+def answer_question(question: str, use_cache: bool = True, filters: Optional[Dict[str, Any]] = None,
+                    k: int = None, weights: Optional[Dict[str, float]] = None) -> dict:
+    """
+    Answer a question using the RAG pipeline with Gemini.
+
+    Args:
+        question: The question to answer.
+        use_cache: Allow the answer to come from the semantic answer cache and the LLM response cache.
+        filters: Metadata filters restricting retrieval, e.g. {"company": "innovate"}.
+        k: Number of chunks to retrieve. Defaults to config.RETRIEVAL_K.
+        weights: Dense/BM25 fusion weights, e.g. {"dense": 1.0, "bm25": 0.5}.
+
+    Returns:
+        Dictionary with 'answer', 'source_documents' and 'usage' (prompt token counts) keys.
+    """
+    vectorstore = get_vector_store()
+    error = _precheck(vectorstore)
+    if error:
+        return error
+
+    try:
+        started = time.perf_counter()
+        scope = make_scope(filters=filters, k=k, weights=weights)
+        cache, version, vectors, hits = _semantic_lookup(vectorstore, [question], use_cache, scope)
+        if hits[0] is not None:
+            return hits[0].result
+
+        # Retrieve relevant documents
+        relevant_docs = retrieve_documents(vectorstore, question, k=k, filters=filters, weights=weights, bm25=get_bm25_index(), reranker=get_reranker())
+
+        # Create prompt for Gemini
+        prompt, usage = _prepare_prompt(question, relevant_docs)
+
         # Get answer from Gemini
-        answer = ask_gemini(prompt, temperature=0.7)
-        
-        # Format source documents
-        source_documents = [
-            {"page_content": doc.page_content[:200] + "..."} 
-            for doc in relevant_docs[:3]  # Limit to top 3 sources
-        ]
-        
-        return {
+        answer = ask_gemini(prompt, temperature=0.7, use_cache=use_cache)
+
+        result = {
             "answer": answer,
-            "source_documents": source_documents
+            "source_documents": format_sources(relevant_docs),
+            "usage": usage
         }
-        
+        if cache is not None and _is_answer(answer):
+            cache.set(vectors[0], question, scope, version, result, (time.perf_counter() - started) * 1000)
+        return result
+
     except Exception as e:
-        error_msg = f"Error processing question: {str(e)}"
-        print(error_msg)
-        return {
-            "answer": error_msg,
-            "source_documents": []
+        return _error_result(e)
+
+
+async def answer_question_async(question: str, use_cache: bool = True, filters: Optional[Dict[str, Any]] = None,
+                                k: int = None, weights: Optional[Dict[str, float]] = None) -> dict:
+    """
+    Async variant of answer_question.
+
+    Retrieval (query embedding + vector search) runs in the embedding worker
+    pool and the Gemini call uses the async client, so the event loop is
+    never blocked.
+    """
+    vectorstore = get_vector_store()
+    error = _precheck(vectorstore)
+    if error:
+        return error
+
+    try:
+        started = time.perf_counter()
+        scope = make_scope(filters=filters, k=k, weights=weights)
+        cache, version, vectors, hits = await run_in_embedding_pool(_semantic_lookup, vectorstore, [question], use_cache, scope)
+        if hits[0] is not None:
+            return hits[0].result
+
+        relevant_docs = await run_in_embedding_pool(
+            _with_shared_indexes, retrieve_documents, vectorstore, question, k=k, filters=filters, weights=weights
+        )
+        prompt, usage = _prepare_prompt(question, relevant_docs)
+        answer = await ask_gemini_async(prompt, temperature=0.7, use_cache=use_cache)
+
+        result = {
+            "answer": answer,
+            "source_documents": format_sources(relevant_docs),
+            "usage": usage
+        }
+        if cache is not None and _is_answer(answer):
+            cache.set(vectors[0], question, scope, version, result, (time.perf_counter() - started) * 1000)
+        return result
+
+    except Exception as e:
+        return _error_result(e)
+
+
+async def stream_answer_async(question: str, use_cache: bool = True, filters: Optional[Dict[str, Any]] = None,
+                              k: int = None, weights: Optional[Dict[str, float]] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream an answer as (event, data) pairs.
+
+    Retrieved sources are sent first as ("sources", [...]) and the prompt's
+    token counts as ("usage", {...}), then the answer as ("token", text)
+    pieces while Gemini generates it. A semantic cache hit sends the cached
+    answer as a single token. Failures are yielded as ("error", message).
+    """
+    vectorstore = get_vector_store()
+    error = _precheck(vectorstore)
+    if error:
+        yield "error", error["answer"]
+        return
+
+    try:
+        started = time.perf_counter()
+        scope = make_scope(filters=filters, k=k, weights=weights)
+        cache, version, vectors, hits = await run_in_embedding_pool(_semantic_lookup, vectorstore, [question], use_cache, scope)
+        if hits[0] is not None:
+            yield "sources", hits[0].result["source_documents"]
+            yield "usage", hits[0].result.get("usage")
+            yield "token", hits[0].result["answer"]
+            return
+
+        relevant_docs = await run_in_embedding_pool(
+            _with_shared_indexes, retrieve_documents, vectorstore, question, k=k, filters=filters, weights=weights
+        )
+        sources = format_sources(relevant_docs)
+        yield "sources", sources
+
+        prompt, usage = _prepare_prompt(question, relevant_docs)
+        yield "usage", usage
+        pieces = []
+        async for piece in stream_text_async(prompt, temperature=0.7, use_cache=use_cache):
+            pieces.append(piece)
+            yield "token", piece
+
+        answer = "".join(pieces)
+        if cache is not None and _is_answer(answer):
+            result = {"answer": answer, "source_documents": sources, "usage": usage}
+            cache.set(vectors[0], question, scope, version, result, (time.perf_counter() - started) * 1000)
+
+    except Exception as e:
+        yield "error", _error_result(e)["answer"]
+
+
+async def answer_questions_async(questions: List[str], use_cache: bool = True, concurrency: int = None, filters: Optional[Dict[str, Any]] = None,
+                                 k: int = None, weights: Optional[Dict[str, float]] = None) -> AsyncIterator[dict]:
+    """
+    Answer several questions, yielding one result per question in input order.
+
+    Retrieval for the whole batch is one embedding call and one vector
+    query (for the questions the semantic cache cannot answer); Gemini calls
+    then run with at most ``concurrency`` in flight.
+    A failed question yields an error result without stopping the batch.
+
+    Args:
+        questions: Questions to answer.
+        use_cache: Allow answers to come from the semantic answer cache and the LLM response cache.
+        concurrency: Max concurrent Gemini calls. Defaults to config.BATCH_ITEM_CONCURRENCY.
+        filters: Metadata filters applied to every question's retrieval.
+        k: Number of chunks per question. Defaults to config.RETRIEVAL_K.
+        weights: Dense/BM25 fusion weights.
+
+    Yields:
+        Dictionaries with 'answer', 'source_documents' and 'usage' keys.
+    """
+    vectorstore = get_vector_store()
+    error = _precheck(vectorstore)
+    scope = make_scope(filters=filters, k=k, weights=weights)
+    if error is None:
+        try:
+            started = time.perf_counter()
+            cache, version, vectors, hits = await run_in_embedding_pool(_semantic_lookup, vectorstore, questions, use_cache, scope)
+            misses = [i for i, hit in enumerate(hits) if hit is None]
+            retrieved = await run_in_embedding_pool(
+                _with_shared_indexes, retrieve_documents_batch, vectorstore, [questions[i] for i in misses], k=k, filters=filters,
+                weights=weights
+            )
+            docs_per_question = dict(zip(misses, retrieved))
+            retrieval_ms = (time.perf_counter() - started) * 1000 / max(len(questions), 1)
+        except Exception as e:
+            error = _error_result(e)
+    if error:
+        for _ in questions:
+            yield dict(error)
+        return
+
+    async def answer(i: int) -> dict:
+        if hits[i] is not None:
+            return hits[i].result
+        started = time.perf_counter()
+        prompt, usage = _prepare_prompt(questions[i], docs_per_question[i])
+        answer = await ask_gemini_async(prompt, temperature=0.7, use_cache=use_cache)
+        result = {
+            "answer": answer,
+            "source_documents": format_sources(docs_per_question[i]),
+            "usage": usage
         }
+        if cache is not None and _is_answer(answer):
+            cost_ms = retrieval_ms + (time.perf_counter() - started) * 1000
+            cache.set(vectors[i], questions[i], scope, version, result, cost_ms)
+        return result
+
+    async for result in map_in_order(answer, range(len(questions)), concurrency or config.BATCH_ITEM_CONCURRENCY):
+        yield _error_result(result) if isinstance(result, Exception) else result
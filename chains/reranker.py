@@ -0,0 +1,206 @@
+"""Cross-encoder re-ranking of retrieved chunks, with a score cache and a latency budget."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+import config
+from utils.metrics import record_cache_lookups
+
+# Weight of the newest measurement in the running ms-per-pair estimate
+_COST_SMOOTHING = 0.2
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _query_hash(query: str) -> str:
+    return _hash(" ".join(query.lower().split()))
+
+
+def _chunk_id(doc) -> str:
+    # Content-addressed: a re-ingested chunk with new text never reuses an old score
+    return _hash(doc.page_content)
+
+
+class Reranker:
+    """
+    Re-orders retrieval candidates by cross-encoder relevance.
+
+    ``model`` is a sentence-transformers ``CrossEncoder`` (anything with
+    ``predict(pairs, batch_size=...)``). Scores are cached per (query hash,
+    chunk hash), so repeated questions only score new chunks. Each call has a
+    latency budget: if the estimated scoring time of the uncached pairs is
+    over budget, or scoring runs past it, the candidates are returned in
+    their original order and the scores computed so far are kept for the
+    next call.
+    """
+
+    def __init__(self, model, batch_size: int = 16, cache_size: int = 20000, budget_ms: float = 250.0):
+        self.model = model
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.budget_ms = budget_ms
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._ms_per_pair = None
+        self._stats = {
+            "calls": 0,
+            "reranked": 0,
+            "cache_hits": 0,
+            "pairs_scored": 0,
+            "skipped_over_budget": 0,
+            "stopped_at_budget": 0,
+            "errors": 0,
+            "score_time_ms": 0.0,
+        }
+
+    def rerank(self, query: str, docs: list, k: int, fallback_k: int = None) -> list:
+        """
+        Top k of docs by cross-encoder score.
+
+        Args:
+            query: The question.
+            docs: Candidates, in retrieval order.
+            k: Number of documents to return.
+            fallback_k: Documents returned (in retrieval order) when re-ranking
+                is skipped. Defaults to k.
+        """
+        return self.rerank_many([query], [docs], k, fallback_k)[0]
+
+    def rerank_many(self, queries: Sequence[str], candidates: Sequence[list], k: int, fallback_k: int = None) -> List[list]:
+        """
+        Re-rank several candidate lists; uncached pairs of all queries are scored together.
+
+        The budget scales with the number of queries. If it is exceeded,
+        every list falls back to its first fallback_k candidates.
+        """
+        fallback_k = fallback_k or k
+        started = time.perf_counter()
+        budget_ms = self.budget_ms * len(queries)
+        query_hashes = [_query_hash(query) for query in queries]
+        keys = [[(query_hash, _chunk_id(doc)) for doc in docs] for query_hash, docs in zip(query_hashes, candidates)]
+
+        with self._lock:
+            self._stats["calls"] += len(queries)
+            scores = {}
+            for row in keys:
+                for key in row:
+                    score = self._cache.get(key)
+                    if score is not None:
+                        self._cache.move_to_end(key)
+                        scores[key] = score
+            self._stats["cache_hits"] += len(scores)
+        record_cache_lookups("rerank", len(scores), sum(len(row) for row in keys) - len(scores))
+
+        pending = {}
+        for query, row, docs in zip(queries, keys, candidates):
+            for key, doc in zip(row, docs):
+                if key not in scores and key not in pending:
+                    pending[key] = (query, doc.page_content)
+
+        if pending and not self._score(pending, scores, started, budget_ms):
+            return [list(docs[:fallback_k]) for docs in candidates]
+
+        with self._lock:
+            self._stats["reranked"] += len(queries)
+        ranked = []
+        for row, docs in zip(keys, candidates):
+            order = sorted(range(len(docs)), key=lambda i: -scores[row[i]])
+            ranked.append([docs[i] for i in order[:k]])
+        return ranked
+
+    def _score(self, pending: dict, scores: dict, started: float, budget_ms: float) -> bool:
+        """Score pending pairs batch by batch into scores and the cache; False if the budget ran out."""
+        if self._ms_per_pair is not None and self._ms_per_pair * len(pending) > budget_ms:
+            with self._lock:
+                self._stats["skipped_over_budget"] += 1
+            return False
+
+        items = list(pending.items())
+        for offset in range(0, len(items), self.batch_size):
+            batch = items[offset:offset + self.batch_size]
+            batch_started = time.perf_counter()
+            try:
+                batch_scores = self.model.predict([pair for _, pair in batch], batch_size=self.batch_size, show_progress_bar=False)
+            except Exception as e:
+                print(f"⚠️  Re-ranking failed, keeping retrieval order: {str(e)}")
+                with self._lock:
+                    self._stats["errors"] += 1
+                return False
+            elapsed_ms = (time.perf_counter() - batch_started) * 1000
+
+            with self._lock:
+                cost = elapsed_ms / len(batch)
+                self._ms_per_pair = cost if self._ms_per_pair is None else (
+                    (1 - _COST_SMOOTHING) * self._ms_per_pair + _COST_SMOOTHING * cost
+                )
+                self._stats["pairs_scored"] += len(batch)
+                self._stats["score_time_ms"] += elapsed_ms
+                for (key, _), score in zip(batch, batch_scores):
+                    scores[key] = float(score)
+                    self._cache[key] = float(score)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            remaining = len(items) - offset - len(batch)
+            spent_ms = (time.perf_counter() - started) * 1000
+            if remaining and spent_ms + self._ms_per_pair * min(remaining, self.batch_size) > budget_ms:
+                with self._lock:
+                    self._stats["stopped_at_budget"] += 1
+                return False
+        return True
+
+    def stats(self) -> dict:
+        """Cache hits, pairs scored, budget fallbacks and scoring cost."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cache_entries"] = len(self._cache)
+            stats["ms_per_pair"] = round(self._ms_per_pair, 3) if self._ms_per_pair is not None else None
+        stats["score_time_ms"] = round(stats["score_time_ms"], 1)
+        stats["budget_ms"] = self.budget_ms
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+_reranker: Optional[Reranker] = None
+_reranker_failed = False
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[Reranker]:
+    """Get the shared re-ranker (loading the cross-encoder on first use), or None when disabled or unavailable."""
+    global _reranker, _reranker_failed
+    if not config.RERANK_ENABLED or _reranker_failed:
+        return None
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None and not _reranker_failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+
+                    print(f"🔄 Loading cross-encoder: {config.RERANK_MODEL}")
+                    model = CrossEncoder(config.RERANK_MODEL, max_length=512, device="cpu")
+                    _reranker = Reranker(
+                        model,
+                        batch_size=config.RERANK_BATCH_SIZE,
+                        cache_size=config.RERANK_CACHE_SIZE,
+                        budget_ms=config.RERANK_BUDGET_MS
+                    )
+                    print("✅ Cross-encoder loaded")
+                except Exception as e:
+                    # Retrieval keeps working without the stage; do not retry on every request
+                    _reranker_failed = True
+                    print(f"⚠️  Could not load cross-encoder, re-ranking disabled: {str(e)}")
+    return _reranker
+
+
+def reranker_stats() -> dict:
+    """Re-ranker counters (without loading the model)."""
+    if _reranker is None:
+        return {"enabled": config.RERANK_ENABLED, "loaded": False, "failed": _reranker_failed}
+    return {"enabled": config.RERANK_ENABLED, "loaded": True, **_reranker.stats()}
@@ -0,0 +1,203 @@
+"""Semantic cache for QA answers, keyed by question-embedding similarity."""
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+import numpy as np
+import config
+
+# Figures, periods and identifiers must match exactly: "Q3 revenue" and
+# "Q4 revenue" embed almost identically but have different answers
+_DIGIT_TOKEN = re.compile(r"[a-z$]*\d[\w.,%$-]*")
+
+
+def question_figures(question: str) -> frozenset:
+    """Tokens of the question that contain digits ("q3", "2025", "$10m")."""
+    return frozenset(token.rstrip(".,") for token in _DIGIT_TOKEN.findall(question.lower()))
+
+
+def make_scope(**options: Any) -> str:
+    """Hash of the retrieval options (filters, k, weights) an answer depends on."""
+    payload = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class SemanticHit(NamedTuple):
+    result: Dict[str, Any]
+    question: str
+    similarity: float
+
+
+class SemanticCache:
+    """
+    LRU cache of answers to earlier questions, looked up by cosine similarity.
+
+    Question vectors live in one preallocated float32 matrix, so a lookup is
+    a single matrix-vector product. A hit needs similarity >= ``threshold``,
+    the same retrieval scope and the same figures in the question. All
+    entries belong to one corpus version; a lookup or store with another
+    version clears the cache. Entries also expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = 2048, threshold: float = 0.9, ttl: float = 86400):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.version = None
+        self._vectors = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._slots = OrderedDict()  # slot -> entry dict, least recently used first
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "writes": 0, "evictions": 0, "expired": 0,
+                       "invalidations": 0, "saved_ms": 0.0, "lookup_ms": 0.0}
+
+    def _check_version(self, version: Optional[str]) -> None:
+        # Caller holds the lock
+        if version != self.version:
+            if self._slots:
+                self._stats["invalidations"] += 1
+            self._slots.clear()
+            self._valid[:] = False
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            self.version = version
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def get(self, vector, question: str, scope: str, version: Optional[str]) -> Optional[SemanticHit]:
+        """
+        Find the cached answer to the most similar earlier question.
+
+        Args:
+            vector: Embedding of the question.
+            question: The question text.
+            scope: make_scope() of the request's retrieval options.
+            version: Current corpus version.
+
+        Returns:
+            The cached result (a copy), the cached question and the similarity, or None.
+        """
+        started = time.perf_counter()
+        vector = self._normalize(vector)
+        figures = question_figures(question)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            self._stats["lookups"] += 1
+            hit = None
+            if self._slots and self._vectors is not None and self._vectors.shape[1] == len(vector):
+                scores = self._vectors @ vector
+                scores[~self._valid] = -np.inf
+                for slot in np.argsort(-scores)[:8]:
+                    if scores[slot] < self.threshold:
+                        break
+                    entry = self._slots[int(slot)]
+                    if now - entry["created_at"] > self.ttl:
+                        self._drop(int(slot))
+                        self._stats["expired"] += 1
+                        continue
+                    if entry["scope"] == scope and entry["figures"] == figures:
+                        self._slots.move_to_end(int(slot))
+                        hit = SemanticHit(copy.deepcopy(entry["result"]), entry["question"], float(scores[slot]))
+                        self._stats["saved_ms"] += entry["cost_ms"]
+                        break
+            self._stats["hits" if hit else "misses"] += 1
+            self._stats["lookup_ms"] += (time.perf_counter() - started) * 1000
+        return hit
+
+    def set(self, vector, question: str, scope: str, version: Optional[str], result: Dict[str, Any], cost_ms: float) -> None:
+        """
+        Cache a result.
+
+        Args:
+            vector, question, scope, version: As for get().
+            result: The answer dict to return on later hits.
+            cost_ms: What producing the result took, counted as saved on each hit.
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            if version != self.version and self._slots:
+                # Answered from a corpus that has since changed
+                return
+            self._check_version(version)
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+                self._slots.clear()
+                self._valid[:] = False
+                self._free = list(range(self.max_entries - 1, -1, -1))
+            if not self._free:
+                oldest = next(iter(self._slots))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._slots[slot] = {
+                "question": question,
+                "figures": question_figures(question),
+                "scope": scope,
+                "result": copy.deepcopy(result),
+                "cost_ms": cost_ms,
+                "created_at": time.time(),
+            }
+            self._stats["writes"] += 1
+
+    def _drop(self, slot: int) -> None:
+        # Caller holds the lock
+        del self._slots[slot]
+        self._valid[slot] = False
+        self._free.append(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._slots.clear()
+            self._valid[:] = False
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self) -> dict:
+        """Hit rate, latency saved and size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._slots)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["avg_lookup_ms"] = round(stats["lookup_ms"] / stats["lookups"], 3) if stats["lookups"] else None
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["lookup_ms"] = round(stats["lookup_ms"], 1)
+        stats["threshold"] = self.threshold
+        return stats
+
+
+_semantic_cache: Optional[SemanticCache] = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Get the shared semantic cache, or None when it is disabled."""
+    global _semantic_cache
+    if not config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        with _semantic_cache_lock:
+            if _semantic_cache is None:
+                _semantic_cache = SemanticCache(
+                    max_entries=config.SEMANTIC_CACHE_MAX_ENTRIES,
+                    threshold=config.SEMANTIC_CACHE_THRESHOLD,
+                    ttl=config.SEMANTIC_CACHE_TTL
+                )
+    return _semantic_cache
+
+
+def semantic_cache_stats() -> dict:
+    """Stats for the shared semantic cache (or a disabled marker)."""
+    cache = get_semantic_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -1,79 +1,285 @@
 """Summary chain for long text summarization using Gemini."""
-from chains.gemini_helper import ask_gemini
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, List, Optional, Tuple
+from chains.gemini_helper import ask_gemini, ask_gemini_async, generate_text, generate_text_async, stream_text_async
 from ingestion.text_processor import chunk_text
 import config
+from utils.metrics import span
 
 
-def summarize_text(text: str, max_length: int = 500) -> str:
+_FAILED_PREFIX = "Error generating summary"
+
+
+def _precheck(text: str):
+    """Return an error string if the text cannot be summarized, else None."""
+    if not text or len(text.strip()) == 0:
+        return "No text provided for summarization."
+    
+    if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "your_actual_gemini_key_here":
+        return "Error: GEMINI_API_KEY not configured"
+    
+    return None
+
+
+def short_summary_prompt(text: str, max_length: int) -> str:
+    """Prompt for summarizing a text that fits in one call."""
+    return f"""Summarize the following text in approximately {max_length} words.
+Be concise and capture the key points.
+
+Text:
+{text}
+
+Summary:"""
+
+
+def chunk_summary_prompt(chunk: str, index: int, total: int) -> str:
+    """Prompt for summarizing one chunk of a long text."""
+    return f"""Write a concise summary of the following text chunk ({index+1}/{total}):
+
+{chunk}
+
+Concise summary:"""
+
+
+def combine_summaries_prompt(chunk_summaries: List[str], max_length: int) -> str:
+    """Prompt for combining chunk summaries into the final summary."""
+    combined_text = "\n\n".join(chunk_summaries)
+    
+    if len(combined_text) > 3000:
+        # If combined summaries are still too long, summarize again
+        return f"""The following are summaries of different sections of a document.
+Combine them into a final, comprehensive summary in approximately {max_length} words:
+
+{combined_text}
+
+Final comprehensive summary:"""
+    
+    return f"""Combine the following summaries into a final, comprehensive summary in approximately {max_length} words:
+
+{combined_text}
+
+Final summary:"""
+
+
+def section_summaries_prompt(summaries: List[str]) -> str:
+    """Prompt for condensing a group of section summaries (one tree-reduce step)."""
+    combined_text = "\n\n".join(summaries)
+    return f"""The following are summaries of consecutive sections of a document.
+Condense them into one concise summary that keeps every key point:
+
+{combined_text}
+
+Concise summary:"""
+
+
+def group_summaries(summaries: List[str], max_chars: int = None) -> List[List[str]]:
+    """
+    Group consecutive summaries for one level of the tree reduce.
+    
+    Each group fits in max_chars where possible and holds at least two
+    summaries, so every level strictly shrinks the list.
+    """
+    if max_chars is None:
+        max_chars = config.SUMMARY_REDUCE_MAX_CHARS
+    
+    groups = []
+    current = []
+    current_len = 0
+    for summary in summaries:
+        if len(current) >= 2 and current_len + len(summary) > max_chars:
+            groups.append(current)
+            current = []
+            current_len = 0
+        current.append(summary)
+        current_len += len(summary) + 2
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+def _needs_reduce(summaries: List[str]) -> bool:
+    return len(summaries) > 1 and len("\n\n".join(summaries)) > config.SUMMARY_REDUCE_MAX_CHARS
+
+
+def _try_generate(prompt: str, use_cache: bool = True) -> Optional[str]:
+    """Summarize one prompt; the shared LLM client retries transient errors. Returns None on failure."""
+    try:
+        return generate_text(prompt, temperature=0.3, use_cache=use_cache)
+    except Exception as e:
+        print(f"⚠️  Summary call failed: {str(e)}")
+        return None
+
+
+async def _try_generate_async(prompt: str, semaphore: asyncio.Semaphore, use_cache: bool = True) -> Optional[str]:
+    """Async variant of _try_generate, holding one fan-out slot."""
+    try:
+        async with semaphore:
+            return await generate_text_async(prompt, temperature=0.3, use_cache=use_cache)
+    except Exception as e:
+        print(f"⚠️  Summary call failed: {str(e)}")
+        return None
+
+
+def _map_prompts(prompts: List[str], use_cache: bool = True) -> List[Optional[str]]:
+    """Run prompts concurrently (bounded by SUMMARY_MAP_CONCURRENCY), keeping order; failed prompts give None."""
+    workers = max(1, min(config.SUMMARY_MAP_CONCURRENCY, len(prompts)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda p: _try_generate(p, use_cache), prompts))
+
+
+async def _map_prompts_async(prompts: List[str], use_cache: bool = True) -> List[Optional[str]]:
+    """Async variant of _map_prompts."""
+    semaphore = asyncio.Semaphore(max(1, config.SUMMARY_MAP_CONCURRENCY))
+    return list(await asyncio.gather(*[_try_generate_async(p, semaphore, use_cache) for p in prompts]))
+
+
+def _map_error(results: List[Optional[str]], what: str) -> Optional[str]:
+    """
+    Error message if any summary in a map or reduce level failed, else None.
+
+    The shared LLM client has already retried transient errors, so a
+    failed call is final; summarizing without it would silently leave
+    sections of the document out.
+    """
+    failed = sum(1 for r in results if not r)
+    if not failed:
+        return None
+    return f"{_FAILED_PREFIX}: {failed} of {len(results)} {what} failed"
+
+
+def is_failed_summary(summary: str) -> bool:
+    """True for the error strings returned when summary generation failed (rather than a summary)."""
+    return summary.startswith(_FAILED_PREFIX)
+
+
+def _error_message(e: Exception) -> str:
+    error_msg = f"{_FAILED_PREFIX}: {str(e)}"
+    print(error_msg)
+    return error_msg
+
+
+def summarize_text(text: str, max_length: int = 500, use_cache: bool = True) -> str:
     """
     Summarize a long text using Gemini.
     
+    Long texts are summarized map-reduce style: chunk summaries run
+    concurrently, then are condensed level by level until they fit in one
+    final combine call.
+    
     Args:
         text: Text to summarize.
         max_length: Maximum length of the summary (in words).
+        use_cache: Allow responses to come from the LLM response cache.
         
     Returns:
         Summary text.
     """
-    if not text or len(text.strip()) == 0:
-        return "No text provided for summarization."
-    
-    if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "your_actual_gemini_key_here":
-        return "Error: GEMINI_API_KEY not configured"
+    error = _precheck(text)
+    if error:
+        return error
     
     try:
         # If text is short, use simple summarization
         if len(text) < 3000:
-            prompt = f"""Summarize the following text in approximately {max_length} words.
-Be concise and capture the key points.
-
-Text:
-{text}
-
-Summary:"""
-            
-            summary = ask_gemini(prompt, temperature=0.3)
-            return summary
+            return ask_gemini(short_summary_prompt(text, max_length), temperature=0.3, use_cache=use_cache)
         
         # For long texts, chunk and summarize each chunk, then combine
-        chunks = chunk_text(text, chunk_size=3000, chunk_overlap=200)
+        with span("chunking"):
+            chunks = chunk_text(text, chunk_size=3000, chunk_overlap=200, length_mode="chars")
         
         if not chunks:
             return "Error: Could not chunk text for summarization"
         
-        # Summarize each chunk
-        chunk_summaries = []
-        for i, chunk in enumerate(chunks):
-            prompt = f"""Write a concise summary of the following text chunk ({i+1}/{len(chunks)}):
-
-{chunk}
-
-Concise summary:"""
-            summary = ask_gemini(prompt, temperature=0.3)
-            chunk_summaries.append(summary)
+        # Map: summarize chunks concurrently
+        chunk_summaries = _map_prompts([chunk_summary_prompt(chunk, i, len(chunks)) for i, chunk in enumerate(chunks)], use_cache)
+        error = _map_error(chunk_summaries, "chunk summaries")
+        if error:
+            return error
+        
+        # Tree reduce while the combined summaries are still too long
+        while _needs_reduce(chunk_summaries):
+            chunk_summaries = _map_prompts([section_summaries_prompt(g) for g in group_summaries(chunk_summaries)], use_cache)
+            error = _map_error(chunk_summaries, "section summaries")
+            if error:
+                return error
         
         # Combine summaries
-        combined_text = "\n\n".join(chunk_summaries)
+        final_summary = ask_gemini(combine_summaries_prompt(chunk_summaries, max_length), temperature=0.3, use_cache=use_cache)
+        return final_summary
         
-        if len(combined_text) > 3000:
-            # If combined summaries are still too long, summarize again
-            final_prompt = f"""The following are summaries of different sections of a document.
-Combine them into a final, comprehensive summary in approximately {max_length} words:
+    except Exception as e:
+        return _error_message(e)
 
-{combined_text}
 
-Final comprehensive summary:"""
-        else:
-            final_prompt = f"""Combine the following summaries into a final, comprehensive summary in approximately {max_length} words:
+async def _final_prompt_async(text: str, max_length: int, use_cache: bool) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Run the map and reduce phases and build the final summary prompt.
+    
+    Returns:
+        (prompt, None) on success, or (None, error message).
+    """
+    if len(text) < 3000:
+        return short_summary_prompt(text, max_length), None
+    
+    with span("chunking"):
+        chunks = chunk_text(text, chunk_size=3000, chunk_overlap=200, length_mode="chars")
+    
+    if not chunks:
+        return None, "Error: Could not chunk text for summarization"
+    
+    chunk_summaries = await _map_prompts_async([chunk_summary_prompt(chunk, i, len(chunks)) for i, chunk in enumerate(chunks)], use_cache)
+    error = _map_error(chunk_summaries, "chunk summaries")
+    if error:
+        return None, error
+    
+    while _needs_reduce(chunk_summaries):
+        chunk_summaries = await _map_prompts_async([section_summaries_prompt(g) for g in group_summaries(chunk_summaries)], use_cache)
+        error = _map_error(chunk_summaries, "section summaries")
+        if error:
+            return None, error
+    
+    return combine_summaries_prompt(chunk_summaries, max_length), None
 
-{combined_text}
 
-Final summary:"""
+async def summarize_text_async(text: str, max_length: int = 500, use_cache: bool = True) -> str:
+    """Async variant of summarize_text using the async Gemini client."""
+    error = _precheck(text)
+    if error:
+        return error
+    
+    try:
+        prompt, error = await _final_prompt_async(text, max_length, use_cache)
+        if error:
+            return error
+        return await ask_gemini_async(prompt, temperature=0.3, use_cache=use_cache)
         
-        final_summary = ask_gemini(final_prompt, temperature=0.3)
-        return final_summary
+    except Exception as e:
+        return _error_message(e)
+
+
+async def stream_summary_async(text: str, max_length: int = 500, use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream a summary as ("token", text) events.
+    
+    For long texts the map and reduce phases complete first; only the final
+    combine call is streamed. Failures are yielded as ("error", message).
+    """
+    error = _precheck(text)
+    if error:
+        yield "error", error
+        return
+    
+    try:
+        prompt, error = await _final_prompt_async(text, max_length, use_cache)
+        if error:
+            yield "error", error
+            return
+        async for piece in stream_text_async(prompt, temperature=0.3, use_cache=use_cache):
+            yield "token", piece
         
     except Exception as e:
-        error_msg = f"Error generating summary: {str(e)}"
-        print(error_msg)
-        return error_msg
+        yield "error", _error_message(e)
@@ -9,22 +9,125 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")  # Updated to latest stable
 
+# Model discovery cache (seconds)
+MODEL_CACHE_TTL = float(os.getenv("MODEL_CACHE_TTL", "3600"))
+MODEL_CACHE_NEGATIVE_TTL = float(os.getenv("MODEL_CACHE_NEGATIVE_TTL", "60"))
+MODEL_REFRESH_INTERVAL = float(os.getenv("MODEL_REFRESH_INTERVAL", "1800"))
+
+# LLM response cache (LLM_CACHE_DISK_PATH enables the SQLite tier)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DISK_PATH = os.getenv("LLM_CACHE_DISK_PATH", "")
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "100000"))
+
+# Shared Gemini client limits (a rate of 0 disables that limit; LLM_BREAKER_FAILURES=0 disables the breaker)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+
+# Semantic answer cache for /qa (paraphrased questions reuse an earlier answer)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+
 # Embedding Configuration (Local)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
-# Vector Store Configuration
+# Embedding service (query cache and micro-batching)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "2"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+
+# Vector Store Configuration ("chroma", or "numpy"/"hnsw" to search an in-process index built from Chroma)
 VECTOR_STORE_TYPE = os.getenv("VECTOR_STORE_TYPE", "chroma")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+# Memory-mapped embedding snapshots for the numpy/hnsw backends (shared by all workers)
+VECTOR_SNAPSHOT_ENABLED = os.getenv("VECTOR_SNAPSHOT_ENABLED", "True").lower() == "true"
+VECTOR_SNAPSHOT_KEEP = int(os.getenv("VECTOR_SNAPSHOT_KEEP", "2"))
+VECTOR_SNAPSHOT_CHECK_INTERVAL = float(os.getenv("VECTOR_SNAPSHOT_CHECK_INTERVAL", "5"))
+
+# Hybrid retrieval: BM25 keyword search fused with dense search by reciprocal-rank fusion
+BM25_ENABLED = os.getenv("BM25_ENABLED", "True").lower() == "true"
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+HYBRID_DENSE_WEIGHT = float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0"))
+HYBRID_BM25_WEIGHT = float(os.getenv("HYBRID_BM25_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Optional cross-encoder re-ranking of retrieval candidates (local, CPU)
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "2"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))
+
+# Prompt context packing (tokens estimated at ~4 characters each; 0 = no budget)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
 
 # Security & Processing
 ENABLE_GUARDRAILS = os.getenv("ENABLE_GUARDRAILS", "True").lower() == "true"
+GUARDRAIL_RULES_FILE = os.getenv("GUARDRAIL_RULES_FILE", "")
+GUARDRAIL_RELOAD_INTERVAL = float(os.getenv("GUARDRAIL_RELOAD_INTERVAL", "2"))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# "chars" or "tokens" (CHUNK_SIZE / CHUNK_OVERLAP counted in embedding-model tokens)
+CHUNK_LENGTH_MODE = os.getenv("CHUNK_LENGTH_MODE", "chars")
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "")
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "0"))
+
+# Concurrency
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "8"))
+QA_MAX_CONCURRENCY = int(os.getenv("QA_MAX_CONCURRENCY", "16"))
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+EXTRACT_MAX_CONCURRENCY = int(os.getenv("EXTRACT_MAX_CONCURRENCY", "8"))
+AUTO_MAX_CONCURRENCY = int(os.getenv("AUTO_MAX_CONCURRENCY", "8"))
+
+# Local /auto router (falls back to Gemini below ROUTER_MIN_CONFIDENCE)
+ROUTER_LOCAL_ENABLED = os.getenv("ROUTER_LOCAL_ENABLED", "True").lower() == "true"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.6"))
+ROUTER_CACHE_SIZE = int(os.getenv("ROUTER_CACHE_SIZE", "2048"))
+
+# Batch endpoints (/qa/batch, /summary/batch, /extract/batch)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "2"))
+BATCH_ITEM_CONCURRENCY = int(os.getenv("BATCH_ITEM_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Long-text summarization (map-reduce)
+SUMMARY_MAP_CONCURRENCY = int(os.getenv("SUMMARY_MAP_CONCURRENCY", "8"))
+SUMMARY_REDUCE_MAX_CHARS = int(os.getenv("SUMMARY_REDUCE_MAX_CHARS", "3000"))
+
+# Document loading (LOADER_WORKERS=0 uses one process per core)
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", "0"))
+LOADER_FILE_TIMEOUT = float(os.getenv("LOADER_FILE_TIMEOUT", "120"))
+
+# Streaming ingestion pipeline
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "512"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
 
 # Paths
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 DOCUMENTS_DIR = os.path.join(DATA_DIR, "documents")
 VECTORSTORE_DIR = os.path.join(DATA_DIR, "vectorstore")
 CHROMA_PERSIST_DIR = os.path.join(VECTORSTORE_DIR, "chroma_db")
+VECTOR_INDEX_DIR = os.path.join(VECTORSTORE_DIR, "index")
+BM25_INDEX_PATH = os.path.join(VECTORSTORE_DIR, "bm25")
+INGEST_MANIFEST_PATH = os.path.join(VECTORSTORE_DIR, "ingest_manifest.json")
 
 # Ensure directories exist
 os.makedirs(DOCUMENTS_DIR, exist_ok=True)
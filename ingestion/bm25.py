@@ -0,0 +1,349 @@
+"""BM25 keyword index over the ingested chunks, kept in sync with the vector store."""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import config
+from ingestion.metadata import FILTERABLE_KEYS, MetadataColumns
+
+# Tickers, SKUs, figures and words: "NVDA", "SKU-4411", "$10.5M", "12.5%", "Q3"
+_TOKEN = re.compile(r"\$?[a-z0-9]+(?:[.,/_\-][a-z0-9]+)*%?")
+_SEPARATOR = re.compile(r"[\-/_]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which who will with".split()
+)
+
+# Rows read from Chroma per get() when rebuilding the index
+_LOAD_BATCH_SIZE = 10_000
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased search terms.
+
+    Compound tokens are kept whole so exact identifiers and figures match
+    ("sku-4411", "$10.5m", "12.5%"); the bare figure and the parts of
+    hyphenated or slashed identifiers are added so "4411" or "10.5m" still
+    match.
+    """
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if token.isalnum():
+            continue
+        core = token.strip("$%")
+        if core != token:
+            terms.append(core)
+        parts = _SEPARATOR.split(core)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part and part not in _STOPWORDS)
+    return terms
+
+
+class _Frozen(NamedTuple):
+    """Read-only search structures; replaced as a whole by commit()."""
+    ids: List[str]
+    term_offsets: np.ndarray   # postings of term t are [term_offsets[t], term_offsets[t + 1])
+    post_rows: np.ndarray      # row of each posting, grouped by term
+    post_impacts: np.ndarray   # precomputed BM25 contribution of each posting
+    columns: MetadataColumns   # metadata columns for filters
+
+
+class BM25Index:
+    """
+    Inverted BM25 index with incremental updates.
+
+    Chunks are added and removed by ID as files are ingested. ``commit``
+    rebuilds the postings: each posting stores its full BM25 contribution
+    (idf times the saturated, length-normalized term frequency), so a query
+    is a gather of its terms' postings plus one bincount, with no per-document
+    Python work.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.signature = None
+        self._vocab = {}
+        self._rows = {}          # chunk id -> (term ids, term frequencies, metadata)
+        self._lock = threading.Lock()
+        self._frozen = None
+        self._dirty = False
+        self._last_commit_seconds = None
+        self._stamp = None       # stat of the saved .json this index matches
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]] = None) -> None:
+        """Add (or replace) chunks. Searches see them after commit()."""
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                terms = np.fromiter(
+                    (self._vocab.setdefault(term, len(self._vocab)) for term in tokenize(text)),
+                    dtype=np.int32
+                )
+                unique, counts = np.unique(terms, return_counts=True)
+                filterable = {key: value for key, value in (metadata or {}).items() if key in FILTERABLE_KEYS}
+                self._rows[chunk_id] = (unique.astype(np.int32), counts.astype(np.float32), filterable)
+            self._dirty = True
+
+    def remove(self, ids: List[str]) -> None:
+        """Remove chunks by ID. Searches stop seeing them after commit()."""
+        with self._lock:
+            for chunk_id in ids:
+                if self._rows.pop(chunk_id, None) is not None:
+                    self._dirty = True
+
+    def commit(self, signature: str = None) -> None:
+        """Rebuild the postings from the current chunks, publish them and save."""
+        if signature is not None:
+            with self._lock:
+                self.signature = signature
+        self._publish()
+        if self.path:
+            self.save()
+
+    def _publish(self) -> None:
+        """Rebuild the postings from the current chunks and swap them in for searches."""
+        started = time.perf_counter()
+        with self._lock:
+            ids = list(self._rows)
+            rows = [self._rows[chunk_id] for chunk_id in ids]
+            vocab_size = len(self._vocab)
+
+        n = len(ids)
+        lengths = np.array([counts.sum() for _, counts, _ in rows], dtype=np.float32)
+        terms = np.concatenate([t for t, _, _ in rows]) if rows else np.zeros(0, dtype=np.int32)
+        tfs = np.concatenate([c for _, c, _ in rows]) if rows else np.zeros(0, dtype=np.float32)
+        row_of_posting = np.repeat(np.arange(n, dtype=np.int32), [len(t) for t, _, _ in rows])
+
+        df = np.bincount(terms, minlength=vocab_size).astype(np.float32)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avg_length = float(lengths.mean()) if n else 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / max(avg_length, 1e-9))
+        impacts = idf[terms] * tfs * (self.k1 + 1.0) / (tfs + norm[row_of_posting])
+
+        order = np.argsort(terms, kind="stable")
+        term_offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(df.astype(np.int64), out=term_offsets[1:])
+        frozen = _Frozen(
+            ids=ids,
+            term_offsets=term_offsets,
+            post_rows=row_of_posting[order],
+            post_impacts=impacts[order].astype(np.float32),
+            columns=MetadataColumns([metadata for _, _, metadata in rows]),
+        )
+        with self._lock:
+            self._frozen = frozen
+            self._dirty = False
+        self._last_commit_seconds = time.perf_counter() - started
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k chunk IDs by BM25 score.
+
+        Args:
+            query: Query text.
+            k: Number of results.
+            where: Optional Chroma-style where clause on the chunk metadata.
+
+        Returns:
+            (chunk_id, score) pairs, best first; chunks matching no query term are left out.
+        """
+        frozen = self._frozen
+        if frozen is None or not frozen.ids:
+            return []
+        term_ids = {}
+        for term in tokenize(query):
+            term_id = self._vocab.get(term)
+            if term_id is not None and term_id + 1 < len(frozen.term_offsets):
+                term_ids[term_id] = term_ids.get(term_id, 0) + 1
+        if not term_ids:
+            return []
+
+        spans = [(frozen.term_offsets[t], frozen.term_offsets[t + 1], count) for t, count in term_ids.items()]
+        rows = np.concatenate([frozen.post_rows[start:end] for start, end, _ in spans])
+        impacts = np.concatenate([frozen.post_impacts[start:end] * count for start, end, count in spans])
+        n = len(frozen.ids)
+        if len(rows) * 16 < n:
+            # Few postings: score only the rows they touch
+            candidates, inverse = np.unique(rows, return_inverse=True)
+            scores = np.bincount(inverse, weights=impacts).astype(np.float32)
+        else:
+            # Every impact is positive, so rows with a non-zero total are exactly the matches
+            totals = np.bincount(rows, weights=impacts, minlength=n)
+            candidates = np.flatnonzero(totals)
+            scores = totals[candidates].astype(np.float32)
+
+        if where:
+            keep = frozen.columns.mask(where)[candidates]
+            candidates, scores = candidates[keep], scores[keep]
+        if not len(candidates):
+            return []
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(frozen.ids[candidates[i]], float(scores[i])) for i in top]
+
+    def metadata(self, chunk_id: str) -> Dict[str, Any]:
+        """Filterable metadata stored for a chunk ({} if unknown)."""
+        row = self._rows.get(chunk_id)
+        return dict(row[2]) if row is not None else {}
+
+    def save(self, path: str = None) -> None:
+        """Write the index atomically (arrays in .npz, vocabulary and IDs in .json)."""
+        path = path or self.path
+        with self._lock:
+            ids = list(self._rows)
+            rows = [self._rows[chunk_id] for chunk_id in ids]
+            vocab = list(self._vocab)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t, _, _ in rows], out=offsets[1:])
+        arrays = {
+            "offsets": offsets,
+            "terms": np.concatenate([t for t, _, _ in rows]) if rows else np.zeros(0, dtype=np.int32),
+            "tfs": np.concatenate([c for _, c, _ in rows]) if rows else np.zeros(0, dtype=np.float32),
+        }
+        header = {
+            "version": self.VERSION,
+            "signature": self.signature,
+            "k1": self.k1,
+            "b": self.b,
+            "vocab": vocab,
+            "ids": ids,
+            "metadatas": [metadata for _, _, metadata in rows],
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(f"{tmp_path}.npz", "wb") as f:
+            np.savez(f, **arrays)
+        with open(f"{tmp_path}.json", "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(f"{tmp_path}.npz", f"{path}.npz")
+        os.replace(f"{tmp_path}.json", f"{path}.json")
+        if path == self.path:
+            self._stamp = _saved_stamp(path)
+
+    @classmethod
+    def load(cls, path: str, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Load a saved index, or return an empty one if it is missing, unreadable or built with other parameters."""
+        index = cls(path, k1=k1, b=b)
+        if not (os.path.exists(f"{path}.json") and os.path.exists(f"{path}.npz")):
+            return index
+        # Stat before reading, so a save racing with the load is picked up by the next check
+        stamp = _saved_stamp(path)
+        try:
+            with open(f"{path}.json", "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if (header.get("version"), header.get("k1"), header.get("b")) != (cls.VERSION, k1, b):
+                return index
+            arrays = np.load(f"{path}.npz")
+            offsets, terms, tfs = arrays["offsets"], arrays["terms"], arrays["tfs"]
+            index._vocab = {term: i for i, term in enumerate(header["vocab"])}
+            for i, (chunk_id, metadata) in enumerate(zip(header["ids"], header["metadatas"])):
+                start, end = offsets[i], offsets[i + 1]
+                index._rows[chunk_id] = (terms[start:end], tfs[start:end], metadata)
+            index.signature = header.get("signature")
+            index._publish()
+            index._stamp = stamp
+        except Exception as e:
+            print(f"⚠️  Could not read BM25 index {path}: {str(e)}")
+            return cls(path, k1=k1, b=b)
+        return index
+
+    def saved_changed(self) -> bool:
+        """Whether the saved index was rewritten (e.g. by another worker's sync) since this one was loaded or saved."""
+        return bool(self.path) and _saved_stamp(self.path) not in (None, self._stamp)
+
+    def rebuild_from(self, collection, signature: str = None) -> None:
+        """Re-index every chunk stored in a Chroma collection."""
+        # The vocabulary is kept: term IDs must stay valid for searches on the published postings
+        with self._lock:
+            self._rows = {}
+        total = collection.count()
+        for offset in range(0, total, _LOAD_BATCH_SIZE):
+            batch = collection.get(limit=_LOAD_BATCH_SIZE, offset=offset, include=["documents", "metadatas"])
+            self.add(batch["ids"], batch["documents"], batch["metadatas"])
+        self.commit(signature)
+
+    def stats(self) -> dict:
+        frozen = self._frozen
+        return {
+            "chunks": len(self._rows),
+            "terms": len(self._vocab),
+            "postings": int(len(frozen.post_rows)) if frozen is not None else 0,
+            "uncommitted": self._dirty,
+            "last_commit_ms": round(self._last_commit_seconds * 1000, 2) if self._last_commit_seconds is not None else None,
+        }
+
+
+def _saved_stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Modification time and size of a saved index's .json (written last by save), or None if missing."""
+    try:
+        stat = os.stat(f"{path}.json")
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+_bm25_index: Optional[BM25Index] = None
+_bm25_lock = threading.Lock()
+
+
+def get_bm25_index() -> Optional[BM25Index]:
+    """
+    Get the shared BM25 index, or None when BM25 is disabled.
+
+    The index is loaded from disk on first use and reloaded when the saved
+    index changes signature (a stat per call), so syncs done by other
+    workers are picked up as they are for the vector snapshots.
+    """
+    global _bm25_index
+    if not config.BM25_ENABLED:
+        return None
+    index = _bm25_index
+    if index is not None and not index.saved_changed():
+        return index
+    with _bm25_lock:
+        index = _bm25_index
+        if index is None:
+            _bm25_index = BM25Index.load(config.BM25_INDEX_PATH, k1=config.BM25_K1, b=config.BM25_B)
+        elif index.saved_changed():
+            saved = BM25Index.load(config.BM25_INDEX_PATH, k1=config.BM25_K1, b=config.BM25_B)
+            if saved.signature is not None and saved.signature != index.signature:
+                print(f"🔄 Reloaded BM25 index saved by another worker ({len(saved)} chunks)")
+                _bm25_index = saved
+            else:
+                # Same corpus, or unreadable: keep serving the current postings
+                index._stamp = _saved_stamp(config.BM25_INDEX_PATH)
+        return _bm25_index
+
+
+def open_bm25_index(collection, signature: str) -> Optional[BM25Index]:
+    """
+    Get the shared BM25 index, re-indexing the collection if the saved index
+    does not match the ingested corpus (signature from the ingest manifest).
+    """
+    index = get_bm25_index()
+    if index is not None and index.signature != signature:
+        print("🔎 Rebuilding BM25 index from the vector store...")
+        index.rebuild_from(collection, signature)
+        print(f"✅ BM25 index ready ({len(index)} chunks in {index.stats()['last_commit_ms']} ms commit)")
+    return index
+
+
+def bm25_stats() -> dict:
+    """BM25 index counters (without loading the index)."""
+    if _bm25_index is None:
+        return {"enabled": config.BM25_ENABLED, "loaded": False}
+    return {"enabled": config.BM25_ENABLED, "loaded": True, **_bm25_index.stats()}
@@ -1,76 +1,215 @@
 """Document loader for various file formats."""
 import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterator, List, Tuple
 from pypdf import PdfReader
 from docx import Document
 import config
+from ingestion.metadata import PAGE_BREAK
+from utils.concurrency import new_process_pool, process_context
 
+SUPPORTED_EXTENSIONS = {'.txt', '.pdf', '.docx', '.md'}
 
-def load_documents(documents_dir: str = None) -> List[str]:
+# Plain-text formats are cheap to read, so they are loaded in-process
+_INLINE_EXTENSIONS = {'.txt', '.md'}
+
+
+def list_document_paths(documents_dir: str = None) -> List[str]:
     """
-    Load documents from the documents directory.
-    
-    Supports: .txt, .pdf, .docx, .md
-    
+    List supported document files in a directory, sorted by name.
+
     Args:
         documents_dir: Directory containing documents. Defaults to config.DOCUMENTS_DIR.
-        
+
     Returns:
-        List of document texts.
+        List of file paths.
     """
     if documents_dir is None:
         documents_dir = config.DOCUMENTS_DIR
-    
-    documents = []
-    supported_extensions = {'.txt', '.pdf', '.docx', '.md'}
-    
+
     if not os.path.exists(documents_dir):
         print(f"Warning: Documents directory {documents_dir} does not exist.")
-        return documents
-    
-    for file_path in Path(documents_dir).iterdir():
-        if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-            try:
-                text = load_single_document(str(file_path))
+        return []
+
+    return [
+        str(file_path)
+        for file_path in sorted(Path(documents_dir).iterdir())
+        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS
+    ]
+
+
+def load_documents(documents_dir: str = None) -> List[str]:
+    """
+    Load documents from the documents directory.
+
+    Supports: .txt, .pdf, .docx, .md
+
+    Args:
+        documents_dir: Directory containing documents. Defaults to config.DOCUMENTS_DIR.
+
+    Returns:
+        List of document texts, in file name order.
+    """
+    paths = list_document_paths(documents_dir)
+    loaded = dict(iter_documents(paths=paths))
+    return [loaded[path] for path in paths if path in loaded]
+
+
+def iter_documents(documents_dir: str = None, paths: List[str] = None, workers: int = None, timeout: float = None) -> Iterator[Tuple[str, str]]:
+    """
+    Load documents in parallel, yielding each one as soon as it is parsed.
+
+    PDF and DOCX files are parsed on a process pool; a file that takes longer
+    than the timeout is skipped so one corrupt PDF cannot stall the run.
+    Files that fail to load or are empty are reported and skipped.
+
+    Args:
+        documents_dir: Directory containing documents. Defaults to config.DOCUMENTS_DIR.
+        paths: Explicit file paths to load instead of scanning documents_dir.
+        workers: Process count. Defaults to config.LOADER_WORKERS (0 = one per core).
+        timeout: Per-file timeout in seconds. Defaults to config.LOADER_FILE_TIMEOUT (0 = none).
+
+    Yields:
+        (file_path, text) tuples in completion order.
+    """
+    if paths is None:
+        paths = list_document_paths(documents_dir)
+    if workers is None:
+        workers = config.LOADER_WORKERS or os.cpu_count() or 1
+    if timeout is None:
+        timeout = config.LOADER_FILE_TIMEOUT
+
+    heavy = []
+    for path in paths:
+        if Path(path).suffix.lower() in _INLINE_EXTENSIONS:
+            text = _load_or_report(path)
+            if text:
+                yield path, text
+        else:
+            heavy.append(path)
+
+    # Only a worker process can be stopped when a file hangs, so with a timeout
+    # even a single PDF (the usual incremental sync) goes through the pool
+    if heavy and not timeout and (len(heavy) == 1 or workers <= 1):
+        for path in heavy:
+            text = _load_or_report(path)
+            if text:
+                yield path, text
+    elif heavy:
+        yield from _iter_parallel(heavy, load_single_document, workers, timeout)
+
+
+def _load_or_report(path: str) -> str:
+    try:
+        text = load_single_document(path)
+        if text:
+            print(f"Loaded: {Path(path).name}")
+        return text
+    except Exception as e:
+        print(f"Error loading {Path(path).name}: {str(e)}")
+        return ""
+
+
+def _report_pid(pids) -> None:
+    """Pool initializer: tell the parent this worker's PID, so it can be killed if a file hangs."""
+    pids.put(os.getpid())
+
+
+def _new_loader_pool(workers: int) -> Tuple[ProcessPoolExecutor, object]:
+    """A process pool plus the queue its workers report their PIDs on."""
+    pids = process_context().SimpleQueue()
+    return new_process_pool(workers, initializer=_report_pid, initargs=(pids,)), pids
+
+
+def _terminate_pool(pool: ProcessPoolExecutor, pids) -> None:
+    # ProcessPoolExecutor cannot cancel a running task, so its workers are killed; a worker
+    # that has not reported its PID yet has not started a file and exits on shutdown
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), signal.SIGTERM)
+        except OSError:
+            pass  # already exited
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_parallel(paths: List[str], loader: Callable[[str], str], workers: int, timeout: float) -> Iterator[Tuple[str, str]]:
+    """Run loader over paths on a process pool, yielding (path, text) as files finish."""
+    workers = max(1, min(workers, len(paths)))
+    pending = deque(paths)
+    in_flight = {}
+    pool, pids = _new_loader_pool(workers)
+    try:
+        while pending or in_flight:
+            # Keep at most one file per worker in flight, so submit time is start time
+            while pending and len(in_flight) < workers:
+                path = pending.popleft()
+                in_flight[pool.submit(loader, path)] = (path, time.monotonic())
+
+            wait_for = None
+            if timeout:
+                oldest = min(started for _, started in in_flight.values())
+                wait_for = max(0.0, oldest + timeout - time.monotonic())
+            done, _ = wait(list(in_flight), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                path, _ = in_flight.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    print(f"Error loading {Path(path).name}: {str(e)}")
+                    continue
                 if text:
-                    documents.append(text)
-                    print(f"Loaded: {file_path.name}")
-            except Exception as e:
-                print(f"Error loading {file_path.name}: {str(e)}")
-    
-    return documents
+                    print(f"Loaded: {Path(path).name}")
+                    yield path, text
+
+            if timeout and not done:
+                now = time.monotonic()
+                expired = [f for f, (_, started) in in_flight.items() if now - started >= timeout]
+                for future in expired:
+                    path, _ = in_flight.pop(future)
+                    print(f"Error loading {Path(path).name}: timed out after {timeout:.0f}s")
+                if expired:
+                    # Restart the pool to reclaim stuck workers; requeue the other in-flight files
+                    for path, _ in in_flight.values():
+                        pending.appendleft(path)
+                    in_flight.clear()
+                    _terminate_pool(pool, pids)
+                    pool, pids = _new_loader_pool(workers)
+    finally:
+        _terminate_pool(pool, pids)
 
 
 def load_single_document(file_path: str) -> str:
     """
     Load a single document based on its extension.
-    
+
     Args:
         file_path: Path to the document file.
-        
+
     Returns:
         Document text content.
     """
     file_path = Path(file_path)
     extension = file_path.suffix.lower()
-    
+
     if extension == '.txt' or extension == '.md':
         with open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
-    
+
     elif extension == '.pdf':
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    
+        # Join once instead of repeated string concatenation (quadratic on large filings);
+        # the form feed after each page lets chunk metadata recover page numbers
+        return "".join(f"{page.extract_text() or ''}\n{PAGE_BREAK}" for page in reader.pages)
+
     elif extension == '.docx':
         doc = Document(file_path)
         text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
         return text
-    
+
     else:
         raise ValueError(f"Unsupported file type: {extension}")
-
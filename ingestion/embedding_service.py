@@ -0,0 +1,138 @@
+"""Embedding service: query-vector cache and micro-batched encoding."""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List
+import numpy as np
+
+
+class EmbeddingService:
+    """
+    Wraps a SentenceTransformer with a query cache and a micro-batcher.
+
+    Query embeddings that arrive within ``batch_window_ms`` of each other are
+    grouped into one ``encode`` call by a background thread, and recent query
+    vectors are kept in an LRU cache. All vectors are float32 NumPy arrays.
+    """
+
+    def __init__(self, model, batch_size: int = 64, cache_size: int = 4096, batch_window_ms: float = 2.0, max_batch: int = 64):
+        self.model = model
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max_batch
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats = {"cache_hits": 0, "cache_misses": 0, "batches": 0, "batched_queries": 0, "documents_encoded": 0}
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in batches of batch_size into a (n, dim) float32 matrix."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True
+        )
+        self._stats["documents_encoded"] += len(texts)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed one query, using the cache and the micro-batcher."""
+        cached = self._cache_get(text)
+        if cached is not None:
+            return cached
+
+        if self.batch_window <= 0:
+            vector = self._finish(text, self.encode([text])[0])
+            self._stats["batches"] += 1
+            self._stats["batched_queries"] += 1
+            return vector
+
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        return future.result()
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries in one encode call, filling in cache hits."""
+        vectors = [self._cache_get(t) for t in texts]
+        missing = sorted({t for t, v in zip(texts, vectors) if v is None})
+        if missing:
+            encoded = dict(zip(missing, self.encode(missing)))
+            self._stats["batches"] += 1
+            self._stats["batched_queries"] += len(missing)
+            vectors = [v if v is not None else self._finish(t, encoded[t]) for t, v in zip(texts, vectors)]
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def stats(self) -> dict:
+        """Cache and batching counters."""
+        stats = dict(self._stats)
+        stats["cache_entries"] = len(self._cache)
+        stats["avg_batch_size"] = round(stats["batched_queries"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
+
+    def _cache_get(self, text: str):
+        with self._cache_lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self._stats["cache_hits"] += 1
+            else:
+                self._stats["cache_misses"] += 1
+            return vector
+
+    def _finish(self, text: str, vector: np.ndarray) -> np.ndarray:
+        # Cached vectors are shared between callers, so make them read-only
+        vector = np.array(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._cache[text] = vector
+                self._cache.move_to_end(text)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return vector
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or not self._worker.is_alive():
+            with self._worker_lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _batch_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(batch)
+
+    def _run_batch(self, batch) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            encoded = dict(zip(texts, self.encode(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self._stats["batches"] += 1
+        self._stats["batched_queries"] += len(batch)
+        vectors = {text: self._finish(text, vector) for text, vector in encoded.items()}
+        for text, future in batch:
+            future.set_result(vectors[text])
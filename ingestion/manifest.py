@@ -0,0 +1,124 @@
+"""Ingestion manifest: per-file content hashes and chunk IDs in the vector store."""
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single worker there
+    fcntl = None
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_ids(file_name: str, sha256: str, count: int, chunker: Optional[str] = None) -> List[str]:
+    """Deterministic chunk IDs for one version of one file, split with one chunker configuration."""
+    prefix = hashlib.sha1(file_name.encode("utf-8")).hexdigest()[:8]
+    version = sha256 if chunker is None else hashlib.sha256(f"{sha256}:{chunker}".encode("utf-8")).hexdigest()
+    return [f"{prefix}-{version[:16]}-{i}" for i in range(count)]
+
+
+@contextmanager
+def sync_lock(manifest_path: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock on the manifest across processes for a sync.
+
+    Every uvicorn worker syncs the store at startup against the same Chroma
+    directory and manifest; holding this lock from loading the manifest to
+    saving it means the first worker ingests changed files and the others
+    then find them unchanged, instead of embedding and upserting them too.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(f"{manifest_path}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print("⏳ Waiting for another worker to finish syncing the vector store...")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class IngestionManifest:
+    """
+    Record of what has been ingested into the vector store.
+
+    Maps each document file name to its content hash, mtime, size and the
+    IDs of the chunks it produced, so a sync only re-embeds files whose
+    content (or chunking settings) changed and can delete chunks of files
+    that were removed.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, files: Optional[Dict[str, dict]] = None, exists: bool = False):
+        self.path = path
+        self.files = files or {}
+        self.exists = exists
+
+    @classmethod
+    def load(cls, path: str) -> "IngestionManifest":
+        """Load the manifest at path, or return an empty one if it is missing or unreadable."""
+        if not os.path.exists(path):
+            return cls(path)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(path, files=data.get("files", {}), exists=True)
+        except Exception as e:
+            print(f"⚠️  Could not read ingestion manifest {path}: {str(e)}")
+            return cls(path)
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "updated_at": time.time(), "files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+    def get(self, file_name: str) -> Optional[dict]:
+        return self.files.get(file_name)
+
+    def record(self, file_name: str, sha256: str, mtime: float, size: int, chunk_ids: List[str], chunker: Optional[str] = None) -> None:
+        """Record the ingested version of a file and the chunking settings it was split with."""
+        self.files[file_name] = {
+            "sha256": sha256,
+            "mtime": mtime,
+            "size": size,
+            "chunk_ids": chunk_ids,
+            "chunker": chunker,
+            "ingested_at": time.time(),
+        }
+
+    def remove(self, file_name: str) -> Optional[dict]:
+        return self.files.pop(file_name, None)
+
+    def signature(self) -> str:
+        """Digest of every ingested chunk ID; changes whenever the store's contents do."""
+        digest = hashlib.sha256()
+        for file_name in sorted(self.files):
+            digest.update(file_name.encode("utf-8"))
+            for chunk_id in self.files[file_name]["chunk_ids"]:
+                digest.update(b"\0" + chunk_id.encode("utf-8"))
+        return digest.hexdigest()
+
+    def reset(self) -> None:
+        """Forget every file (used before a full rebuild)."""
+        self.files = {}
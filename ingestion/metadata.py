@@ -0,0 +1,313 @@
+"""Per-chunk metadata for ingestion and metadata filters for retrieval."""
+import bisect
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ingestion.text_processor import Chunk
+
+# PDF pages are joined with a form feed, so page numbers survive into the text
+PAGE_BREAK = "\f"
+
+# Metadata keys callers may filter on, and the Chroma operators they may use
+FILTERABLE_KEYS = {"source", "company", "quarter", "year", "page", "section", "chunk_index", "ingested_at"}
+FILTER_OPERATORS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin"}
+
+# Row sets kept per distinct where clause
+_MASK_CACHE_SIZE = 64
+
+_QUARTER_TOKEN = re.compile(r"^q([1-4])$", re.IGNORECASE)
+_YEAR_TOKEN = re.compile(r"^(?:fy)?((?:19|20)\d{2})$", re.IGNORECASE)
+
+# "# Heading" lines, or numbered headings such as "2. Market Size and Growth"
+_HEADING = re.compile(r"^(?:#{1,6}[ \t]+(?P<md>[^\n]+)|(?P<num>\d+(?:\.\d+)*)\.?[ \t]+(?P<title>[A-Z][^\n]*))$", re.MULTILINE)
+_TITLE_WORD = re.compile(r"^(?:[A-Z0-9][\w&/'.-]*|and|of|the|for|in|&|vs\.?)$")
+_SENTENCE_STARTERS = {"The", "A", "An", "Our", "This", "We", "It", "In"}
+
+
+def parse_file_tags(file_name: str) -> Dict[str, Any]:
+    """
+    Company, quarter and year tags from a file name like ``innovate_q3_2025.txt``.
+
+    Tags are only set when the name carries a quarter or year, so arbitrary
+    file names do not produce a bogus company.
+    """
+    tokens = [t for t in re.split(r"[\s_\-.]+", Path(file_name).stem) if t]
+    tags = {}
+    rest = []
+    for token in tokens:
+        quarter = _QUARTER_TOKEN.match(token)
+        year = _YEAR_TOKEN.match(token)
+        if quarter:
+            tags["quarter"] = f"Q{quarter.group(1)}"
+        elif year:
+            tags["year"] = int(year.group(1))
+        else:
+            rest.append(token.lower())
+    if tags and rest:
+        tags["company"] = "_".join(rest)
+    return tags
+
+
+def _heading_title(match: re.Match) -> str:
+    if match.group("md"):
+        return match.group("md").strip()
+    # Numbered headings often run straight into the body text; keep the title-case run
+    words = []
+    for word in match.group("title").split()[:8]:
+        if not _TITLE_WORD.match(word):
+            break
+        words.append(word)
+        if word.endswith(".") and len(words) > 1:
+            break
+    while len(words) > 1 and words[-1] in _SENTENCE_STARTERS | {"and", "of", "the", "for", "in", "&"}:
+        words.pop()
+    return f"{match.group('num')}. {' '.join(words)}"
+
+
+class _TextIndex:
+    """Page and section lookups by character offset."""
+
+    def __init__(self, text: str):
+        self.page_starts = None
+        if PAGE_BREAK in text:
+            self.page_starts = [0]
+            position = text.find(PAGE_BREAK)
+            while position >= 0:
+                self.page_starts.append(position + 1)
+                position = text.find(PAGE_BREAK, position + 1)
+        headings = [(m.start(), _heading_title(m)) for m in _HEADING.finditer(text)]
+        self.heading_starts = [start for start, _ in headings]
+        self.heading_titles = [title for _, title in headings]
+
+    def page(self, offset: int) -> Optional[int]:
+        if self.page_starts is None or offset < 0:
+            return None
+        return bisect.bisect_right(self.page_starts, offset)
+
+    def section(self, start: int, end: int) -> Optional[str]:
+        # The heading in effect at the chunk start, else the first heading inside the chunk
+        if start < 0:
+            return None
+        i = bisect.bisect_right(self.heading_starts, start) - 1
+        if i >= 0:
+            return self.heading_titles[i]
+        if self.heading_starts and self.heading_starts[0] < end:
+            return self.heading_titles[0]
+        return None
+
+
+def chunk_metadata(file_name: str, text: str, chunks: List[Chunk], ingested_at: float) -> List[Dict[str, Any]]:
+    """
+    Build Chroma metadata for each chunk of one document.
+
+    Every chunk gets source, chunk_index, start/end offsets and ingested_at;
+    page (PDFs), section and the file-name tags are added when known. Chroma
+    rejects None values, so unknown fields are left out.
+
+    Args:
+        file_name: Source file name.
+        text: Full document text the chunks were cut from.
+        chunks: Chunks with character offsets.
+        ingested_at: Ingestion timestamp (epoch seconds).
+
+    Returns:
+        One metadata dict per chunk.
+    """
+    tags = parse_file_tags(file_name)
+    index = _TextIndex(text)
+    metadatas = []
+    for i, chunk in enumerate(chunks):
+        metadata = {
+            "source": file_name,
+            "chunk_index": i,
+            "start": chunk.start,
+            "end": chunk.end,
+            "ingested_at": ingested_at,
+            **tags,
+        }
+        page = index.page(chunk.start)
+        if page is not None:
+            metadata["page"] = page
+        section = index.section(chunk.start, chunk.end)
+        if section:
+            metadata["section"] = section
+        metadatas.append(metadata)
+    return metadatas
+
+
+def _normalize_value(key: str, value: Any) -> Any:
+    # Stored tags are lowercase company names and "Q1".."Q4"
+    if isinstance(value, str):
+        if key == "company":
+            return value.lower()
+        if key == "quarter":
+            return value.upper()
+    return value
+
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Translate request filters into a Chroma ``where`` clause.
+
+    Values may be a scalar (equality), a list (``$in``) or a dict of Chroma
+    operators, e.g. ``{"company": "innovate", "year": {"$gte": 2024}}``.
+
+    Raises:
+        ValueError: On unknown keys or operators.
+    """
+    if not filters:
+        return None
+
+    clauses = []
+    for key, value in filters.items():
+        if key not in FILTERABLE_KEYS:
+            raise ValueError(f"Unknown filter field '{key}'. Allowed: {', '.join(sorted(FILTERABLE_KEYS))}")
+        if isinstance(value, dict):
+            for operator, operand in value.items():
+                if operator not in FILTER_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator '{operator}' for '{key}'")
+                if isinstance(operand, list):
+                    operand = [_normalize_value(key, v) for v in operand]
+                else:
+                    operand = _normalize_value(key, operand)
+                clauses.append({key: {operator: operand}})
+        elif isinstance(value, list):
+            clauses.append({key: {"$in": [_normalize_value(key, v) for v in value]}})
+        else:
+            clauses.append({key: {"$eq": _normalize_value(key, value)}})
+
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class MetadataColumns:
+    """
+    Column view of chunk metadata for evaluating Chroma ``where`` clauses.
+
+    Numeric keys become float columns (NaN where missing); other keys are
+    factorized into integer codes. A filter is then a few vectorized
+    comparisons instead of a pass over every metadata dict, and the arrays
+    can be stored in (and memory-mapped from) an embedding snapshot.
+    """
+
+    def __init__(self, metadatas: List[Dict[str, Any]]):
+        numbers, codes, vocab = {}, {}, {}
+        keys = set()
+        for metadata in metadatas:
+            keys.update(metadata)
+        for key in keys:
+            values = [m.get(key) for m in metadatas]
+            present = [v for v in values if v is not None]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+                numbers[key] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                lookup = {}
+                codes[key] = np.fromiter(
+                    (-1 if v is None else lookup.setdefault(v, len(lookup)) for v in values),
+                    dtype=np.int32, count=len(values)
+                )
+                vocab[key] = list(lookup)
+        self._init(len(metadatas), numbers, codes, vocab)
+
+    @classmethod
+    def from_arrays(cls, size: int, numbers: Dict[str, np.ndarray], codes: Dict[str, np.ndarray], vocab: Dict[str, list]) -> "MetadataColumns":
+        """Columns from stored arrays (see arrays())."""
+        columns = cls.__new__(cls)
+        columns._init(size, numbers, codes, vocab)
+        return columns
+
+    def _init(self, size, numbers, codes, vocab):
+        self.size = size
+        self._numbers = numbers
+        self._codes = codes
+        self._vocab = vocab
+        self._lookup = {key: {value: i for i, value in enumerate(values)} for key, values in vocab.items()}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def arrays(self):
+        """(numbers, codes, vocab), as accepted by from_arrays."""
+        return self._numbers, self._codes, self._vocab
+
+    def rows(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Row numbers matching where (None = no filter)."""
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True, default=str)
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                return rows
+        rows = np.flatnonzero(self.mask(where))
+        with self._lock:
+            self._cache[key] = rows
+            while len(self._cache) > _MASK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return rows
+
+    def mask(self, where: Dict[str, Any]) -> np.ndarray:
+        result = np.ones(self.size, dtype=bool)
+        for key, value in where.items():
+            if key == "$and":
+                for clause in value:
+                    result &= self.mask(clause)
+            elif key == "$or":
+                any_match = np.zeros(self.size, dtype=bool)
+                for clause in value:
+                    any_match |= self.mask(clause)
+                result &= any_match
+            elif isinstance(value, dict):
+                for operator, operand in value.items():
+                    result &= self._compare(key, operator, operand)
+            else:
+                result &= self._compare(key, "$eq", value)
+        return result
+
+    def _compare(self, key: str, operator: str, operand: Any) -> np.ndarray:
+        numbers = self._numbers.get(key)
+        if numbers is not None:
+            return self._compare_numbers(numbers, key, operator, operand)
+        codes = self._codes.get(key)
+        if codes is None:
+            return np.zeros(self.size, dtype=bool)
+        lookup = self._lookup[key]
+        if operator in ("$eq", "$ne"):
+            code = lookup.get(operand, -2)
+            return codes == code if operator == "$eq" else (codes >= 0) & (codes != code)
+        if operator in ("$in", "$nin"):
+            wanted = np.array([lookup[v] for v in operand if v in lookup], dtype=np.int32)
+            inside = np.isin(codes, wanted)
+            return inside if operator == "$in" else (codes >= 0) & ~inside
+        raise ValueError(f"Operator '{operator}' needs a numeric field and operand ('{key}')")
+
+    def _compare_numbers(self, numbers: np.ndarray, key: str, operator: str, operand: Any) -> np.ndarray:
+        operands = operand if operator in ("$in", "$nin") else [operand]
+        if any(isinstance(v, bool) or not isinstance(v, (int, float)) for v in operands):
+            # A string never equals a number, as in Chroma
+            if operator in ("$eq", "$in"):
+                return np.zeros(self.size, dtype=bool)
+            if operator in ("$ne", "$nin"):
+                return ~np.isnan(numbers)
+            raise ValueError(f"Operator '{operator}' needs a numeric field and operand ('{key}')")
+        with np.errstate(invalid="ignore"):
+            if operator == "$eq":
+                return numbers == operand
+            if operator == "$ne":
+                return ~np.isnan(numbers) & (numbers != operand)
+            if operator == "$in":
+                return np.isin(numbers, operands)
+            if operator == "$nin":
+                return ~np.isnan(numbers) & ~np.isin(numbers, operands)
+            if operator == "$gt":
+                return numbers > operand
+            if operator == "$gte":
+                return numbers >= operand
+            if operator == "$lt":
+                return numbers < operand
+            if operator == "$lte":
+                return numbers <= operand
+        raise ValueError(f"Unsupported filter operator '{operator}'")
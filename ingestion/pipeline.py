@@ -0,0 +1,238 @@
+"""Streaming ingestion pipeline: load -> chunk -> embed -> upsert in bounded batches."""
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import config
+
+# Marks the end of a stage's output
+_DONE = object()
+
+# prepare(path, text) -> (chunk_ids, chunks, metadatas or None)
+PrepareFn = Callable[[str, str], Tuple[List[str], List[str], Optional[List[dict]]]]
+
+
+class _StageStats:
+    def __init__(self):
+        self.items = 0
+        self.busy = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "busy_s": round(self.busy, 3),
+            "items_per_s": round(self.items / self.busy, 1) if self.busy > 0 else None,
+        }
+
+
+class IngestionPipeline:
+    """
+    Streams documents into a Chroma collection with overlapping stages.
+
+    Each stage runs in its own thread and hands work to the next through a
+    bounded queue, so parsing, embedding and writes overlap while memory
+    stays flat regardless of corpus size. Writes go to Chroma in batches of
+    ``upsert_batch_size`` chunks.
+    """
+
+    def __init__(self, collection, embed_fn: Callable[[List[str]], np.ndarray], embed_batch_size: int = None, upsert_batch_size: int = None, queue_size: int = None):
+        self.collection = collection
+        self.embed_fn = embed_fn
+        self.embed_batch_size = embed_batch_size or config.EMBEDDING_BATCH_SIZE
+        self.upsert_batch_size = upsert_batch_size or config.INGEST_UPSERT_BATCH_SIZE
+        self.queue_size = queue_size or config.INGEST_QUEUE_SIZE
+        self._stats = {name: _StageStats() for name in ("load", "chunk", "embed", "upsert")}
+        self._wall = 0.0
+        self._errors = []
+        self._stop = threading.Event()
+        self._remaining: Dict[str, int] = {}
+        self._file_ids: Dict[str, List[str]] = {}
+        self._callback_lock = threading.Lock()
+
+    def run(self, documents: Iterable[Tuple[str, str]], prepare: PrepareFn, on_file_written: Callable[[str, List[str]], None] = None) -> dict:
+        """
+        Ingest (path, text) documents.
+
+        Args:
+            documents: Iterable of (path, text), e.g. document_loader.iter_documents().
+            prepare: Turns one document into chunk IDs, chunk texts and optional metadatas.
+            on_file_written: Called with (path, chunk_ids) once every chunk of a file is written.
+
+        Returns:
+            Per-stage throughput stats.
+        """
+        self._on_file_written = on_file_written
+        docs_q = queue.Queue(maxsize=self.queue_size)
+        chunks_q = queue.Queue(maxsize=self.queue_size * self.embed_batch_size)
+        vectors_q = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._guard, args=(self._load, iter(documents), docs_q), name="ingest-load"),
+            threading.Thread(target=self._guard, args=(self._chunk, docs_q, chunks_q, prepare), name="ingest-chunk"),
+            threading.Thread(target=self._guard, args=(self._embed, chunks_q, vectors_q), name="ingest-embed"),
+            threading.Thread(target=self._guard, args=(self._upsert, vectors_q), name="ingest-upsert"),
+        ]
+        start = time.perf_counter()
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+        self._wall = time.perf_counter() - start
+
+        if self._errors:
+            raise self._errors[0]
+        return self.stats()
+
+    def stats(self) -> dict:
+        """Items processed, busy time and throughput per stage."""
+        chunks = self._stats["upsert"].items
+        return {
+            "stages": {name: s.as_dict() for name, s in self._stats.items()},
+            "wall_s": round(self._wall, 3),
+            "chunks_per_s": round(chunks / self._wall, 1) if self._wall > 0 else None,
+        }
+
+    def _guard(self, stage: Callable, *args) -> None:
+        # A failing stage stops the others; blocked puts/gets poll the stop flag
+        try:
+            stage(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _load(self, documents, out_q: queue.Queue) -> None:
+        stats = self._stats["load"]
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(documents)
+                except StopIteration:
+                    break
+                stats.busy += time.perf_counter() - started
+                stats.items += 1
+                if not self._put(out_q, item):
+                    return
+        finally:
+            self._put(out_q, _DONE)
+
+    def _chunk(self, in_q: queue.Queue, out_q: queue.Queue, prepare: PrepareFn) -> None:
+        stats = self._stats["chunk"]
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is _DONE:
+                    return
+                path, text = item
+                started = time.perf_counter()
+                ids, chunks, metadatas = prepare(path, text)
+                stats.busy += time.perf_counter() - started
+                stats.items += len(chunks)
+
+                with self._callback_lock:
+                    self._remaining[path] = len(chunks)
+                    self._file_ids[path] = list(ids)
+                if not chunks:
+                    self._file_done(path)
+                    continue
+                for i, (chunk_id, chunk) in enumerate(zip(ids, chunks)):
+                    record = (path, chunk_id, chunk, metadatas[i] if metadatas else None)
+                    if not self._put(out_q, record):
+                        return
+        finally:
+            self._put(out_q, _DONE)
+
+    def _embed(self, in_q: queue.Queue, out_q: queue.Queue) -> None:
+        stats = self._stats["embed"]
+        finished = False
+        try:
+            while not finished:
+                item = self._get(in_q)
+                if item is _DONE:
+                    return
+                batch = [item]
+                # Fill the batch with whatever is already queued, without waiting for more
+                while len(batch) < self.embed_batch_size:
+                    try:
+                        item = in_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                started = time.perf_counter()
+                vectors = self.embed_fn([record[2] for record in batch])
+                stats.busy += time.perf_counter() - started
+                stats.items += len(batch)
+                if not self._put(out_q, (batch, np.asarray(vectors, dtype=np.float32))):
+                    return
+        finally:
+            self._put(out_q, _DONE)
+
+    def _upsert(self, in_q: queue.Queue) -> None:
+        pending = []
+        pending_vectors = []
+        while True:
+            item = self._get(in_q)
+            if item is _DONE:
+                break
+            batch, vectors = item
+            pending.extend(batch)
+            pending_vectors.append(vectors)
+            if len(pending) >= self.upsert_batch_size:
+                matrix = np.vstack(pending_vectors)
+                while len(pending) >= self.upsert_batch_size:
+                    self._write(pending[:self.upsert_batch_size], matrix[:self.upsert_batch_size])
+                    pending = pending[self.upsert_batch_size:]
+                    matrix = matrix[self.upsert_batch_size:]
+                pending_vectors = [matrix] if len(pending) else []
+        if pending and not self._stop.is_set():
+            self._write(pending, np.vstack(pending_vectors))
+
+    def _write(self, records: list, vectors: np.ndarray) -> None:
+        stats = self._stats["upsert"]
+        started = time.perf_counter()
+        metadatas = [record[3] for record in records]
+        self.collection.upsert(
+            ids=[record[1] for record in records],
+            embeddings=vectors.tolist(),
+            documents=[record[2] for record in records],
+            metadatas=metadatas if all(metadatas) else None,
+        )
+        stats.busy += time.perf_counter() - started
+        stats.items += len(records)
+
+        for record in records:
+            path = record[0]
+            with self._callback_lock:
+                self._remaining[path] -= 1
+                done = self._remaining[path] == 0
+            if done:
+                self._file_done(path)
+
+    def _file_done(self, path: str) -> None:
+        with self._callback_lock:
+            self._remaining.pop(path, None)
+            ids = self._file_ids.pop(path, [])
+            if self._on_file_written is not None:
+                self._on_file_written(path, ids)
@@ -0,0 +1,209 @@
+"""Versioned on-disk embedding snapshots, memory-mapped by every worker.
+
+A snapshot is a directory holding:
+
+    meta.json         format, rows, dim, signature, metadata column layout
+    vectors.f32       contiguous (rows, dim) float32 matrix, L2-normalized
+    ids.bin/.off      chunk IDs (UTF-8 blob plus int64 offset table)
+    documents.bin/.off
+    metadata.bin/.off per-row metadata as JSON
+    columns.f64       numeric metadata columns, (numeric keys, rows) float64
+    columns.i32       other metadata columns as codes into meta.json vocab
+
+Every file is opened with mmap, so workers on one host share a single
+page-cache copy and opening a snapshot costs a few small reads. Snapshot
+directories are immutable; ``publish`` points the CURRENT file at a new
+one with an atomic rename, and readers pick it up on their next check.
+"""
+import json
+import mmap
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+SNAPSHOT_FORMAT = 1
+CURRENT_FILE = "CURRENT"
+
+
+def _write_strings(path: str, strings: List[str]) -> None:
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(f"{path}.bin", "wb") as f:
+        position = 0
+        for i, text in enumerate(strings):
+            data = text.encode("utf-8")
+            f.write(data)
+            position += len(data)
+            offsets[i + 1] = position
+    offsets.tofile(f"{path}.off")
+
+
+def _write_columns(path: str, columns: List[np.ndarray], dtype) -> None:
+    # One contiguous row per column, so each column maps as a contiguous array
+    with open(path, "wb") as f:
+        for column in columns:
+            np.asarray(column, dtype=dtype).tofile(f)
+
+
+def _map_bytes(path: str):
+    # mmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_array(path: str, dtype, shape):
+    if not shape or 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class _StringTable:
+    """Strings in one blob, located through an offset table; decoded on access."""
+
+    def __init__(self, path: str, count: int):
+        self.blob = _map_bytes(f"{path}.bin")
+        self.offsets = _map_array(f"{path}.off", np.int64, (count + 1,))
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[int(self.offsets[i]):int(self.offsets[i + 1])]).decode("utf-8")
+
+
+class EmbeddingSnapshot:
+    """Read-only, memory-mapped view of one snapshot directory."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {self.meta.get('format')} in {path}")
+        self.version = os.path.basename(path)
+        self.signature = self.meta.get("signature")
+        self.rows = self.meta["rows"]
+        self.dim = self.meta["dim"]
+        self.vectors = _map_array(os.path.join(path, "vectors.f32"), np.float32, (self.rows, self.dim))
+        self._ids = _StringTable(os.path.join(path, "ids"), self.rows)
+        self._documents = _StringTable(os.path.join(path, "documents"), self.rows)
+        self._metadata = _StringTable(os.path.join(path, "metadata"), self.rows)
+
+    def chunk_id(self, i: int) -> str:
+        return self._ids[i]
+
+    def document(self, i: int) -> str:
+        return self._documents[i]
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return json.loads(self._metadata[i])
+
+    def columns(self):
+        """(numbers, codes, vocab) metadata column arrays, memory-mapped."""
+        numeric_keys = self.meta["numeric_keys"]
+        coded_keys = self.meta["coded_keys"]
+        numbers = _map_array(os.path.join(self.path, "columns.f64"), np.float64, (len(numeric_keys), self.rows))
+        codes = _map_array(os.path.join(self.path, "columns.i32"), np.int32, (len(coded_keys), self.rows))
+        return (
+            {key: numbers[i] for i, key in enumerate(numeric_keys)},
+            {key: codes[i] for i, key in enumerate(coded_keys)},
+            {key: values for key, values in zip(coded_keys, self.meta["vocab"])},
+        )
+
+    def file(self, name: str) -> str:
+        """Path of an auxiliary file (e.g. an HNSW graph) stored with this snapshot."""
+        return os.path.join(self.path, name)
+
+
+def write_snapshot(root: str, ids: List[str], vectors: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]],
+                   numbers: Dict[str, np.ndarray], codes: Dict[str, np.ndarray], vocab: Dict[str, list],
+                   signature: Optional[str] = None) -> str:
+    """
+    Write a new snapshot directory under root (not yet published).
+
+    Args:
+        root: Snapshot root directory.
+        ids, documents, metadatas: Per-row chunk IDs, texts and metadata.
+        vectors: (rows, dim) L2-normalized float32 matrix.
+        numbers, codes, vocab: Metadata columns (numeric arrays, and codes into vocab).
+        signature: Identifies the ingested corpus the snapshot was built from.
+
+    Returns:
+        Path of the new snapshot directory.
+    """
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(root, version)
+    tmp_path = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_path)
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    vectors.tofile(os.path.join(tmp_path, "vectors.f32"))
+    _write_strings(os.path.join(tmp_path, "ids"), ids)
+    _write_strings(os.path.join(tmp_path, "documents"), documents)
+    _write_strings(os.path.join(tmp_path, "metadata"), [json.dumps(m, separators=(",", ":")) for m in metadatas])
+
+    numeric_keys = sorted(numbers)
+    coded_keys = sorted(codes)
+    _write_columns(os.path.join(tmp_path, "columns.f64"), [numbers[key] for key in numeric_keys], np.float64)
+    _write_columns(os.path.join(tmp_path, "columns.i32"), [codes[key] for key in coded_keys], np.int32)
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "rows": len(ids),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "signature": signature,
+        "created_at": time.time(),
+        "numeric_keys": numeric_keys,
+        "coded_keys": coded_keys,
+        "vocab": [vocab[key] for key in coded_keys],
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    # The directory only appears under its final name once every file is complete
+    os.replace(tmp_path, path)
+    return path
+
+
+def publish(root: str, path: str) -> None:
+    """Make the snapshot at path the current one (atomic for readers)."""
+    tmp_file = os.path.join(root, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(path))
+    os.replace(tmp_file, os.path.join(root, CURRENT_FILE))
+
+
+def current_version(root: str) -> Optional[str]:
+    """Name of the published snapshot, or None."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_current(root: str) -> Optional[EmbeddingSnapshot]:
+    """Open the published snapshot, or None if there is none or it is unreadable."""
+    version = current_version(root)
+    if version is None:
+        return None
+    try:
+        return EmbeddingSnapshot(os.path.join(root, version))
+    except Exception as e:
+        print(f"⚠️  Could not open embedding snapshot {version}: {str(e)}")
+        return None
+
+
+def prune(root: str, keep: int = 2) -> None:
+    """
+    Delete all but the newest ``keep`` snapshots (never the current one).
+
+    Workers that still map a deleted snapshot keep reading it; the files
+    are only freed once the last map is closed.
+    """
+    current = current_version(root)
+    versions = sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)) and not name.startswith("."))
+    for name in versions[:-keep] if keep > 0 else versions:
+        if name != current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -1,53 +1,230 @@
 """Text processing and chunking utilities."""
+import functools
+import logging
+import os
+import threading
+from collections import deque
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from typing import List
+from typing import Iterable, List, NamedTuple
 import config
+from utils.concurrency import new_process_pool
 
+SEPARATORS = ["\n\n", "\n", " ", ""]
 
-def chunk_text(text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+# Corpora smaller than this are chunked in-process; pool start-up would dominate
+_PARALLEL_MIN_CHARS = 2_000_000
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+class Chunk(NamedTuple):
+    """A chunk and its [start, end) character offsets in the source text (-1 if not found)."""
+    text: str
+    start: int
+    end: int
+
+
+def get_tokenizer():
     """
-    Split text into chunks using RecursiveCharacterTextSplitter.
-    
-    Args:
-        text: Text to chunk.
-        chunk_size: Maximum size of each chunk (in characters, roughly tokens). Defaults to config.CHUNK_SIZE.
-        chunk_overlap: Overlap between chunks. Defaults to config.CHUNK_OVERLAP.
-        
-    Returns:
-        List of text chunks.
+    Get the tokenizer used for token-length chunking.
+
+    Defaults to the embedding model's tokenizer (config.EMBEDDING_MODEL), so
+    chunk sizes are counted in the same tokens the embedding model sees.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                name = config.CHUNK_TOKENIZER or config.EMBEDDING_MODEL
+                if "/" not in name and not os.path.isdir(name):
+                    name = f"sentence-transformers/{name}"
+                _tokenizer = AutoTokenizer.from_pretrained(name)
+    return _tokenizer
+
+
+@functools.lru_cache(maxsize=65536)
+def token_length(text: str) -> int:
+    """Number of tokenizer tokens in text, without special tokens."""
+    # Splits are mostly short words and sentences that repeat, so results are cached
+    return len(get_tokenizer().encode(text, add_special_tokens=False))
+
+
+class FastRecursiveSplitter(RecursiveCharacterTextSplitter):
     """
+    RecursiveCharacterTextSplitter with a linear-time merge step.
+
+    LangChain's merge re-measures the oldest split and copies the window on
+    every pop, which is quadratic in the splits per chunk and re-tokenizes
+    in token mode. This version measures each split once and pops from a
+    deque; the chunks produced are identical.
+    """
+
+    def _merge_splits(self, splits: Iterable[str], separator: str) -> List[str]:
+        separator_len = self._length_function(separator)
+        docs = []
+        current = deque()
+        total = 0
+        for split in splits:
+            length = self._length_function(split)
+            if total + length + (separator_len if current else 0) > self._chunk_size:
+                if total > self._chunk_size:
+                    logger.warning(f"Created a chunk of size {total}, which is longer than the specified {self._chunk_size}")
+                if current:
+                    doc = self._join_docs([piece for piece, _ in current], separator)
+                    if doc is not None:
+                        docs.append(doc)
+                    # Drop splits from the front until only the overlap is left and the next split fits
+                    while total > self._chunk_overlap or (
+                        total + length + (separator_len if current else 0) > self._chunk_size and total > 0
+                    ):
+                        total -= current[0][1] + (separator_len if len(current) > 1 else 0)
+                        current.popleft()
+            current.append((split, length))
+            total += length + (separator_len if len(current) > 1 else 0)
+        doc = self._join_docs([piece for piece, _ in current], separator)
+        if doc is not None:
+            docs.append(doc)
+        return docs
+
+
+def chunker_signature(chunk_size: int = None, chunk_overlap: int = None, length_mode: str = None) -> str:
+    """Identify the chunking settings, so stored chunks can be redone when they change."""
+    chunk_size, chunk_overlap, length_mode = _resolve(chunk_size, chunk_overlap, length_mode)
+    return f"{length_mode}:{chunk_size}:{chunk_overlap}"
+
+
+def _resolve(chunk_size, chunk_overlap, length_mode):
     if chunk_size is None:
         chunk_size = config.CHUNK_SIZE
     if chunk_overlap is None:
         chunk_overlap = config.CHUNK_OVERLAP
-        
-    text_splitter = RecursiveCharacterTextSplitter(
+    if length_mode is None:
+        length_mode = config.CHUNK_LENGTH_MODE
+    if length_mode not in ("chars", "tokens"):
+        raise ValueError(f"Unknown chunk length mode: {length_mode}")
+    return chunk_size, chunk_overlap, length_mode
+
+
+@functools.lru_cache(maxsize=32)
+def get_text_splitter(chunk_size: int, chunk_overlap: int, length_mode: str = "chars") -> FastRecursiveSplitter:
+    """
+    Get a shared splitter for the given settings.
+
+    Splitters hold no per-call state, so one instance per configuration is
+    reused instead of building a new one on every call.
+
+    Args:
+        chunk_size: Maximum chunk length, in characters or tokens.
+        chunk_overlap: Overlap between chunks, in the same unit.
+        length_mode: "chars" or "tokens" (the embedding model's tokenizer).
+    """
+    return FastRecursiveSplitter(
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
+        length_function=token_length if length_mode == "tokens" else len,
+        separators=SEPARATORS
     )
-    
-    chunks = text_splitter.split_text(text)
+
+
+def chunk_text(text: str, chunk_size: int = None, chunk_overlap: int = None, length_mode: str = None) -> List[str]:
+    """
+    Split text into chunks using RecursiveCharacterTextSplitter.
+
+    Args:
+        text: Text to chunk.
+        chunk_size: Maximum size of each chunk. Defaults to config.CHUNK_SIZE.
+        chunk_overlap: Overlap between chunks. Defaults to config.CHUNK_OVERLAP.
+        length_mode: "chars" or "tokens". Defaults to config.CHUNK_LENGTH_MODE.
+
+    Returns:
+        List of text chunks.
+    """
+    chunk_size, chunk_overlap, length_mode = _resolve(chunk_size, chunk_overlap, length_mode)
+    return get_text_splitter(chunk_size, chunk_overlap, length_mode).split_text(text)
+
+
+def chunk_text_with_offsets(text: str, chunk_size: int = None, chunk_overlap: int = None, length_mode: str = None) -> List[Chunk]:
+    """
+    Split text into chunks that record where they came from.
+
+    Args:
+        text: Text to chunk.
+        chunk_size: Maximum size of each chunk. Defaults to config.CHUNK_SIZE.
+        chunk_overlap: Overlap between chunks. Defaults to config.CHUNK_OVERLAP.
+        length_mode: "chars" or "tokens". Defaults to config.CHUNK_LENGTH_MODE.
+
+    Returns:
+        Chunks with their character offsets in text.
+    """
+    chunks = []
+    search_from = 0
+    for piece in chunk_text(text, chunk_size, chunk_overlap, length_mode):
+        # Chunks are in order and each starts after the previous one's start
+        start = text.find(piece, search_from)
+        if start < 0:
+            start = text.find(piece)
+        if start < 0:
+            chunks.append(Chunk(piece, -1, -1))
+            continue
+        chunks.append(Chunk(piece, start, start + len(piece)))
+        search_from = start + 1
     return chunks
 
 
-def chunk_documents(texts: List[str], chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+def chunk_corpus(texts: Iterable[str], chunk_size: int = None, chunk_overlap: int = None, length_mode: str = None, workers: int = None) -> List[List[Chunk]]:
+    """
+    Chunk many documents, in parallel when the corpus is large.
+
+    Splitting is pure Python, so large corpora are spread over a process
+    pool (threads would serialize on the GIL).
+
+    Args:
+        texts: Document texts.
+        chunk_size: Maximum size of each chunk. Defaults to config.CHUNK_SIZE.
+        chunk_overlap: Overlap between chunks. Defaults to config.CHUNK_OVERLAP.
+        length_mode: "chars" or "tokens". Defaults to config.CHUNK_LENGTH_MODE.
+        workers: Process count. Defaults to config.CHUNK_WORKERS (0 = one per core).
+
+    Returns:
+        One list of chunks (with offsets) per document, in input order.
+    """
+    texts = list(texts)
+    chunk_size, chunk_overlap, length_mode = _resolve(chunk_size, chunk_overlap, length_mode)
+    if workers is None:
+        workers = config.CHUNK_WORKERS or os.cpu_count() or 1
+    split = functools.partial(chunk_text_with_offsets, chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_mode=length_mode)
+
+    workers = min(workers, len(texts))
+    if workers <= 1 or sum(len(text) for text in texts) < _PARALLEL_MIN_CHARS:
+        return [split(text) for text in texts]
+
+    pool = new_process_pool(workers)
+    try:
+        # Several documents per task so small files do not pay one round trip each
+        return list(pool.map(split, texts, chunksize=max(1, len(texts) // (workers * 4))))
+    finally:
+        pool.shutdown()
+
+
+def chunk_documents(texts: List[str], chunk_size: int = None, chunk_overlap: int = None, length_mode: str = None, workers: int = None) -> List[str]:
     """
     Chunk multiple documents.
-    
+
     Args:
         texts: List of document texts.
         chunk_size: Maximum size of each chunk.
         chunk_overlap: Overlap between chunks.
-        
+        length_mode: "chars" or "tokens".
+        workers: Process count for large corpora.
+
     Returns:
         List of all chunks from all documents.
     """
-    all_chunks = []
-    for text in texts:
-        chunks = chunk_text(text, chunk_size, chunk_overlap)
-        all_chunks.extend(chunks)
-    
-    return all_chunks
-
+    return [
+        chunk.text
+        for chunks in chunk_corpus(texts, chunk_size, chunk_overlap, length_mode, workers)
+        for chunk in chunks
+    ]
@@ -0,0 +1,464 @@
+"""In-process vector indexes (exact NumPy, HNSW) served in front of Chroma."""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+from langchain_core.vectorstores import VectorStore
+import config
+from ingestion import snapshot
+from ingestion.metadata import MetadataColumns
+
+VECTOR_STORE_TYPES = ("chroma", "numpy", "hnsw")
+
+# Rows read from Chroma per get() when building an index
+_LOAD_BATCH_SIZE = 10_000
+
+# Filtered HNSW searches over at most this share of the rows are done exactly instead;
+# hnswlib's filter is a Python callback per candidate, so exact search wins below this
+_EXACT_FILTER_FRACTION = 0.25
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and scores of the k highest scores per row, best first."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(scores.shape[1]), (scores.shape[0], scores.shape[1]))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class NumpyIndex:
+    """
+    Exact cosine search over a float32 matrix.
+
+    Vectors are L2-normalized once at build time, so a search is one
+    matrix product plus an argpartition. The matrix can be a read-only
+    memory map shared with other processes.
+    """
+
+    name = "numpy"
+
+    def __init__(self):
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def empty(self) -> "NumpyIndex":
+        """An unbuilt index with the same settings."""
+        return NumpyIndex()
+
+    def build(self, vectors: np.ndarray) -> None:
+        """Index a matrix of raw embeddings (normalized here, kept in memory)."""
+        self.attach(_normalize_rows(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32))
+
+    def attach(self, vectors: np.ndarray, directory: str = None) -> None:
+        """Use an already normalized matrix (e.g. a snapshot's memory map) without copying it."""
+        self.vectors = vectors
+
+    def search(self, queries: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k rows by cosine similarity.
+
+        Args:
+            queries: (q, dim) query vectors.
+            k: Results per query.
+            rows: Optional row numbers to search within (a metadata filter).
+
+        Returns:
+            (indices, scores), each (q, min(k, candidates)), best first.
+        """
+        queries = _normalize_rows(queries)
+        if rows is None:
+            scores = queries @ self.vectors.T
+            return _top_k(scores, k)
+        if len(rows) == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty
+        if len(rows) * 4 < len(self):
+            # Selective filter: only multiply the allowed rows
+            scores = queries @ self.vectors[rows].T
+        else:
+            scores = (queries @ self.vectors.T)[:, rows]
+        positions, top_scores = _top_k(scores, k)
+        return rows[positions], top_scores
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "rows": len(self), "mmap": isinstance(self.vectors, np.memmap)}
+
+
+class HNSWIndex:
+    """
+    Approximate cosine search with hnswlib.
+
+    ``m`` and ``ef_construction`` trade build time and memory for recall;
+    ``ef_search`` trades query latency for recall; it is raised (never
+    lowered) for queries asking for more than ``ef_search`` results, so
+    concurrent searches never see it drop below their k. Selective metadata
+    filters are answered exactly from the normalized matrix, broader ones
+    with hnswlib's filtered search.
+    """
+
+    name = "hnsw"
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef_search: int = 64, threads: int = -1):
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.threads = threads
+        self.index = None
+        self.exact = NumpyIndex()
+        self._ef_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.exact)
+
+    def empty(self) -> "HNSWIndex":
+        """An unbuilt index with the same settings."""
+        return HNSWIndex(self.m, self.ef_construction, self.ef_search, self.threads)
+
+    @property
+    def graph_file(self) -> str:
+        return f"hnsw-m{self.m}-efc{self.ef_construction}.bin"
+
+    def build(self, vectors: np.ndarray) -> None:
+        """Index a matrix of raw embeddings (normalized here, kept in memory)."""
+        self.attach(_normalize_rows(vectors) if len(vectors) else np.zeros((0, 0), dtype=np.float32))
+
+    def attach(self, vectors: np.ndarray, directory: str = None) -> None:
+        """
+        Index an already normalized matrix.
+
+        With a directory (a snapshot), the graph is loaded from it if it was
+        built with the same M and ef_construction, else built and saved there
+        so other workers can load it.
+        """
+        import hnswlib
+
+        self.exact.attach(vectors)
+        if not len(vectors):
+            self.index = None
+            return
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph_path = os.path.join(directory, self.graph_file) if directory else None
+        if graph_path and os.path.exists(graph_path):
+            index.load_index(graph_path, max_elements=len(vectors))
+        else:
+            index.init_index(max_elements=len(vectors), ef_construction=self.ef_construction, M=self.m)
+            index.add_items(vectors, np.arange(len(vectors)), num_threads=self.threads)
+            if graph_path:
+                tmp_path = f"{graph_path}.{os.getpid()}.tmp"
+                index.save_index(tmp_path)
+                os.replace(tmp_path, graph_path)
+        index.set_ef(self.ef_search)
+        self.index = index
+
+    def set_ef(self, ef_search: int) -> None:
+        """Set ef_search (for tuning and benchmarks, not while searches are running)."""
+        self.ef_search = ef_search
+        if self.index is not None:
+            self.index.set_ef(ef_search)
+
+    def search(self, queries: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Same contract as NumpyIndex.search; results are approximate."""
+        queries = _normalize_rows(queries)
+        if self.index is None or (rows is not None and len(rows) <= max(k, len(self) * _EXACT_FILTER_FRACTION)):
+            return self.exact.search(queries, k, rows)
+
+        k = min(k, len(self) if rows is None else len(rows))
+        if self.index.ef < k:
+            with self._ef_lock:
+                if self.index.ef < k:
+                    self.index.set_ef(k)
+        try:
+            if rows is None:
+                labels, distances = self.index.knn_query(queries, k=k, num_threads=self.threads)
+            else:
+                allowed = np.zeros(len(self), dtype=bool)
+                allowed[rows] = True
+                # The filter is a Python callback, so extra threads would only contend for the GIL
+                labels, distances = self.index.knn_query(queries, k=k, num_threads=1, filter=allowed.__getitem__)
+        except RuntimeError:
+            # hnswlib raises when it finds fewer than k neighbours (tiny ef, heavy filter)
+            return self.exact.search(queries, k, rows)
+        return labels.astype(np.int64), 1.0 - distances
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "rows": len(self), "m": self.m, "ef_construction": self.ef_construction, "ef_search": self.ef_search}
+
+
+def create_index(store_type: str = None):
+    """Build an empty index for VECTOR_STORE_TYPE ("numpy" or "hnsw")."""
+    store_type = store_type or config.VECTOR_STORE_TYPE
+    if store_type == "numpy":
+        return NumpyIndex()
+    if store_type == "hnsw":
+        return HNSWIndex(m=config.HNSW_M, ef_construction=config.HNSW_EF_CONSTRUCTION, ef_search=config.HNSW_EF_SEARCH)
+    raise ValueError(f"Unknown vector index type '{store_type}'. Choose one of: {', '.join(VECTOR_STORE_TYPES)}")
+
+
+class _ListRows:
+    """Documents and metadata of an index built without a snapshot."""
+
+    def __init__(self, documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.documents = documents
+        self.metadatas = metadatas
+        self.version = None
+
+    def document(self, i: int) -> str:
+        return self.documents[i]
+
+    def metadata(self, i: int) -> Dict[str, Any]:
+        return dict(self.metadatas[i])
+
+
+class IndexedVectorStore(VectorStore):
+    """
+    Chroma store whose similarity searches are served by an in-process index.
+
+    Chroma stays the system of record: ingestion, sync and deletes go to it
+    unchanged (attributes not defined here are forwarded to it). The index is
+    built from the collection's stored embeddings and rebuilt only by an
+    explicit ``refresh`` once writes are complete; searches keep serving the
+    current index meanwhile, so a sync never publishes a half-written corpus.
+    Scores are squared L2 distances between normalized vectors, matching
+    Chroma's default metric.
+
+    With a snapshot directory, each build is written as a versioned embedding
+    snapshot and searched through its memory map. A worker that opens the
+    store while the published snapshot matches the ingested corpus (same
+    signature) maps it instead of reading Chroma, and snapshots published
+    by other workers are picked up within ``check_interval`` seconds.
+    """
+
+    def __init__(self, chroma, index, snapshot_dir: str = None, signature_fn: Callable[[], Optional[str]] = None,
+                 check_interval: float = 5.0, keep_snapshots: int = 2):
+        self.chroma = chroma
+        self.index = index
+        self.snapshot_dir = snapshot_dir
+        self.signature_fn = signature_fn
+        self.check_interval = check_interval
+        self.keep_snapshots = keep_snapshots
+        self._rows = _ListRows([], [])
+        self._columns = MetadataColumns([])
+        self._stale = True
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_check = 0.0
+        self._last_build_seconds = None
+        self._last_open_seconds = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not found on the wrapper (e.g. _collection, persist)
+        if name == "chroma":
+            raise AttributeError(name)
+        return getattr(self.chroma, name)
+
+    @property
+    def embeddings(self):
+        return self.chroma._embedding_function
+
+    def open(self) -> None:
+        """Map the published snapshot if it matches the corpus, else build from Chroma."""
+        signature = self.signature_fn() if self.signature_fn else None
+        if self.snapshot_dir and signature is not None:
+            current = snapshot.open_current(self.snapshot_dir)
+            if current is not None and current.signature == signature:
+                self._attach(current)
+                return
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Rebuild the index from the embeddings stored in Chroma."""
+        with self._refresh_lock:
+            started = time.perf_counter()
+            ids, documents, metadatas, blocks = [], [], [], []
+            collection = self.chroma._collection
+            total = collection.count()
+            for offset in range(0, total, _LOAD_BATCH_SIZE):
+                batch = collection.get(limit=_LOAD_BATCH_SIZE, offset=offset, include=["embeddings", "documents", "metadatas"])
+                ids.extend(batch["ids"])
+                documents.extend(batch["documents"])
+                metadatas.extend(m or {} for m in batch["metadatas"])
+                blocks.append(np.asarray(batch["embeddings"], dtype=np.float32))
+            vectors = _normalize_rows(np.vstack(blocks)) if blocks else np.zeros((0, 0), dtype=np.float32)
+            columns = MetadataColumns(metadatas)
+
+            if self.snapshot_dir:
+                os.makedirs(self.snapshot_dir, exist_ok=True)
+                path = snapshot.write_snapshot(
+                    self.snapshot_dir, ids, vectors, documents, metadatas, *columns.arrays(),
+                    signature=self.signature_fn() if self.signature_fn else None
+                )
+                # Drop the in-memory copies; from here on the rows are served from the maps
+                del vectors, documents, metadatas
+                current = snapshot.EmbeddingSnapshot(path)
+                self._attach(current)
+                snapshot.publish(self.snapshot_dir, path)
+                snapshot.prune(self.snapshot_dir, keep=self.keep_snapshots)
+            else:
+                index = self.index.empty()
+                index.attach(vectors)
+                self._publish(index, _ListRows(documents, metadatas), columns)
+            self._last_build_seconds = time.perf_counter() - started
+            print(f"🧩 Built {self.index.name} index over {len(ids)} chunks in {self._last_build_seconds * 1000:.1f} ms")
+
+    def _attach(self, current: "snapshot.EmbeddingSnapshot") -> None:
+        started = time.perf_counter()
+        index = self.index.empty()
+        index.attach(current.vectors, directory=current.path)
+        columns = MetadataColumns.from_arrays(current.rows, *current.columns())
+        self._publish(index, current, columns)
+        self._last_open_seconds = time.perf_counter() - started
+        print(f"🧩 Mapped embedding snapshot {current.version} ({current.rows} chunks) in {self._last_open_seconds * 1000:.1f} ms")
+
+    def _publish(self, index, rows, columns) -> None:
+        # Swap everything at once; searches in flight keep the previous version
+        with self._lock:
+            self.index, self._rows, self._columns = index, rows, columns
+            self._stale = False
+            self._last_check = time.monotonic()
+
+    def _check_published(self) -> None:
+        """Pick up a snapshot published by another worker."""
+        now = time.monotonic()
+        if not self.snapshot_dir or now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        version = snapshot.current_version(self.snapshot_dir)
+        if version is not None and version != self._rows.version and not self._refresh_lock.locked():
+            current = snapshot.open_current(self.snapshot_dir)
+            if current is not None:
+                self._attach(current)
+
+    def _current(self):
+        # Never rebuilds here: writes in progress are only indexed by refresh()
+        self._check_published()
+        with self._lock:
+            return self.index, self._rows, self._columns
+
+    def search_by_vectors(self, vectors: np.ndarray, k: int = 4, where: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        """Top-k documents for each query vector, optionally restricted by a where clause."""
+        return [[doc for doc, _ in hits] for hits in self._search(vectors, k, where)]
+
+    def _search(self, vectors: np.ndarray, k: int, where: Optional[Dict[str, Any]]) -> List[List[Tuple[Document, float]]]:
+        index, rows, columns = self._current()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if len(index) == 0:
+            return [[] for _ in vectors]
+        indices, scores = index.search(vectors, k, columns.rows(where))
+        return [
+            [
+                (Document(page_content=rows.document(i), metadata=rows.metadata(i)), float(2.0 - 2.0 * score))
+                for i, score in zip(row_indices, row_scores)
+                if i >= 0
+            ]
+            for row_indices, row_scores in zip(indices, scores)
+        ]
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        embeddings = self.chroma._embedding_function
+        if hasattr(embeddings, "embed_query_array"):
+            return embeddings.embed_query_array(query)
+        return np.asarray(embeddings.embed_query(query), dtype=np.float32)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return self.search_by_vectors(self._embed_query(query), k, filter)[0]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self._search(self._embed_query(query), k, filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return self.search_by_vectors(np.asarray(embedding, dtype=np.float32), k, filter)[0]
+
+    def _select_relevance_score_fn(self):
+        # Squared L2 between unit vectors is in [0, 4]
+        return lambda distance: 1.0 - distance / 4.0
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        """Write to Chroma; the texts are searchable after the next refresh()."""
+        ids = self.chroma.add_texts(texts, metadatas=metadatas, **kwargs)
+        self._stale = True
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> None:
+        """Delete from Chroma; the index keeps serving the chunks until the next refresh()."""
+        self.chroma.delete(ids=ids, **kwargs)
+        self._stale = True
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding,
+        metadatas: Optional[List[dict]] = None,
+        store_type: str = "numpy",
+        **kwargs: Any
+    ) -> "IndexedVectorStore":
+        """
+        Build a Chroma store from texts and put an in-process index in front of it.
+
+        Args:
+            texts: Texts to add.
+            embedding: LangChain embeddings used by Chroma.
+            metadatas: Optional metadata per text.
+            store_type: "numpy" or "hnsw".
+            **kwargs: Passed to Chroma.from_texts (ids, collection_name, persist_directory, ...).
+        """
+        chroma = Chroma.from_texts(texts, embedding, metadatas=metadatas, **kwargs)
+        store = cls(chroma, create_index(store_type))
+        store.open()
+        return store
+
+    def stats(self) -> dict:
+        return {
+            **self.index.stats(),
+            "stale": self._stale,
+            "snapshot": self._rows.version,
+            "last_build_ms": round(self._last_build_seconds * 1000, 2) if self._last_build_seconds is not None else None,
+            "last_open_ms": round(self._last_open_seconds * 1000, 2) if self._last_open_seconds is not None else None,
+        }
+
+
+def wrap_vector_store(chroma, store_type: str = None, signature_fn: Callable[[], Optional[str]] = None):
+    """
+    Put the configured in-process index in front of a Chroma store.
+
+    Returns the Chroma store itself for VECTOR_STORE_TYPE=chroma.
+
+    Args:
+        chroma: The Chroma store.
+        store_type: "chroma", "numpy" or "hnsw". Defaults to config.VECTOR_STORE_TYPE.
+        signature_fn: Returns the ingested corpus signature, so a matching
+            published snapshot can be mapped instead of rebuilt.
+    """
+    store_type = store_type or config.VECTOR_STORE_TYPE
+    if chroma is None or store_type == "chroma":
+        return chroma
+    store = IndexedVectorStore(
+        chroma,
+        create_index(store_type),
+        snapshot_dir=config.VECTOR_INDEX_DIR if config.VECTOR_SNAPSHOT_ENABLED else None,
+        signature_fn=signature_fn,
+        check_interval=config.VECTOR_SNAPSHOT_CHECK_INTERVAL,
+        keep_snapshots=config.VECTOR_SNAPSHOT_KEEP
+    )
+    store.open()
+    return store
@@ -1,15 +1,26 @@
 """Chroma vector store creation and management with local embeddings."""
 import os
-from typing import Optional, List
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Callable
+import numpy as np
 from langchain_community.vectorstores import Chroma
-from langchain.schema import Document
 from sentence_transformers import SentenceTransformer
 import config
-from ingestion.document_loader import load_documents
-from ingestion.text_processor import chunk_documents
+from ingestion.bm25 import BM25Index, open_bm25_index
+from ingestion.document_loader import iter_documents, list_document_paths
+from ingestion.embedding_service import EmbeddingService
+from ingestion.manifest import IngestionManifest, file_sha256, make_chunk_ids, sync_lock
+from ingestion.pipeline import IngestionPipeline
+from ingestion.metadata import chunk_metadata
+from ingestion.text_processor import chunk_text_with_offsets, chunker_signature
+from ingestion.vector_index import wrap_vector_store
 
 # Global embedding model instance (loaded once)
 _embedding_model = None
+_embedding_service = None
+_embedding_service_lock = threading.Lock()
 
 
 def get_local_embeddings():
@@ -22,37 +33,230 @@ def get_local_embeddings():
     return _embedding_model
 
 
+def get_embedding_service() -> EmbeddingService:
+    """Get or create the shared embedding service (query cache + micro-batcher)."""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService(
+                    get_local_embeddings(),
+                    batch_size=config.EMBEDDING_BATCH_SIZE,
+                    cache_size=config.EMBEDDING_CACHE_SIZE,
+                    batch_window_ms=config.EMBEDDING_BATCH_WINDOW_MS,
+                    max_batch=config.EMBEDDING_MAX_BATCH
+                )
+    return _embedding_service
+
+
+def embedding_stats() -> dict:
+    """Embedding service counters (without loading the model)."""
+    if _embedding_service is None:
+        return {"loaded": False}
+    return {"loaded": True, **_embedding_service.stats()}
+
+
 class LocalEmbeddings:
     """Wrapper class for sentence-transformers to work with LangChain Chroma."""
     
     def __init__(self, model_name: str = None):
         if model_name is None:
             model_name = config.EMBEDDING_MODEL
-        self.model = get_local_embeddings()
+        self.service = get_embedding_service()
+        self.model = self.service.model
         self.model_name = model_name
     
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
         """Embed a list of texts."""
         if not texts:
             return []
-        embeddings = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-        return embeddings.tolist()
+        return self.service.encode(texts).tolist()
     
     def embed_query(self, text: str) -> List[float]:
         """Embed a single query text."""
-        embedding = self.model.encode([text], show_progress_bar=False, convert_to_numpy=True)
-        return embedding[0].tolist()
+        return self.service.embed_query(text).tolist()
+    
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        """Embed a list of texts as a float32 matrix (no list round trip)."""
+        return self.service.encode(texts)
+    
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """Embed a single query as a float32 vector (no list round trip)."""
+        return self.service.embed_query(text)
+    
+    def embed_queries_array(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries in one encode call as a float32 matrix."""
+        return self.service.embed_queries(texts)
+
+
+# Max chunk IDs per Chroma delete
+_DELETE_BATCH_SIZE = 1000
+
+# Bump when the per-chunk metadata changes, so the next sync re-ingests every file
+_METADATA_VERSION = 1
+
+
+def _embed_fn(vectorstore: Chroma):
+    """Float32 batch embedding function for the store's embedding model."""
+    embeddings = vectorstore._embedding_function
+    if hasattr(embeddings, "embed_documents_array"):
+        return embeddings.embed_documents_array
+    return lambda texts: np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+
+
+def _delete_chunks(vectorstore: Chroma, chunk_ids: List[str]) -> None:
+    for start in range(0, len(chunk_ids), _DELETE_BATCH_SIZE):
+        vectorstore.delete(ids=chunk_ids[start:start + _DELETE_BATCH_SIZE])
+
+
+def sync_vector_store(vectorstore: Chroma, documents_dir: str = None, manifest: IngestionManifest = None, bm25: BM25Index = None) -> dict:
+    """
+    Bring the vector store in line with the documents directory.
+    
+    Only files whose content hash (or the chunking settings) changed since
+    the last sync are loaded, chunked and embedded; chunks of removed files
+    are deleted. Files whose mtime and size match the manifest are not even
+    re-hashed.
+    
+    Args:
+        vectorstore: Chroma store to update.
+        documents_dir: Directory containing documents. Defaults to config.DOCUMENTS_DIR.
+        manifest: Ingestion manifest. Defaults to the one at config.INGEST_MANIFEST_PATH.
+        bm25: Keyword index to keep in step with the store (updated per written file).
+        
+    Returns:
+        Counts of added, changed, removed and unchanged files and chunks written/deleted.
+    """
+    if documents_dir is None:
+        documents_dir = config.DOCUMENTS_DIR
+    if manifest is None:
+        manifest = IngestionManifest.load(config.INGEST_MANIFEST_PATH)
+    
+    stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0, "failed": 0, "chunks_added": 0, "chunks_deleted": 0}
+    files = {Path(path).name: path for path in list_document_paths(documents_dir)}
+    
+    # First pass: find files whose content changed (stat check, then hash)
+    chunker = f"{chunker_signature()}:meta{_METADATA_VERSION}"
+    ingested_at = time.time()
+    to_load = {}
+    for file_name, file_path in files.items():
+        entry = manifest.get(file_name)
+        try:
+            stat = os.stat(file_path)
+            # Entries from before chunker signatures were recorded have no chunk metadata
+            same_chunker = entry is not None and entry.get("chunker") == chunker
+            if same_chunker and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                stats["unchanged"] += 1
+                continue
+            sha256 = file_sha256(file_path)
+        except OSError as e:
+            # Deleted or unreadable mid-scan: keep its previous chunks, like a file that fails to parse
+            stats["failed"] += 1
+            print(f"Error reading {file_name}: {str(e)}")
+            continue
+        
+        if same_chunker and entry["sha256"] == sha256:
+            # Touched but not modified: just refresh the stat fields
+            manifest.record(file_name, sha256, stat.st_mtime, stat.st_size, entry["chunk_ids"], chunker)
+            stats["unchanged"] += 1
+            continue
+        to_load[file_path] = (file_name, sha256, stat, entry)
+    
+    # Second pass: stream changed files through load -> chunk -> embed -> upsert
+    prepared = {}
+    
+    def prepare(file_path: str, text: str):
+        file_name, sha256, _, _ = to_load[file_path]
+        chunks = chunk_text_with_offsets(text)
+        metadatas = chunk_metadata(file_name, text, chunks, ingested_at)
+        result = make_chunk_ids(file_name, sha256, len(chunks), chunker), [c.text for c in chunks], metadatas
+        if bm25 is not None:
+            prepared[file_path] = result
+        return result
+    
+    def on_file_written(file_path: str, chunk_ids: List[str]):
+        file_name, sha256, stat, entry = to_load.pop(file_path)
+        if entry:
+            _delete_chunks(vectorstore, entry["chunk_ids"])
+            stats["chunks_deleted"] += len(entry["chunk_ids"])
+        if bm25 is not None:
+            # Only files whose chunks reached the store are indexed, so both stay in step
+            if entry:
+                bm25.remove(entry["chunk_ids"])
+            bm25.add(*prepared.pop(file_path))
+        manifest.record(file_name, sha256, stat.st_mtime, stat.st_size, chunk_ids, chunker)
+        stats["changed" if entry else "added"] += 1
+        stats["chunks_added"] += len(chunk_ids)
+    
+    if to_load:
+        pipeline = IngestionPipeline(vectorstore._collection, _embed_fn(vectorstore))
+        try:
+            stats["pipeline"] = pipeline.run(iter_documents(paths=list(to_load)), prepare, on_file_written)
+        finally:
+            # Keep what was fully written even if a later batch failed
+            manifest.save()
+    
+    # Files that failed, timed out or were empty keep their previous chunks
+    stats["failed"] += len(to_load)
+    
+    for file_name in [name for name in manifest.files if name not in files]:
+        entry = manifest.remove(file_name)
+        _delete_chunks(vectorstore, entry["chunk_ids"])
+        if bm25 is not None:
+            bm25.remove(entry["chunk_ids"])
+        stats["removed"] += 1
+        stats["chunks_deleted"] += len(entry["chunk_ids"])
+        print(f"Removed: {file_name}")
+    
+    manifest.save()
+    if bm25 is not None and (stats["chunks_added"] or stats["chunks_deleted"] or bm25.signature != manifest.signature()):
+        bm25.commit(manifest.signature())
+    return stats
+
+
+def _corpus_signature() -> str:
+    return IngestionManifest.load(config.INGEST_MANIFEST_PATH).signature()
+
+
+_corpus_version = {"stamp": None, "signature": None}
+_corpus_version_lock = threading.Lock()
+
+
+def corpus_version() -> Optional[str]:
+    """
+    Signature of the ingested corpus, for invalidating derived caches.
+    
+    The manifest is only re-read when its file changes (a stat per call), so
+    syncs done by other workers are picked up too.
+    """
+    try:
+        stat = os.stat(config.INGEST_MANIFEST_PATH)
+        stamp = (config.INGEST_MANIFEST_PATH, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+    with _corpus_version_lock:
+        if _corpus_version["stamp"] != stamp:
+            _corpus_version["signature"] = _corpus_signature()
+            _corpus_version["stamp"] = stamp
+        return _corpus_version["signature"]
 
 
 def create_vector_store(force_rebuild: bool = False) -> Optional[Chroma]:
     """
     Create or load Chroma vector store from documents.
     
+    An existing store is synced incrementally against data/documents using
+    the ingestion manifest, so only added or changed files are embedded.
+    The sync holds the manifest's cross-process lock, so workers starting
+    together ingest each file once. With VECTOR_STORE_TYPE=numpy or hnsw,
+    searches are then served by an in-process index built from the stored
+    embeddings.
+    
     Args:
-        force_rebuild: If True, rebuild the vector store even if it exists.
+        force_rebuild: If True, drop the stored chunks and re-ingest every document.
         
     Returns:
-        Chroma vector store instance, or None if creation fails.
+        Vector store instance, or None if creation fails.
     """
     persist_directory = config.CHROMA_PERSIST_DIR
     
@@ -62,86 +266,176 @@ def create_vector_store(force_rebuild: bool = False) -> Optional[Chroma]:
     # Create embeddings wrapper
     embeddings = LocalEmbeddings()
     
-    # Try to load existing store
-    if not force_rebuild and os.path.exists(persist_directory) and os.listdir(persist_directory):
-        try:
-            print("🧩 Loading existing Chroma vector store...")
-            vectorstore = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=embeddings
-            )
-            # Check if store has documents
-            try:
-                count = vectorstore._collection.count()
-                if count > 0:
-                    print(f"✅ Chroma vector store loaded successfully ({count} documents)")
-                    return vectorstore
-                else:
-                    print("⚠️  Vector store exists but is empty. Rebuilding...")
-            except Exception as e:
-                print(f"⚠️  Error checking vector store count: {str(e)}. Rebuilding...")
-        except Exception as e:
-            print(f"⚠️  Error loading vector store: {str(e)}. Rebuilding...")
-    
-    # Create new vector store
-    print("🧩 Creating new Chroma vector store...")
-    documents = load_documents()
+    with sync_lock(config.INGEST_MANIFEST_PATH):
+        vectorstore, ok = _open_and_sync(persist_directory, embeddings, force_rebuild)
+    # After a failed sync an already populated store is still served
+    if vectorstore is None or (not ok and vectorstore._collection.count() == 0):
+        return None
+    return wrap_vector_store(vectorstore, signature_fn=_corpus_signature)
+
+
+def _open_and_sync(persist_directory: str, embeddings: "LocalEmbeddings", force_rebuild: bool):
+    """
+    Open the Chroma store and sync it (caller holds the sync lock).
     
-    if not documents:
-        print("⚠️  Warning: No documents found in data/documents/. Vector store will be empty.")
-        # Create empty vector store
-        try:
-            vectorstore = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=embeddings
-            )
-            return vectorstore
-        except Exception as e:
-            print(f"❌ Error creating empty vector store: {str(e)}")
-            return None
+    Returns:
+        (store or None if it could not be opened, whether the sync succeeded)
+    """
+    # Loaded under the lock, so it includes what another worker just ingested
+    manifest = IngestionManifest.load(config.INGEST_MANIFEST_PATH)
     
-    # Chunk documents
-    chunks = chunk_documents(documents)
+    try:
+        print("🧩 Loading Chroma vector store...")
+        vectorstore = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embeddings
+        )
+        count = vectorstore._collection.count()
+    except Exception as e:
+        print(f"❌ Error loading vector store: {str(e)}")
+        return None, False
     
-    if not chunks:
-        print("⚠️  Warning: No chunks created. Vector store will be empty.")
+    # Stores built before the manifest existed have unknown chunk IDs; rebuild them once
+    if force_rebuild or (count > 0 and not manifest.exists):
+        print("🧩 Rebuilding Chroma vector store from scratch...")
         try:
+            vectorstore.delete_collection()
             vectorstore = Chroma(
                 persist_directory=persist_directory,
                 embedding_function=embeddings
             )
-            return vectorstore
         except Exception as e:
-            print(f"❌ Error creating empty vector store: {str(e)}")
-            return None
-    
-    # Create documents with metadata
-    langchain_docs = [Document(page_content=chunk) for chunk in chunks]
+            print(f"❌ Error resetting vector store: {str(e)}")
+            return None, False
+        manifest.reset()
     
-    # Create vector store
     try:
-        print(f"📝 Creating vector store with {len(langchain_docs)} document chunks...")
-        vectorstore = Chroma.from_documents(
-            documents=langchain_docs,
-            embedding=embeddings,
-            persist_directory=persist_directory
-        )
+        # The keyword index is rebuilt from the store if it does not match the manifest
+        bm25 = open_bm25_index(vectorstore._collection, manifest.signature())
+        stats = sync_vector_store(vectorstore, manifest=manifest, bm25=bm25)
         vectorstore.persist()
-        print(f"✅ Chroma vector store created successfully with {len(chunks)} chunks")
+        count = vectorstore._collection.count()
+        print(f"✅ Chroma vector store ready ({count} chunks; {stats['added']} added, "
+              f"{stats['changed']} changed, {stats['removed']} removed, {stats['unchanged']} unchanged files)")
         print(f"📁 Persistent directory: {persist_directory}")
-        return vectorstore
+        if count == 0:
+            print("⚠️  Warning: No documents found in data/documents/. Vector store will be empty.")
+        return vectorstore, True
     except Exception as e:
-        print(f"❌ Error creating vector store: {str(e)}")
+        print(f"❌ Error syncing vector store: {str(e)}")
         import traceback
         traceback.print_exc()
-        return None
+        return vectorstore, False
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide holder for the opened vector store.
+    
+    The store is opened once (normally from ``main.lifespan``) and the same
+    handle is handed to every chain. ``reload`` and ``swap`` build the new
+    store while readers keep using the current one; the handle is published
+    with a single reference assignment, so ``get`` never waits on a rebuild.
+    """
+    
+    def __init__(self, opener: Callable[..., Optional[Chroma]] = None):
+        self._opener = opener or create_vector_store
+        self._store = None
+        self._lock = threading.Lock()
+        self._open_count = 0
+        self._last_open_seconds = None
+        self._total_open_seconds = 0.0
+        self._opened_at = None
+    
+    def get(self) -> Optional[Chroma]:
+        """Return the current store, opening it on first use."""
+        store = self._store
+        if store is None:
+            store = self.open()
+        return store
+    
+    def open(self) -> Optional[Chroma]:
+        """Open the store unless another caller already did."""
+        with self._lock:
+            if self._store is None:
+                self._store = self._timed_open(force_rebuild=False)
+            return self._store
+    
+    def reload(self, force_rebuild: bool = False) -> Optional[Chroma]:
+        """
+        Re-open (or rebuild) the store and publish the new handle.
+        
+        Readers keep getting the previous handle until the new one is ready.
+        If opening fails the previous handle stays in place.
+        """
+        with self._lock:
+            store = self._timed_open(force_rebuild=force_rebuild)
+            if store is not None:
+                self._store = store
+            return self._store
+    
+    def sync(self, documents_dir: str = None) -> dict:
+        """Incrementally sync the open store with the documents directory."""
+        store = self.get()
+        if store is None:
+            return {"error": "Vector store not available"}
+        # Write to Chroma itself; an in-process index keeps serving the current
+        # snapshot until the sync is complete and is then rebuilt once
+        chroma = getattr(store, "chroma", store)
+        with self._lock, sync_lock(config.INGEST_MANIFEST_PATH):
+            bm25 = open_bm25_index(chroma._collection, _corpus_signature())
+            stats = sync_vector_store(chroma, documents_dir=documents_dir, bm25=bm25)
+            if hasattr(store, "refresh") and (stats["chunks_added"] or stats["chunks_deleted"]):
+                store.refresh()
+            return stats
+    
+    def swap(self, store: Optional[Chroma]) -> Optional[Chroma]:
+        """Publish an externally built store. Returns the previous handle."""
+        with self._lock:
+            previous = self._store
+            self._store = store
+            return previous
+    
+    def stats(self) -> dict:
+        """Open count and timings, to confirm the store is not reopened per request."""
+        store = self._store
+        return {
+            "open": store is not None,
+            "type": config.VECTOR_STORE_TYPE,
+            "index": store.stats() if hasattr(store, "refresh") else None,
+            "open_count": self._open_count,
+            "last_open_ms": round(self._last_open_seconds * 1000, 2) if self._last_open_seconds is not None else None,
+            "total_open_ms": round(self._total_open_seconds * 1000, 2),
+            "opened_at": self._opened_at,
+        }
+    
+    def _timed_open(self, force_rebuild: bool) -> Optional[Chroma]:
+        start = time.perf_counter()
+        store = self._opener(force_rebuild=force_rebuild)
+        elapsed = time.perf_counter() - start
+        self._open_count += 1
+        self._last_open_seconds = elapsed
+        self._total_open_seconds += elapsed
+        if store is not None:
+            self._opened_at = time.time()
+        print(f"🧩 Vector store opened in {elapsed * 1000:.1f} ms (open #{self._open_count})")
+        return store
+
+
+# Global registry instance (shared by all chains)
+_store_registry = VectorStoreRegistry()
+
+
+def get_store_registry() -> VectorStoreRegistry:
+    """Get the process-wide vector store registry."""
+    return _store_registry
 
 
 def get_vector_store() -> Optional[Chroma]:
     """
-    Get the vector store instance, creating it if necessary.
+    Get the shared vector store instance, opening it on first use.
     
     Returns:
         Chroma vector store instance, or None if creation fails.
     """
-    return create_vector_store(force_rebuild=False)
+    return _store_registry.get()
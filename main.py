@@ -3,6 +3,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from router.routes import router
+from utils.metrics import MetricsMiddleware
 import config
 import logging
 import os
@@ -41,6 +42,15 @@ async def lifespan(app: FastAPI):
     else:
         logger.info(f"✅ Loaded GEMINI_API_KEY")
         logger.info(f"🤖 LLM: {config.LLM_MODEL}")
+        
+        # Resolve models once so requests skip list_models()
+        try:
+            from chains.gemini_helper import warm_up_models, start_model_refresh
+            resolved = warm_up_models([config.LLM_MODEL, "gemini-1.5-flash"])
+            logger.info(f"✅ Resolved Gemini models: {resolved}")
+            start_model_refresh()
+        except Exception as e:
+            logger.warning(f"⚠️  Error warming up Gemini models: {str(e)}")
     
     # Initialize local embeddings
     try:
@@ -51,13 +61,20 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️  Error loading embeddings: {str(e)}")
     
+    # Load the cross-encoder before the first request
+    if config.RERANK_ENABLED:
+        from chains.reranker import get_reranker
+        if get_reranker() is not None:
+            logger.info(f"✅ Re-ranker loaded: {config.RERANK_MODEL}")
+    
     # Initialize vector store
     try:
-        from ingestion.vector_store import create_vector_store
+        from ingestion.vector_store import get_store_registry
         logger.info("🧩 Initializing Chroma vector store...")
-        vectorstore = create_vector_store()
+        registry = get_store_registry()
+        vectorstore = registry.open()
         if vectorstore:
-            logger.info("✅ Vector store initialized successfully")
+            logger.info(f"✅ Vector store initialized successfully in {registry.stats()['last_open_ms']} ms")
         else:
             logger.warning("⚠️  Vector store initialization returned None")
     except Exception as e:
@@ -67,8 +84,12 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # Shutdown (if needed in future)
+    # Shutdown
     logger.info("Shutting down AI Market Analyst API...")
+    from chains.gemini_helper import stop_model_refresh
+    from utils.concurrency import shutdown_executors
+    stop_model_refresh()
+    shutdown_executors()
 
 
 # Initialize FastAPI app with lifespan
@@ -88,6 +109,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Label per-stage timings with the endpoint and time every request
+app.add_middleware(MetricsMiddleware, prefix="/api/v1", endpoints=[route.path for route in router.routes])
+
 # Include router
 app.include_router(router, prefix="/api/v1")
 
@@ -100,9 +124,16 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/api/v1/health",
+            "stats": "/api/v1/stats",
+            "metrics": "/api/v1/metrics",
             "qa": "/api/v1/qa",
+            "qa_stream": "/api/v1/qa/stream",
+            "qa_batch": "/api/v1/qa/batch",
             "summary": "/api/v1/summary",
+            "summary_stream": "/api/v1/summary/stream",
+            "summary_batch": "/api/v1/summary/batch",
             "extract": "/api/v1/extract",
+            "extract_batch": "/api/v1/extract/batch",
             "auto": "/api/v1/auto"
         }
     }
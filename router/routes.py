@@ -1,31 +1,55 @@
 """API routes for AI Market Analyst."""
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+import json
 import logging
+import time
+import config
 import utils.guardrails as guardrails
-from chains.qa_chain import answer_question
-from chains.summary_chain import summarize_text
-from chains.extraction_chain import extract_structured_data
-from chains.auto_router_chain import route_query
+from chains.qa_chain import answer_question_async, answer_questions_async, resolve_weights, stream_answer_async
+from chains.summary_chain import is_failed_summary, summarize_text_async, stream_summary_async
+from chains.extraction_chain import extract_structured_data_async
+from chains.auto_router_chain import route_query_async
+from chains.context_packer import context_stats
+from chains.gemini_helper import model_cache_stats
+from chains.reranker import reranker_stats
+from chains.semantic_cache import semantic_cache_stats
+from chains.local_router import router_stats
+from chains.llm_cache import response_cache_stats
+from chains.llm_client import llm_client_stats
+from ingestion.bm25 import bm25_stats
+from ingestion.metadata import build_where
+from ingestion.vector_store import get_store_registry, embedding_stats
+from utils.concurrency import endpoint_limiter, map_in_order, run_blocking
+from utils.metrics import CONTENT_TYPE, render_metrics, span
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+_BLOCKED_ANSWER = "🚫 Dangerous prompt detected and blocked by guardrails. Please provide a valid business query."
+
 
 # Request/Response models
 class QARequest(BaseModel):
     question: str = Field(..., description="Question to answer")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
+    filters: Optional[Dict[str, Any]] = Field(None, description='Metadata filters, e.g. {"company": "innovate", "quarter": "Q3"}')
+    k: Optional[int] = Field(None, ge=1, le=50, description="Number of chunks to retrieve (default RETRIEVAL_K)")
+    weights: Optional[Dict[str, float]] = Field(None, description='Hybrid fusion weights, e.g. {"dense": 1.0, "bm25": 0.5}; 0 disables a retriever')
 
 
 class QAResponse(BaseModel):
     answer: str
     source_documents: list
+    usage: Optional[Dict[str, int]] = Field(None, description="Estimated prompt token counts and context packing results")
 
 
 class SummaryRequest(BaseModel):
     text: str = Field(..., description="Text to summarize")
     max_length: Optional[int] = Field(500, description="Maximum summary length in words")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
 
 
 class SummaryResponse(BaseModel):
@@ -35,6 +59,7 @@ class SummaryResponse(BaseModel):
 class ExtractRequest(BaseModel):
     text: str = Field(..., description="Text to extract from")
     json_schema: Dict[str, Any] = Field(..., alias="schema", description="JSON schema for extraction")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
     
     class Config:
         populate_by_name = True
@@ -45,6 +70,30 @@ class ExtractResponse(BaseModel):
     data: Dict[str, Any]
 
 
+class QABatchRequest(BaseModel):
+    questions: List[str] = Field(..., description="Questions to answer")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
+    filters: Optional[Dict[str, Any]] = Field(None, description="Metadata filters applied to every question")
+    k: Optional[int] = Field(None, ge=1, le=50, description="Number of chunks to retrieve per question")
+    weights: Optional[Dict[str, float]] = Field(None, description="Hybrid fusion weights applied to every question")
+
+
+class SummaryBatchRequest(BaseModel):
+    texts: List[str] = Field(..., description="Texts to summarize")
+    max_length: Optional[int] = Field(500, description="Maximum summary length in words")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
+
+
+class ExtractBatchRequest(BaseModel):
+    texts: List[str] = Field(..., description="Texts to extract from")
+    json_schema: Dict[str, Any] = Field(..., alias="schema", description="JSON schema applied to every text")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
+    
+    class Config:
+        populate_by_name = True
+        allow_population_by_field_name = True
+
+
 class HealthResponse(BaseModel):
     status: str
     message: str
@@ -59,22 +108,81 @@ async def health_check():
     }
 
 
+@router.get("/stats")
+async def stats_endpoint():
+    """Runtime statistics for shared resources."""
+    return {
+        "vector_store": get_store_registry().stats(),
+        "models": model_cache_stats(),
+        "llm_cache": response_cache_stats(),
+        "llm_client": llm_client_stats(),
+        "endpoints": endpoint_limiter.stats(),
+        "router": router_stats(),
+        "guardrails": guardrails.guardrail_stats(),
+        "bm25": bm25_stats(),
+        "semantic_cache": semantic_cache_stats(),
+        "rerank": reranker_stats(),
+        "context": context_stats(),
+        "embeddings": embedding_stats()
+    }
+
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    """Stage latency histograms and LLM, cache and error counters in the Prometheus text format."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
+@router.post("/vectorstore/sync")
+async def vectorstore_sync_endpoint():
+    """Embed added or changed documents and drop chunks of removed ones."""
+    try:
+        return await run_blocking(get_store_registry().sync)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error syncing vector store: {str(e)}")
+
+
+def _validate_input(text: str, input_type: str) -> None:
+    with span("guardrails"):
+        guardrails.validate_input(text, input_type)
+
+
+def _is_blocked(text: str) -> bool:
+    """Block clearly dangerous or malicious prompts."""
+    with span("guardrails"):
+        blocked = hasattr(guardrails, "is_prompt_safe") and not guardrails.is_prompt_safe(text)
+    if blocked:
+        logger.warning(f"Guardrails blocked suspicious prompt: {text[:100]}")
+    return blocked
+
+
+def _check_filters(filters: Optional[Dict[str, Any]], weights: Optional[Dict[str, float]] = None) -> None:
+    try:
+        build_where(filters)
+        resolve_weights(weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/qa", response_model=QAResponse)
 async def qa_endpoint(request: QARequest):
     """Answer questions using RAG pipeline."""
     try:
-        guardrails.validate_input(request.question, "query")
-        # Block clearly dangerous or malicious prompts
-        if hasattr(guardrails, "is_prompt_safe") and not guardrails.is_prompt_safe(request.question):
-            logger.warning(f"Guardrails blocked suspicious prompt: {request.question[:100]}")
+        _validate_input(request.question, "query")
+        _check_filters(request.filters, request.weights)
+        if _is_blocked(request.question):
             return QAResponse(
-                answer="🚫 Dangerous prompt detected and blocked by guardrails. Please provide a valid business query.",
+                answer=_BLOCKED_ANSWER,
                 source_documents=[]
             )
-        result = answer_question(request.question)
+        async with endpoint_limiter.limit("qa"):
+            result = await answer_question_async(
+                request.question, use_cache=request.use_cache, filters=request.filters, k=request.k, weights=request.weights
+            )
         return QAResponse(
             answer=result["answer"],
-            source_documents=result.get("source_documents", [])
+            source_documents=result.get("source_documents", []),
+            usage=result.get("usage")
         )
     except HTTPException:
         raise
@@ -86,8 +194,12 @@ async def qa_endpoint(request: QARequest):
 async def summary_endpoint(request: SummaryRequest):
     """Summarize long text."""
     try:
-        guardrails.validate_input(request.text, "summary")
-        summary = summarize_text(request.text, request.max_length or 500)
+        _validate_input(request.text, "summary")
+        async with endpoint_limiter.limit("summary"):
+            summary = await summarize_text_async(request.text, request.max_length or 500, use_cache=request.use_cache)
+        if is_failed_summary(summary):
+            # Part of the text could not be summarized; a partial summary would pass for a full one
+            raise HTTPException(status_code=502, detail=summary)
         return SummaryResponse(summary=summary)
     except HTTPException:
         raise
@@ -95,15 +207,76 @@ async def summary_endpoint(request: SummaryRequest):
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
 
 
+def _sse(event: str, data: Any) -> str:
+    """Format one Server-Sent Event; data is JSON so newlines stay inside one event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _message_events(message: str) -> AsyncIterator[Tuple[str, Any]]:
+    yield "token", message
+
+
+async def _stream_events(endpoint: str, events: AsyncIterator[Tuple[str, Any]], start: float) -> AsyncIterator[str]:
+    """
+    Relay chain events as SSE while holding the endpoint's concurrency slot.
+    
+    Ends with a "done" event carrying time-to-first-token and total latency.
+    """
+    first_token = None
+    async with endpoint_limiter.limit(endpoint):
+        async for event, data in events:
+            if event == "token" and first_token is None:
+                first_token = time.perf_counter()
+            yield _sse(event, data)
+    
+    total_ms = round((time.perf_counter() - start) * 1000, 1)
+    ttft_ms = round((first_token - start) * 1000, 1) if first_token is not None else None
+    logger.info(f"{endpoint} stream finished: ttft={ttft_ms} ms, total={total_ms} ms")
+    yield _sse("done", {"ttft_ms": ttft_ms, "total_ms": total_ms})
+
+
+def _event_stream_response(body: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/qa/stream")
+async def qa_stream_endpoint(request: QARequest):
+    """Answer a question as Server-Sent Events: sources first, then answer tokens."""
+    start = time.perf_counter()
+    _validate_input(request.question, "query")
+    _check_filters(request.filters, request.weights)
+    if _is_blocked(request.question):
+        events = _message_events(_BLOCKED_ANSWER)
+    else:
+        events = stream_answer_async(
+            request.question, use_cache=request.use_cache, filters=request.filters, k=request.k, weights=request.weights
+        )
+    return _event_stream_response(_stream_events("qa", events, start))
+
+
+@router.post("/summary/stream")
+async def summary_stream_endpoint(request: SummaryRequest):
+    """Summarize text as Server-Sent Events, streaming the final summary's tokens."""
+    start = time.perf_counter()
+    _validate_input(request.text, "summary")
+    events = stream_summary_async(request.text, request.max_length or 500, use_cache=request.use_cache)
+    return _event_stream_response(_stream_events("summary", events, start))
+
+
 @router.post("/extract", response_model=ExtractResponse)
 async def extract_endpoint(request: ExtractRequest):
     """Extract structured data from unstructured text."""
     try:
-        guardrails.validate_input(request.text, "extract")
+        _validate_input(request.text, "extract")
         if not request.json_schema:
             raise HTTPException(status_code=400, detail="Schema is required")
         
-        extracted = extract_structured_data(request.text, request.json_schema, description="Extract structured data from the text")
+        async with endpoint_limiter.limit("extract"):
+            extracted = await extract_structured_data_async(request.text, request.json_schema, description="Extract structured data from the text", use_cache=request.use_cache)
         
         if "error" in extracted:
             raise HTTPException(status_code=500, detail=extracted["error"])
@@ -115,11 +288,181 @@ async def extract_endpoint(request: ExtractRequest):
         raise HTTPException(status_code=500, detail=f"Error during extraction: {str(e)}")
 
 
+def _check_batch_size(items: list) -> None:
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch is too large (max {config.BATCH_MAX_ITEMS} items)")
+
+
+def _guardrail_error(text: str, input_type: str) -> Optional[str]:
+    """Run the input guardrails on one batch item, returning the rejection reason if any."""
+    try:
+        _validate_input(text, input_type)
+        return None
+    except HTTPException as e:
+        return e.detail
+
+
+def _item_error(index: int, error: str) -> dict:
+    return {"index": index, "status": "error", "error": error}
+
+
+async def _zip_async(indexes: List[int], results: AsyncIterator[Any]) -> AsyncIterator[Tuple[int, Any]]:
+    """Pair in-order results with the request indexes they belong to."""
+    position = 0
+    async for result in results:
+        yield indexes[position], result
+        position += 1
+
+
+async def _merge_in_order(total: int, rejected: Dict[int, dict], results: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Interleave rejected items with the in-order results of the accepted ones."""
+    try:
+        for index in range(total):
+            if index in rejected:
+                yield rejected[index]
+            else:
+                yield await results.__anext__()
+    finally:
+        await results.aclose()
+
+
+async def _stream_batch(endpoint: str, lines: AsyncIterator[dict], start: float) -> AsyncIterator[str]:
+    """
+    Relay batch results as NDJSON while holding one batch slot.
+    
+    Ends with a summary line counting successful and failed items.
+    """
+    ok = failed = 0
+    async with endpoint_limiter.limit("batch"):
+        async for line in lines:
+            if line["status"] == "ok":
+                ok += 1
+            else:
+                failed += 1
+            yield json.dumps(line) + "\n"
+    
+    total_ms = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"{endpoint} batch finished: {ok} ok, {failed} failed, total={total_ms} ms")
+    yield json.dumps({"done": True, "ok": ok, "failed": failed, "total_ms": total_ms}) + "\n"
+
+
+def _batch_response(body: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+@router.post("/qa/batch")
+async def qa_batch_endpoint(request: QABatchRequest):
+    """Answer many questions; one NDJSON line per question, in request order."""
+    start = time.perf_counter()
+    _check_batch_size(request.questions)
+    _check_filters(request.filters, request.weights)
+    
+    rejected = {}
+    accepted = []
+    for index, question in enumerate(request.questions):
+        error = _guardrail_error(question, "query")
+        if error:
+            rejected[index] = _item_error(index, error)
+        elif _is_blocked(question):
+            rejected[index] = {"index": index, "status": "ok", "answer": _BLOCKED_ANSWER, "source_documents": []}
+        else:
+            accepted.append(index)
+    
+    async def results():
+        answers = answer_questions_async(
+            [request.questions[i] for i in accepted], use_cache=request.use_cache, filters=request.filters,
+            k=request.k, weights=request.weights
+        )
+        try:
+            async for index, result in _zip_async(accepted, answers):
+                yield {"index": index, "status": "ok", **result}
+        finally:
+            await answers.aclose()
+    
+    lines = _merge_in_order(len(request.questions), rejected, results())
+    return _batch_response(_stream_batch("qa", lines, start))
+
+
+@router.post("/summary/batch")
+async def summary_batch_endpoint(request: SummaryBatchRequest):
+    """Summarize many texts; one NDJSON line per text, in request order."""
+    start = time.perf_counter()
+    _check_batch_size(request.texts)
+    
+    rejected = {}
+    accepted = []
+    for index, text in enumerate(request.texts):
+        error = _guardrail_error(text, "summary")
+        if error:
+            rejected[index] = _item_error(index, error)
+        else:
+            accepted.append(index)
+    
+    async def summarize(index: int) -> str:
+        return await summarize_text_async(request.texts[index], request.max_length or 500, use_cache=request.use_cache)
+    
+    async def results():
+        summaries = map_in_order(summarize, accepted, config.BATCH_ITEM_CONCURRENCY)
+        try:
+            async for index, summary in _zip_async(accepted, summaries):
+                if isinstance(summary, Exception):
+                    yield _item_error(index, f"Error generating summary: {str(summary)}")
+                elif is_failed_summary(summary):
+                    yield _item_error(index, summary)
+                else:
+                    yield {"index": index, "status": "ok", "summary": summary}
+        finally:
+            await summaries.aclose()
+    
+    lines = _merge_in_order(len(request.texts), rejected, results())
+    return _batch_response(_stream_batch("summary", lines, start))
+
+
+@router.post("/extract/batch")
+async def extract_batch_endpoint(request: ExtractBatchRequest):
+    """Extract the same schema from many texts; one NDJSON line per text, in request order."""
+    start = time.perf_counter()
+    _check_batch_size(request.texts)
+    if not request.json_schema:
+        raise HTTPException(status_code=400, detail="Schema is required")
+    
+    rejected = {}
+    accepted = []
+    for index, text in enumerate(request.texts):
+        error = _guardrail_error(text, "extract")
+        if error:
+            rejected[index] = _item_error(index, error)
+        else:
+            accepted.append(index)
+    
+    async def extract(index: int) -> Dict[str, Any]:
+        return await extract_structured_data_async(request.texts[index], request.json_schema, description="Extract structured data from the text", use_cache=request.use_cache)
+    
+    async def results():
+        extractions = map_in_order(extract, accepted, config.BATCH_ITEM_CONCURRENCY)
+        try:
+            async for index, extracted in _zip_async(accepted, extractions):
+                if isinstance(extracted, Exception):
+                    yield _item_error(index, f"Error during extraction: {str(extracted)}")
+                elif "error" in extracted:
+                    yield _item_error(index, extracted["error"])
+                else:
+                    yield {"index": index, "status": "ok", "data": extracted}
+        finally:
+            await extractions.aclose()
+    
+    lines = _merge_in_order(len(request.texts), rejected, results())
+    return _batch_response(_stream_batch("extract", lines, start))
+
+
 class AutoRequest(BaseModel):
     # Accept flexible inputs from UI
     question: Optional[str] = Field(None, description="Question or query text")
     text: Optional[str] = Field(None, description="Long text for summarization or extraction")
     json_schema: Optional[Dict[str, Any]] = Field(None, alias="schema", description="Schema for extraction, if any")
+    use_cache: bool = Field(True, description="Set false to bypass the LLM response cache")
 
     class Config:
         populate_by_name = True
@@ -131,44 +474,52 @@ class AutoResponse(BaseModel):
     result: Dict[str, Any]
 
 
+async def _auto_route(request: AutoRequest) -> AutoResponse:
+    """Route one /auto request; runs inside the endpoint's concurrency slot."""
+    # Prefer explicit extraction if a schema is provided
+    if request.json_schema:
+        _validate_input(request.text or request.question or "", "extract")
+        extracted = await extract_structured_data_async(request.text or (request.question or ""), request.json_schema, use_cache=request.use_cache)
+        if "error" in extracted:
+            raise HTTPException(status_code=500, detail=extracted["error"])
+        return AutoResponse(route="extract", result={"data": extracted})
+
+    # Build a single user input string for the router
+    user_input = (request.question or request.text or "").strip()
+    if not user_input:
+        raise HTTPException(status_code=400, detail="Provide 'question' or 'text'")
+
+    _validate_input(user_input, "query")
+    decision = await route_query_async(user_input, use_cache=request.use_cache)
+
+    if decision == "qa":
+        result = await answer_question_async(user_input, use_cache=request.use_cache)
+        return AutoResponse(route="qa", result=result)
+    elif decision == "summary":
+        summary = await summarize_text_async(user_input, 500, use_cache=request.use_cache)
+        if is_failed_summary(summary):
+            raise HTTPException(status_code=502, detail=summary)
+        return AutoResponse(route="summary", result={"summary": summary})
+    else:
+        # Fallback to extraction without schema -> generic key info schema
+        default_schema = {
+            "entities": "array",
+            "dates": "array",
+            "numbers": "array",
+            "key_facts": "array"
+        }
+        extracted = await extract_structured_data_async(user_input, default_schema, description="Extract key information", use_cache=request.use_cache)
+        if "error" in extracted:
+            raise HTTPException(status_code=500, detail=extracted["error"])
+        return AutoResponse(route="extract", result={"data": extracted})
+
+
 @router.post("/auto", response_model=AutoResponse)
 async def auto_endpoint(request: AutoRequest):
     """Autonomously route the request to QA, Summary, or Extract."""
     try:
-        # Prefer explicit extraction if a schema is provided
-        if request.json_schema:
-            guardrails.validate_input(request.text or request.question or "", "extract")
-            extracted = extract_structured_data(request.text or (request.question or ""), request.json_schema)
-            if "error" in extracted:
-                raise HTTPException(status_code=500, detail=extracted["error"])
-            return AutoResponse(route="extract", result={"data": extracted})
-
-        # Build a single user input string for the router
-        user_input = (request.question or request.text or "").strip()
-        if not user_input:
-            raise HTTPException(status_code=400, detail="Provide 'question' or 'text'")
-
-        guardrails.validate_input(user_input, "query")
-        decision = route_query(user_input)
-
-        if decision == "qa":
-            result = answer_question(user_input)
-            return AutoResponse(route="qa", result=result)
-        elif decision == "summary":
-            summary = summarize_text(user_input, 500)
-            return AutoResponse(route="summary", result={"summary": summary})
-        else:
-            # Fallback to extraction without schema -> generic key info schema
-            default_schema = {
-                "entities": "array",
-                "dates": "array",
-                "numbers": "array",
-                "key_facts": "array"
-            }
-            extracted = extract_structured_data(user_input, default_schema, description="Extract key information")
-            if "error" in extracted:
-                raise HTTPException(status_code=500, detail=extracted["error"])
-            return AutoResponse(route="extract", result={"data": extracted})
+        async with endpoint_limiter.limit("auto"):
+            return await _auto_route(request)
     except HTTPException:
         raise
     except Exception as e:
@@ -1,10 +1,11 @@
 """Evaluation utilities for testing chains with Gemini."""
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
+import numpy as np
+import config
 from chains.qa_chain import answer_question
 from chains.summary_chain import summarize_text
 from chains.extraction_chain import extract_structured_data
 import time
-import math
 from typing import Tuple
 from ingestion.text_processor import chunk_text
 
@@ -41,7 +42,8 @@ def evaluate_qa_chain(questions: List[str]) -> Dict[str, Any]:
                 "question": question,
                 "success": "error" not in result.get("answer", "").lower(),
                 "answer_length": len(result.get("answer", "")),
-                "has_sources": len(result.get("source_documents", [])) > 0
+                "has_sources": len(result.get("source_documents", [])) > 0,
+                "prompt_tokens": (result.get("usage") or {}).get("prompt_tokens")
             })
         except Exception as e:
             results.append({
@@ -51,10 +53,12 @@ def evaluate_qa_chain(questions: List[str]) -> Dict[str, Any]:
             })
     
     success_rate = sum(1 for r in results if r.get("success", False)) / len(results) if results else 0
+    prompt_tokens = [r["prompt_tokens"] for r in results if r.get("prompt_tokens") is not None]
     
     return {
         "total_questions": len(questions),
         "success_rate": success_rate,
+        "avg_prompt_tokens": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
         "results": results
     }
 
@@ -131,15 +135,17 @@ def evaluate_extraction_chain(
     }
 
 
-def _cosine(a, b):
-    if not a or not b:
-        return 0.0
-    dot = sum(x * y for x, y in zip(a, b))
-    na = math.sqrt(sum(x * x for x in a))
-    nb = math.sqrt(sum(y * y for y in b))
-    if na == 0 or nb == 0:
-        return 0.0
-    return dot / (na * nb)
+# Texts per embedding request (Gemini accepts up to 100 per batch call)
+_GEMINI_BATCH_SIZE = 100
+_OPENAI_BATCH_SIZE = 512
+
+# Queries scored per matrix product; bounds the score block to QUERY_BLOCK x num_chunks floats
+_QUERY_BLOCK = 64
+
+
+def _batches(texts: List[str], size: int):
+    for start in range(0, len(texts), size):
+        yield texts[start:start + size]
 
 
 def _embed_gemini(texts):
@@ -149,9 +155,9 @@ def _embed_gemini(texts):
     if isinstance(texts, str):
         texts = [texts]
     vectors = []
-    for t in texts:
-        resp = genai.embed_content(model=model, content=t)
-        vectors.append(resp["embedding"])  # type: ignore
+    for batch in _batches(texts, _GEMINI_BATCH_SIZE):
+        resp = genai.embed_content(model=model, content=batch)
+        vectors.extend(resp["embedding"])  # type: ignore
     return vectors
 
 
@@ -161,64 +167,188 @@ def _embed_openai(texts):
     if isinstance(texts, str):
         texts = [texts]
     client = openai.OpenAI()  # Requires OPENAI_API_KEY
-    resp = client.embeddings.create(model="text-embedding-3-small", input=texts)
-    return [d.embedding for d in resp.data]
+    vectors = []
+    for batch in _batches(texts, _OPENAI_BATCH_SIZE):
+        resp = client.embeddings.create(model="text-embedding-3-small", input=batch)
+        vectors.extend(d.embedding for d in resp.data)
+    return vectors
+
+
+def _embed_local(texts):
+    from ingestion.vector_store import get_local_embeddings
+    if isinstance(texts, str):
+        texts = [texts]
+    return get_local_embeddings().encode(
+        texts, batch_size=config.EMBEDDING_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False
+    )
+
 
+def _local_available() -> bool:
+    try:
+        from ingestion.vector_store import get_local_embeddings
+        get_local_embeddings()
+        return True
+    except Exception:
+        return False
 
-def compare_embedding_models(document_text: str, queries: list[tuple[str, str]]) -> dict:
+
+def _normalized(vectors) -> np.ndarray:
+    """Float32 matrix with unit-length rows (zero rows stay zero), so dot products are cosines."""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(query_vecs, chunk_vecs, k: int) -> np.ndarray:
     """
-    Compare Gemini vs OpenAI embeddings on retrieval accuracy & latency.
+    Indices of the k most similar chunks for every query, best first.
+
+    Scores all queries against all chunks with one matrix product per block
+    of queries and selects the top k with argpartition, so only k scores
+    per query are sorted.
 
     Args:
-        document_text: Full corpus text to chunk and index
-        queries: list of (question, expected_keyword)
+        query_vecs: (num_queries, dim) query embeddings
+        chunk_vecs: (num_chunks, dim) chunk embeddings
+        k: Results per query (capped at num_chunks)
 
     Returns:
-        dict report with availability, accuracy and latency per provider
+        (num_queries, k) int array of chunk indices
     """
-    chunks = chunk_text(document_text, chunk_size=800, chunk_overlap=100)
-    report = {"providers": []}
+    queries = _normalized(query_vecs)
+    chunks = _normalized(chunk_vecs)
+    k = min(k, chunks.shape[0])
+    result = np.empty((queries.shape[0], k), dtype=np.int64)
+    for start in range(0, queries.shape[0], _QUERY_BLOCK):
+        scores = queries[start:start + _QUERY_BLOCK] @ chunks.T
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        result[start:start + len(scores)] = np.take_along_axis(top, order, axis=1)
+    return result
+
 
-    providers: list[Tuple[str, bool, callable]] = [
-        ("Gemini", _HAS_GEMINI, _embed_gemini),
-        ("OpenAI", _HAS_OPENAI, _embed_openai),
-    ]
+def retrieval_metrics(ranked: np.ndarray, relevant: List[set], k: int) -> Dict[str, float]:
+    """
+    Recall@k, MRR@k, nDCG@k and top-1 accuracy for ranked results with binary relevance.
+
+    Recall@k is the fraction of queries with at least one relevant chunk in
+    the top k (a keyword usually occurs in many chunks, so set recall would
+    mostly measure keyword frequency).
+
+    Args:
+        ranked: (num_queries, >=k) chunk indices, best first
+        relevant: Relevant chunk indices per query
+        k: Cut-off
+
+    Returns:
+        dict with recall_at_k, mrr, ndcg_at_k and accuracy (all 0-1)
+    """
+    if not relevant:
+        return {"recall_at_k": 0.0, "mrr": 0.0, "ndcg_at_k": 0.0, "accuracy": 0.0}
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    hits = mrr = ndcg = top1 = 0.0
+    for row, rel in zip(ranked, relevant):
+        gains = np.fromiter((index in rel for index in row[:k]), dtype=np.float64, count=min(k, len(row)))
+        if not gains.any():
+            continue
+        hits += 1
+        top1 += gains[0]
+        mrr += 1.0 / (int(np.argmax(gains)) + 1)
+        ideal = discounts[:min(len(rel), k)].sum()
+        ndcg += float(gains @ discounts[:len(gains)]) / ideal
+    n = len(relevant)
+    return {"recall_at_k": hits / n, "mrr": mrr / n, "ndcg_at_k": ndcg / n, "accuracy": top1 / n}
+
+
+def _relevant_chunks(chunks: List[str], queries: List[Tuple[str, str]]) -> List[set]:
+    """Chunks containing each query's expected keyword (case-insensitive), one scan per distinct keyword."""
+    lowered = [chunk.lower() for chunk in chunks]
+    by_keyword = {}
+    relevant = []
+    for _, expected in queries:
+        keyword = expected.lower()
+        if keyword not in by_keyword:
+            by_keyword[keyword] = {i for i, chunk in enumerate(lowered) if keyword in chunk}
+        relevant.append(by_keyword[keyword])
+    return relevant
+
+
+def compare_embedding_models(
+    document_text: str,
+    queries: list[tuple[str, str]],
+    k: int = 5,
+    chunks: Optional[List[str]] = None,
+    providers: Optional[list[Tuple[str, bool, Callable]]] = None
+) -> dict:
+    """
+    Compare local, Gemini and OpenAI embeddings on retrieval quality & latency.
+
+    Chunks and queries are embedded in batches, then all queries are scored
+    against all chunks with NumPy matrix products; a 100k-chunk corpus is
+    scored in seconds.
+
+    Args:
+        document_text: Full corpus text to chunk and index (ignored if chunks is given)
+        queries: list of (question, expected_keyword); chunks containing the keyword are relevant
+        k: Cut-off for recall@k and nDCG@k
+        chunks: Pre-chunked corpus, to skip chunking
+        providers: (name, available, embed_fn) triples; defaults to Local, Gemini and OpenAI
+
+    Returns:
+        dict report with availability, retrieval metrics and latency per provider
+    """
+    if chunks is None:
+        chunks = chunk_text(document_text, chunk_size=800, chunk_overlap=100)
+    report = {"k": k, "num_queries": len(queries), "providers": []}
+    relevant = _relevant_chunks(chunks, queries)
+    questions = [q for q, _ in queries]
+
+    if providers is None:
+        providers = [
+            ("Local", _local_available(), _embed_local),
+            ("Gemini", _HAS_GEMINI, _embed_gemini),
+            ("OpenAI", _HAS_OPENAI, _embed_openai),
+        ]
 
     for name, available, embed_fn in providers:
         if not available:
             report["providers"].append({
                 "name": name,
                 "available": False,
-                "reason": "SDK or API key missing"
+                "reason": "Model, SDK or API key missing"
             })
             continue
 
         # Precompute chunk embeddings
-        t0 = time.time()
-        chunk_vecs = embed_fn(chunks)
-        index_time_ms = (time.time() - t0) * 1000
-
-        correct = 0
-        latencies = []
-        for q, expected in queries:
-            t1 = time.time()
-            qv = embed_fn(q)[0]
-            latencies.append((time.time() - t1) * 1000)
-            # Retrieve top-1
-            sims = [(_cosine(qv, cv), i) for i, cv in enumerate(chunk_vecs)]
-            sims.sort(reverse=True)
-            top_idx = sims[0][1]
-            hit = expected.lower() in chunks[top_idx].lower()
-            correct += 1 if hit else 0
-
-        accuracy = (correct / len(queries)) * 100 if queries else 0.0
-        avg_latency_ms = sum(latencies) / len(latencies) if latencies else 0.0
+        t0 = time.perf_counter()
+        chunk_vecs = _normalized(embed_fn(chunks))
+        index_time_ms = (time.perf_counter() - t0) * 1000
+
+        t1 = time.perf_counter()
+        query_vecs = embed_fn(questions) if questions else np.zeros((0, chunk_vecs.shape[1]), dtype=np.float32)
+        query_embed_ms = (time.perf_counter() - t1) * 1000
+
+        t2 = time.perf_counter()
+        ranked = top_k_indices(query_vecs, chunk_vecs, k)
+        search_time_ms = (time.perf_counter() - t2) * 1000
 
+        metrics = retrieval_metrics(ranked, relevant, k)
         report["providers"].append({
             "name": name,
             "available": True,
-            "accuracy_percent": round(accuracy, 2),
-            "avg_latency_ms": round(avg_latency_ms, 2),
+            "accuracy_percent": round(metrics["accuracy"] * 100, 2),
+            f"recall_at_{k}": round(metrics["recall_at_k"], 4),
+            "mrr": round(metrics["mrr"], 4),
+            f"ndcg_at_{k}": round(metrics["ndcg_at_k"], 4),
+            "avg_latency_ms": round(query_embed_ms / len(questions), 2) if questions else 0.0,
+            "search_time_ms": round(search_time_ms, 2),
             "index_time_ms": round(index_time_ms, 2),
             "num_chunks": len(chunks)
         })
@@ -0,0 +1,91 @@
+"""Tests for the local fast path of the auto router."""
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from chains import auto_router_chain, local_router
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """Fresh local router used by route_query."""
+    fresh = local_router.LocalRouter(min_confidence=0.6)
+    monkeypatch.setattr(auto_router_chain, "get_local_router", lambda: fresh)
+    return fresh
+
+
+def test_clear_inputs_are_routed_without_llm(router, monkeypatch):
+    """Test that keyword rules decide obvious queries locally."""
+    def no_gemini(*args, **kwargs):
+        raise AssertionError("Gemini should not be called")
+
+    monkeypatch.setattr(auto_router_chain, "ask_gemini", no_gemini)
+
+    assert auto_router_chain.route_query("What is Innovate Inc's market share?") == "qa"
+    assert auto_router_chain.route_query("Summarize the Q3 report in three sentences.") == "summary"
+    assert auto_router_chain.route_query("Extract the revenue and CEO name as JSON.") == "extract"
+    assert auto_router_chain.route_query("Revenue grew 12% this quarter. " * 80) == "summary"
+    assert router.stats()["local"] == 4
+
+
+def test_low_confidence_falls_back_to_llm(router, monkeypatch):
+    """Test the LLM fallback and agreement tracking."""
+    calls = []
+
+    def fake_gemini(prompt, model=None, temperature=0.4, use_cache=True):
+        calls.append(prompt)
+        return "summary"
+
+    monkeypatch.setattr(auto_router_chain, "ask_gemini", fake_gemini)
+
+    assert auto_router_chain.route_query("Innovate Inc quarterly results") == "summary"
+    assert len(calls) == 1
+    stats = router.stats()
+    assert stats["llm_fallbacks"] == 1 and stats["compared"] == 1
+
+
+def test_async_route_runs_the_local_router_off_the_event_loop(monkeypatch):
+    """Test that route_query_async does the centroid vote in the embedding pool, not on the event loop."""
+    threads = []
+
+    def embed(texts):
+        threads.append(threading.current_thread())
+        return np.vstack([np.eye(3, dtype=np.float32)[0] for _ in texts])
+
+    fresh = local_router.LocalRouter(min_confidence=0.6, embed_fn=embed)
+    monkeypatch.setattr(auto_router_chain, "get_local_router", lambda: fresh)
+
+    assert asyncio.run(auto_router_chain.route_query_async("Innovate Inc quarterly results")) == "qa"
+    assert threads and threading.main_thread() not in threads
+
+
+def test_decisions_are_cached_and_fast(router):
+    """Test the decision cache and the per-call cost of the rules."""
+    router.route("Who are the main competitors?")
+    router.route("who are  the main competitors?")
+    assert router.stats()["cache_hits"] == 1
+
+    start = time.perf_counter()
+    for i in range(1000):
+        router.route(f"What was revenue in region {i}?")
+    assert (time.perf_counter() - start) / 1000 < 0.001
+
+
+def test_centroids_break_ties():
+    """Test that the embedding vote is used when rules are inconclusive."""
+    def embed(texts):
+        # One axis per route; anything that is not a seed example lands on "extract"
+        rows = []
+        for text in texts:
+            route = next((name for name in local_router.ROUTES if text in local_router.CENTROID_EXAMPLES[name]), "extract")
+            rows.append(np.eye(3, dtype=np.float32)[local_router.ROUTES.index(route)])
+        return np.vstack(rows)
+
+    router = local_router.LocalRouter(min_confidence=0.6, embed_fn=embed)
+    route, confidence = router.route("Innovate Inc quarterly results")
+    assert route == "extract" and confidence > 0.6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
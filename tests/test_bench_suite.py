@@ -0,0 +1,43 @@
+"""Tests for the offline benchmark harness (stub Gemini and baseline comparison)."""
+import asyncio
+import time
+import pytest
+from benchmarks.bench_suite import compare
+from benchmarks.stub_gemini import StubGemini
+from chains import gemini_helper
+from chains.extraction_chain import extract_structured_data_async
+
+
+def test_stub_gemini_latency_and_reply_shapes(monkeypatch):
+    """Test that the stub serves the real chains with its latency model."""
+    monkeypatch.setattr(gemini_helper, "get_response_cache", lambda: None)
+    stub = StubGemini(ttft_ms=50, tokens_per_s=1000, output_tokens=20)
+
+    async def run():
+        started = time.perf_counter()
+        extracted = await extract_structured_data_async("Acme revenue was $10M.", {"company": "string", "revenue": "number"})
+        pieces = [piece async for piece in gemini_helper.stream_text_async("Summarize the outlook.")]
+        return extracted, pieces, time.perf_counter() - started
+
+    with stub.installed():
+        extracted, pieces, elapsed = asyncio.run(run())
+    assert extracted == {"company": "stub", "revenue": 42}
+    assert len(pieces) == 3 and len("".join(pieces).split()) == 20
+    assert elapsed >= 0.1 and stub.stats()["calls"] == 2
+    assert gemini_helper.get_generative_model.__name__ == "get_generative_model"
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """Test that slower latency or lower throughput beyond the tolerance is a regression."""
+    baseline = {"ingestion": {"chunks_per_s": 400.0}, "peak_rss_mb": 900.0,
+                "endpoints": {"qa": {"p50_ms": 800.0, "p95_ms": 900.0, "p99_ms": 950.0, "throughput_rps": 9.0}}}
+    results = {"ingestion": {"chunks_per_s": 300.0}, "peak_rss_mb": 950.0,
+               "endpoints": {"qa": {"p50_ms": 820.0, "p95_ms": 1200.0, "p99_ms": 960.0, "throughput_rps": 9.5},
+                             "summary": {"p50_ms": 1500.0}}}
+    rows = {row["metric"]: row for row in compare(results, baseline, tolerance=0.15)}
+    assert {name for name, row in rows.items() if row["regressed"]} == {"ingestion.chunks_per_s", "qa.p95_ms"}
+    assert "summary.p50_ms" not in rows and rows["qa.throughput_rps"]["change"] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,144 @@
+"""Tests for BM25 keyword search and hybrid retrieval."""
+import os
+import tempfile
+from pathlib import Path
+import pytest
+import config
+from ingestion import bm25 as bm25_module
+from ingestion import vector_store
+from ingestion.bm25 import BM25Index, tokenize
+from ingestion.manifest import IngestionManifest
+from chains.qa_chain import reciprocal_rank_fusion, resolve_weights, retrieve_documents, retrieve_documents_batch
+from tests.test_ingestion import FakeEmbeddings
+
+
+def _index(path=None):
+    index = BM25Index(path)
+    index.add(
+        ["a", "b", "c", "d"],
+        [
+            "Acme shipped SKU-4411 and revenue grew 12.5% to $10.5M",
+            "Globex revenue was flat; margins improved in Q3",
+            "Initech revenue declined as SKU-9000 was discontinued",
+            "Market outlook for semiconductors remains strong",
+        ],
+        [{"company": "acme"}, {"company": "globex"}, {"company": "initech"}, {"company": "acme"}],
+    )
+    index.commit("sig-1")
+    return index
+
+
+def test_tokenize_keeps_identifiers_and_figures():
+    """Test that SKUs, tickers and figures survive tokenization."""
+    terms = tokenize("The SKU-4411 grew 12.5% to $10.5M in Q3")
+    assert {"sku-4411", "sku", "4411", "12.5%", "$10.5m", "10.5m", "q3"} <= set(terms)
+    assert "the" not in terms and "in" not in terms
+
+
+def test_bm25_ranks_filters_and_updates():
+    """Test ranking, metadata filters and incremental add/remove."""
+    index = _index()
+    assert [chunk_id for chunk_id, _ in index.search("SKU-4411")][:1] == ["a"]
+    assert index.search("9000")[0][0] == "c"
+    assert {chunk_id for chunk_id, _ in index.search("revenue")} == {"a", "b", "c"}
+    assert [chunk_id for chunk_id, _ in index.search("revenue", where={"company": {"$eq": "globex"}})] == ["b"]
+    assert index.search("nonexistent") == []
+
+    # Changes become visible on commit
+    index.remove(["c"])
+    index.add(["e"], ["SKU-9000 relaunched"], [{"company": "initech"}])
+    assert index.search("9000")[0][0] == "c"
+    index.commit()
+    assert [chunk_id for chunk_id, _ in index.search("9000")] == ["e"]
+
+
+def test_bm25_save_and_load():
+    """Test that a saved index loads with the same results and signature."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / "bm25")
+        index = _index(path)
+        loaded = BM25Index.load(path)
+        assert loaded.signature == "sig-1"
+        assert loaded.search("revenue") == index.search("revenue")
+        assert loaded.metadata("b") == {"company": "globex"}
+
+        # Other scoring parameters invalidate the saved index
+        assert len(BM25Index.load(path, k1=2.0)) == 0
+
+
+def test_shared_index_reloads_when_another_worker_saves(monkeypatch):
+    """Test that loading never rewrites the saved index and a newer save is picked up by the next lookup."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / "bm25")
+        _index(path)
+        saved = {suffix: os.stat(f"{path}{suffix}").st_mtime_ns for suffix in (".json", ".npz")}
+        monkeypatch.setattr(config, "BM25_INDEX_PATH", path)
+        monkeypatch.setattr(bm25_module, "_bm25_index", None)
+        shared = bm25_module.get_bm25_index()
+        assert shared.signature == "sig-1"
+        assert {suffix: os.stat(f"{path}{suffix}").st_mtime_ns for suffix in saved} == saved
+        assert bm25_module.get_bm25_index() is shared
+
+        # Another worker syncs and saves a new corpus
+        other = BM25Index.load(path)
+        other.add(["f"], ["Umbrella SKU-7001 launched"], [{"company": "umbrella"}])
+        other.commit("sig-2")
+        reloaded = bm25_module.get_bm25_index()
+        assert reloaded is not shared and reloaded.signature == "sig-2"
+        assert reloaded.search("SKU-7001")[0][0] == "f"
+        assert bm25_module.get_bm25_index() is reloaded
+
+
+def test_reciprocal_rank_fusion_and_weights():
+    """Test weighted RRF ordering and weight validation."""
+    fused = reciprocal_rank_fusion([["x", "y"], ["y", "z"]], [1.0, 1.0], rrf_k=60)
+    assert [key for key, _ in fused] == ["y", "x", "z"]
+    assert [key for key, _ in reciprocal_rank_fusion([["x"], ["z"]], [0.0, 1.0])] == ["z"]
+
+    assert resolve_weights({"bm25": 0}) == (config.HYBRID_DENSE_WEIGHT, 0.0)
+    for bad in ({"sparse": 1.0}, {"dense": -1}, {"dense": 0, "bm25": 0}):
+        with pytest.raises(ValueError):
+            resolve_weights(bad)
+
+
+def test_hybrid_retrieval_stays_in_sync(monkeypatch):
+    """Test that sync keeps BM25 in step and fusion surfaces keyword-only matches."""
+    from langchain_community.vectorstores import Chroma
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        docs_dir = Path(tmpdir) / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "acme_q3_2025.txt").write_text("Acme revenue was $10M. Product SKU-4411 sold out.")
+        (docs_dir / "globex_q3_2025.txt").write_text("Globex revenue was $20M.")
+        chroma = Chroma(
+            collection_name="bm25_test",
+            persist_directory=str(Path(tmpdir) / "chroma"),
+            embedding_function=FakeEmbeddings()
+        )
+        manifest = IngestionManifest(str(Path(tmpdir) / "manifest.json"))
+        index = BM25Index(str(Path(tmpdir) / "bm25"))
+        vector_store.sync_vector_store(chroma, str(docs_dir), manifest, bm25=index)
+        assert len(index) == 2 and index.signature == manifest.signature()
+
+        # Dense-only retrieval with fake embeddings ignores the SKU; BM25 alone finds it
+        docs = retrieve_documents(chroma, "SKU-4411", k=1, weights={"dense": 0}, bm25=index)
+        assert [doc.metadata["source"] for doc in docs] == ["acme_q3_2025.txt"]
+        docs = retrieve_documents(chroma, "SKU-4411", k=2, bm25=index)
+        assert {doc.metadata["source"] for doc in docs} == {"acme_q3_2025.txt", "globex_q3_2025.txt"}
+        assert retrieve_documents(chroma, "SKU-4411", k=2, filters={"company": "globex"}, bm25=index)[0].metadata["company"] == "globex"
+        assert [len(docs) for docs in retrieve_documents_batch(chroma, ["revenue", "SKU-4411"], k=2, bm25=index)] == [2, 2]
+
+        # Removing a file removes its chunks from the keyword index
+        (docs_dir / "acme_q3_2025.txt").unlink()
+        vector_store.sync_vector_store(chroma, str(docs_dir), manifest, bm25=index)
+        assert index.search("SKU-4411") == []
+
+        # A saved index that does not match the corpus is rebuilt from the store
+        monkeypatch.setattr(config, "BM25_INDEX_PATH", str(Path(tmpdir) / "shared_bm25"))
+        monkeypatch.setattr(bm25_module, "_bm25_index", None)
+        shared = bm25_module.open_bm25_index(chroma._collection, manifest.signature())
+        assert len(shared) == 1 and shared.search("globex")[0][1] > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
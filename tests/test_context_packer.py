@@ -0,0 +1,73 @@
+"""Tests for prompt context packing."""
+import pytest
+from langchain.schema import Document
+from chains.context_packer import estimate_tokens, merge_chunks, pack_context
+from chains.qa_chain import _render_prompt, build_qa_prompt
+from ingestion.metadata import chunk_metadata
+from ingestion.text_processor import chunk_text_with_offsets
+
+_TEXT = " ".join(
+    f"Sentence {i} says the segment {i} revenue grew by {i}.5 percent over the prior quarter." for i in range(60)
+)
+
+
+def _chunks(source="report.txt", text=_TEXT):
+    chunks = chunk_text_with_offsets(text, chunk_size=300, chunk_overlap=80, length_mode="chars")
+    return [
+        Document(page_content=chunk.text, metadata=metadata)
+        for chunk, metadata in zip(chunks, chunk_metadata(source, text, chunks, 0.0))
+    ]
+
+
+def test_overlapping_chunks_merge_into_one_passage():
+    """Test that overlapping and adjacent chunks are merged in document order."""
+    chunks = _chunks()
+    retrieved = [chunks[3], chunks[1], chunks[2], chunks[7]]
+    passages = merge_chunks(retrieved)
+
+    assert [p.chunks for p in passages] == [3, 1]
+    assert passages[0].rank == 0 and passages[1].rank == 3
+    start, end = chunks[1].metadata["start"], chunks[3].metadata["end"]
+    assert passages[0].text == _TEXT[start:end]
+
+    # Chunks without offsets are left alone
+    bare = [Document(page_content="alpha"), Document(page_content="beta")]
+    assert [p.text for p in merge_chunks(bare)] == ["alpha", "beta"]
+
+
+def test_duplicates_dropped_and_budget_enforced():
+    """Test near-duplicate removal, relevance order and the token budget."""
+    chunks = _chunks()
+    copy = Document(page_content=chunks[1].page_content, metadata={"source": "copy.txt"})
+    boilerplate = "All figures are unaudited and may be revised in later filings by the company."
+    retrieved = [
+        chunks[5],
+        copy,
+        Document(page_content=f"Alpha revenue rose 12 percent this quarter. {boilerplate}", metadata={"source": "a.txt"}),
+        chunks[1],
+        Document(page_content=f"Beta revenue fell 3 percent this quarter. {boilerplate}", metadata={"source": "b.txt"}),
+    ]
+    packed = pack_context(retrieved, budget=0)
+
+    assert packed.usage["duplicates_dropped"] == 1
+    assert [p.source for p in packed.passages] == ["report.txt", "copy.txt", "a.txt", "b.txt"]
+    assert packed.text.count(boilerplate) == 1 and "Beta revenue fell" in packed.text
+    assert packed.usage["context_tokens"] < packed.usage["retrieved_tokens"]
+
+    packed = pack_context(chunks, budget=200)
+    assert packed.usage["context_tokens"] <= 200
+    assert packed.usage["truncated"] <= 1
+    assert packed.text.startswith(chunks[0].page_content[:50])
+
+
+def test_prompt_uses_packed_context():
+    """Test that the QA prompt contains each retrieved sentence once."""
+    chunks = _chunks()
+    prompt = build_qa_prompt("How fast did segment 5 grow?", chunks[:4])
+    assert prompt.count("Sentence 5 says") == 1
+    plain = _render_prompt("How fast did segment 5 grow?", "\n\n".join(chunk.page_content for chunk in chunks[:4]))
+    assert estimate_tokens(prompt) < estimate_tokens(plain)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,63 @@
+"""Tests for parallel document loading."""
+import multiprocessing
+import time
+from pathlib import Path
+import pytest
+from ingestion import document_loader
+
+
+def _fake_loader(path):
+    """Module-level so worker processes can unpickle it."""
+    if "stuck" in path:
+        time.sleep(60)
+    return f"text of {Path(path).name}"
+
+
+def test_parallel_loader_skips_files_that_time_out():
+    """Test that a stuck file is skipped and the rest still load."""
+    paths = ["a.pdf", "stuck.pdf", "b.pdf", "c.pdf"]
+
+    start = time.perf_counter()
+    loaded = dict(document_loader._iter_parallel(paths, _fake_loader, workers=2, timeout=2))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(loaded) == ["a.pdf", "b.pdf", "c.pdf"]
+    assert loaded["b.pdf"] == "text of b.pdf"
+    assert elapsed < 30
+
+    # The worker stuck on the file was killed, not left running
+    deadline = time.monotonic() + 5
+    while multiprocessing.active_children() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not multiprocessing.active_children()
+
+
+def test_single_pdf_is_loaded_under_the_timeout(monkeypatch):
+    """Test that one PDF still goes through the pool when a timeout is set, and inline when not."""
+    calls = []
+
+    def fake_parallel(paths, loader, workers, timeout):
+        calls.append((paths, timeout))
+        return iter([])
+
+    monkeypatch.setattr(document_loader, "_iter_parallel", fake_parallel)
+    monkeypatch.setattr(document_loader, "_load_or_report", lambda path: "inline text")
+
+    assert list(document_loader.iter_documents(paths=["new.pdf"], workers=1, timeout=5)) == []
+    assert calls == [(["new.pdf"], 5)]
+    assert list(document_loader.iter_documents(paths=["new.pdf"], workers=4, timeout=0)) == [("new.pdf", "inline text")]
+    assert len(calls) == 1
+
+
+def test_load_documents_keeps_file_order(tmp_path):
+    """Test that results are in file name order regardless of completion order."""
+    for name in ["c.md", "a.txt", "b.txt"]:
+        (tmp_path / name).write_text(f"content of {name}")
+    (tmp_path / "notes.csv").write_text("ignored")
+
+    docs = document_loader.load_documents(str(tmp_path))
+    assert docs == ["content of a.txt", "content of b.txt", "content of c.md"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,63 @@
+"""Tests for the embedding service."""
+import threading
+import numpy as np
+import pytest
+from ingestion.embedding_service import EmbeddingService
+
+
+class FakeModel:
+    """Stands in for SentenceTransformer and records encode calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        return np.array([[float(len(t)), 1.0, 0.0] for t in texts], dtype=np.float64)
+
+
+def test_query_cache_skips_encode():
+    """Test that a repeated query is served from the cache as float32."""
+    model = FakeModel()
+    service = EmbeddingService(model, batch_window_ms=0)
+    first = service.embed_query("Q3 revenue?")
+    second = service.embed_query("Q3 revenue?")
+    assert first.dtype == np.float32
+    assert second is first
+    assert len(model.calls) == 1
+    assert service.stats()["cache_hits"] == 1
+
+
+def test_concurrent_queries_are_micro_batched():
+    """Test that queries arriving together share one encode call."""
+    model = FakeModel()
+    service = EmbeddingService(model, batch_window_ms=50)
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def worker(i):
+        barrier.wait()
+        results[i] = service.embed_query(f"question {i}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 8
+    assert len(model.calls) < 8
+    assert service.stats()["avg_batch_size"] > 1
+
+
+def test_encode_uses_configured_batch_size():
+    """Test that document encoding returns a float32 matrix."""
+    model = FakeModel()
+    service = EmbeddingService(model, batch_size=16)
+    vectors = service.encode(["a", "bb", "ccc"])
+    assert vectors.shape == (3, 3)
+    assert vectors.dtype == np.float32
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
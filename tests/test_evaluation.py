@@ -0,0 +1,60 @@
+"""Tests for the vectorized retrieval scoring in tests/evaluation.py."""
+import numpy as np
+import pytest
+from tests.evaluation import compare_embedding_models, retrieval_metrics, top_k_indices
+
+
+def test_top_k_matches_full_sort():
+    """Test that argpartition top-k returns the same ranking as a full cosine sort."""
+    rng = np.random.default_rng(0)
+    chunks = rng.standard_normal((500, 16)).astype(np.float32)
+    queries = rng.standard_normal((130, 16)).astype(np.float32)
+
+    ranked = top_k_indices(queries, chunks, k=7)
+
+    unit = chunks / np.linalg.norm(chunks, axis=1, keepdims=True)
+    expected = np.argsort(-(queries @ unit.T), axis=1)[:, :7]
+    assert ranked.shape == (130, 7)
+    assert np.array_equal(ranked, expected)
+    assert top_k_indices(queries[:2], chunks[:3], k=10).shape == (2, 3)
+
+
+def test_retrieval_metrics():
+    """Test recall@k, MRR, nDCG@k and top-1 accuracy with binary relevance."""
+    ranked = np.array([[0, 1, 2], [3, 4, 5], [6, 7, 8]])
+    relevant = [{0}, {5, 9}, {42}]
+
+    metrics = retrieval_metrics(ranked, relevant, k=3)
+
+    assert metrics["recall_at_k"] == pytest.approx(2 / 3)
+    assert metrics["mrr"] == pytest.approx((1 + 1 / 3) / 3)
+    assert metrics["accuracy"] == pytest.approx(1 / 3)
+    ndcg_second = (1 / np.log2(4)) / (1 + 1 / np.log2(3))
+    assert metrics["ndcg_at_k"] == pytest.approx((1 + ndcg_second) / 3)
+
+
+def test_compare_embedding_models_with_custom_provider():
+    """Test the report for an injected provider, with one batched embedding call per side."""
+    chunks = ["revenue grew in Q3", "FutureFlow is a competitor", "hiring plans for 2026"]
+    vocab = ["revenue", "futureflow", "hiring"]
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return [[float(word in text.lower()) for word in vocab] for text in texts]
+
+    queries = [("What about revenue?", "Q3"), ("Who is FutureFlow?", "FutureFlow")]
+    report = compare_embedding_models(
+        "", queries, k=2, chunks=chunks,
+        providers=[("Fake", True, embed), ("Missing", False, embed)]
+    )
+
+    fake, missing = report["providers"]
+    assert calls == [3, 2]
+    assert fake["accuracy_percent"] == 100.0 and fake["recall_at_2"] == 1.0 and fake["mrr"] == 1.0
+    assert fake["num_chunks"] == 3
+    assert missing == {"name": "Missing", "available": False, "reason": "Model, SDK or API key missing"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,78 @@
+"""Tests for Gemini helper model discovery and response caching."""
+import pytest
+from chains import gemini_helper
+from chains.llm_cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def reset_model_cache():
+    """Start each test with an expired model cache."""
+    gemini_helper._model_cache.update({"models": [], "ok": False, "expires_at": 0.0})
+    gemini_helper._resolved_models.clear()
+    yield
+    gemini_helper._model_cache.update({"models": [], "ok": False, "expires_at": 0.0})
+    gemini_helper._resolved_models.clear()
+
+
+def test_model_discovery_is_cached(monkeypatch):
+    """Test that list_models() runs once per TTL, not once per call."""
+    calls = []
+
+    def fake_fetch():
+        calls.append(1)
+        return ["gemini-2.5-flash", "gemini-pro"]
+
+    monkeypatch.setattr(gemini_helper, "_fetch_models", fake_fetch)
+
+    for _ in range(5):
+        assert gemini_helper.get_best_available_model("gemini-2.5-flash") == "gemini-2.5-flash"
+    assert len(calls) == 1
+
+
+def test_model_discovery_failure_is_negatively_cached(monkeypatch):
+    """Test that a failed discovery is not retried on every call."""
+    calls = []
+
+    def failing_fetch():
+        calls.append(1)
+        raise RuntimeError("network down")
+
+    monkeypatch.setattr(gemini_helper, "_fetch_models", failing_fetch)
+
+    assert gemini_helper.get_best_available_model("gemini-2.5-flash") == "gemini-pro"
+    assert gemini_helper.get_best_available_model("gemini-2.5-flash") == "gemini-pro"
+    assert len(calls) == 1
+    assert gemini_helper.model_cache_stats()["failures"] >= 1
+
+
+def test_generative_model_pool_reuses_instances():
+    """Test that clients are reused per model name."""
+    first = gemini_helper.get_generative_model("gemini-2.5-flash")
+    assert gemini_helper.get_generative_model("gemini-2.5-flash") is first
+
+
+def test_generate_text_uses_response_cache(monkeypatch):
+    """Test that a repeated prompt is served without a second generation."""
+    calls = []
+
+    class FakeResponse:
+        text = "Cached answer"
+
+    class FakeModel:
+        def generate_content(self, prompt, generation_config=None, request_options=None):
+            calls.append(prompt)
+            return FakeResponse()
+
+    monkeypatch.setattr(gemini_helper, "get_best_available_model", lambda model=None: "gemini-2.5-flash")
+    monkeypatch.setattr(gemini_helper, "get_generative_model", lambda name: FakeModel())
+    cache = ResponseCache()
+    monkeypatch.setattr(gemini_helper, "get_response_cache", lambda: cache)
+
+    assert gemini_helper.generate_text("What was Q3 revenue?") == "Cached answer"
+    assert gemini_helper.generate_text("What was  Q3 revenue?") == "Cached answer"
+    assert gemini_helper.generate_text("What was Q3 revenue?", use_cache=False) == "Cached answer"
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
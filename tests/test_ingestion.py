@@ -4,7 +4,18 @@ import tempfile
 import shutil
 from pathlib import Path
 import config
-from ingestion import document_loader, text_processor, vector_store
+from ingestion import document_loader, metadata, text_processor, vector_store
+from ingestion.manifest import IngestionManifest
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings so Chroma can be used without the model."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text) % 7), float(text.count("e")), 1.0]
 
 
 def test_load_txt_document():
@@ -28,6 +39,46 @@ def test_chunk_text():
     assert all(isinstance(chunk, str) for chunk in chunks)
 
 
+def test_chunk_offsets_map_back_to_source():
+    """Test that every chunk records where it came from."""
+    text = "Revenue grew in Q3.\n\n" + "Margins expanded across all regions. " * 60 + "\n\nOutlook: strong."
+    chunks = text_processor.chunk_text_with_offsets(text, chunk_size=200, chunk_overlap=40, length_mode="chars")
+
+    assert [c.text for c in chunks] == text_processor.chunk_text(text, chunk_size=200, chunk_overlap=40, length_mode="chars")
+    assert all(text[c.start:c.end] == c.text for c in chunks)
+    assert [c.start for c in chunks] == sorted(c.start for c in chunks)
+    assert text_processor.get_text_splitter(200, 40, "chars") is text_processor.get_text_splitter(200, 40, "chars")
+
+
+def test_chunk_text_token_mode(monkeypatch):
+    """Test that token mode measures chunks with the tokenizer."""
+    class WhitespaceTokenizer:
+        def encode(self, text, add_special_tokens=False):
+            return text.split()
+
+    monkeypatch.setattr(text_processor, "_tokenizer", WhitespaceTokenizer())
+    text_processor.token_length.cache_clear()
+    try:
+        chunks = text_processor.chunk_text("word " * 100, chunk_size=10, chunk_overlap=0, length_mode="tokens")
+    finally:
+        text_processor.token_length.cache_clear()
+
+    assert len(chunks) == 10
+    assert all(len(chunk.split()) == 10 for chunk in chunks)
+
+
+def test_chunk_corpus_parallel_matches_sequential(monkeypatch):
+    """Test that the process pool returns the same chunks, in document order."""
+    texts = [f"Document {i}. " + "Quarterly revenue and margin commentary. " * (20 + i) for i in range(6)]
+    sequential = text_processor.chunk_corpus(texts, chunk_size=120, chunk_overlap=20, length_mode="chars", workers=1)
+
+    monkeypatch.setattr(text_processor, "_PARALLEL_MIN_CHARS", 0)
+    parallel = text_processor.chunk_corpus(texts, chunk_size=120, chunk_overlap=20, length_mode="chars", workers=2)
+
+    assert parallel == sequential
+    assert parallel[3][0].text.startswith("Document 3.")
+
+
 def test_vector_store_creation():
     """Test vector store can be created (if API key is set)."""
     if not config.GEMINI_API_KEY or config.GEMINI_API_KEY == "your_gemini_api_key_here":
@@ -38,6 +89,28 @@ def test_vector_store_creation():
     assert callable(vector_store.create_vector_store)
 
 
+def test_vector_store_registry_opens_once():
+    """Test the registry hands out one handle and swaps without reopening."""
+    opened = []
+
+    def opener(force_rebuild=False):
+        opened.append(force_rebuild)
+        return object()
+
+    registry = vector_store.VectorStoreRegistry(opener=opener)
+    first = registry.get()
+    assert registry.get() is first
+    assert registry.stats()["open_count"] == 1
+
+    replacement = object()
+    assert registry.swap(replacement) is first
+    assert registry.get() is replacement
+
+    reloaded = registry.reload(force_rebuild=True)
+    assert reloaded is registry.get()
+    assert opened == [False, True]
+
+
 def test_document_loader_with_multiple_files():
     """Test loading multiple documents."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -51,6 +124,135 @@ def test_document_loader_with_multiple_files():
         assert "Document 2" in docs[1]
 
 
+def test_sync_vector_store_is_incremental(monkeypatch):
+    """Test that sync only embeds added/changed files and removes deleted ones."""
+    from langchain_community.vectorstores import Chroma
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        docs_dir = Path(tmpdir) / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "q2.txt").write_text("Q2 revenue was $10M.")
+        (docs_dir / "q3.txt").write_text("Q3 revenue was $12M.")
+        store = Chroma(
+            collection_name="sync_test",
+            persist_directory=str(Path(tmpdir) / "chroma"),
+            embedding_function=FakeEmbeddings()
+        )
+        manifest = IngestionManifest(str(Path(tmpdir) / "manifest.json"))
+
+        stats = vector_store.sync_vector_store(store, str(docs_dir), manifest)
+        assert stats["added"] == 2 and stats["chunks_added"] == 2
+
+        stats = vector_store.sync_vector_store(store, str(docs_dir), manifest)
+        assert stats["unchanged"] == 2 and stats["chunks_added"] == 0
+
+        (docs_dir / "q3.txt").write_text("Q3 revenue was restated to $13M.")
+        (docs_dir / "q2.txt").unlink()
+        (docs_dir / "q4.txt").write_text("Q4 revenue was $15M.")
+        stats = vector_store.sync_vector_store(store, str(docs_dir), manifest)
+        assert (stats["added"], stats["changed"], stats["removed"]) == (1, 1, 1)
+        assert store._collection.count() == 2
+        assert IngestionManifest.load(manifest.path).files.keys() == {"q3.txt", "q4.txt"}
+
+        # New chunking settings re-chunk unchanged files and replace their old chunks
+        monkeypatch.setattr(config, "CHUNK_SIZE", 12)
+        monkeypatch.setattr(config, "CHUNK_OVERLAP", 0)
+        stats = vector_store.sync_vector_store(store, str(docs_dir), manifest)
+        assert stats["changed"] == 2
+        assert store._collection.count() == stats["chunks_added"] > 2
+
+
+def test_sync_counts_unreadable_files_as_failed(monkeypatch):
+    """Test that a file vanishing mid-scan is counted as failed instead of aborting the sync."""
+    from langchain_community.vectorstores import Chroma
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        docs_dir = Path(tmpdir) / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "q2.txt").write_text("Q2 revenue was $10M.")
+        (docs_dir / "q3.txt").write_text("Q3 revenue was $12M.")
+        store = Chroma(
+            collection_name="sync_failure_test",
+            persist_directory=str(Path(tmpdir) / "chroma"),
+            embedding_function=FakeEmbeddings()
+        )
+        real_sha256 = vector_store.file_sha256
+
+        def flaky_sha256(path):
+            if path.endswith("q2.txt"):
+                raise FileNotFoundError(path)
+            return real_sha256(path)
+
+        monkeypatch.setattr(vector_store, "file_sha256", flaky_sha256)
+        stats = vector_store.sync_vector_store(store, str(docs_dir), IngestionManifest(str(Path(tmpdir) / "manifest.json")))
+        assert (stats["added"], stats["failed"]) == (1, 1)
+        assert store._collection.count() == 1
+
+
+def test_sync_lock_serializes_syncs(tmp_path):
+    """Test that a second sync waits for the lock holder, as a second worker would."""
+    import threading
+    import time
+    from ingestion.manifest import sync_lock
+
+    path = str(tmp_path / "manifest.json")
+    events = []
+
+    def second_sync():
+        with sync_lock(path):
+            events.append("second")
+
+    with sync_lock(path):
+        worker = threading.Thread(target=second_sync)
+        worker.start()
+        time.sleep(0.2)
+        events.append("first done")
+    worker.join(timeout=5)
+
+    assert events == ["first done", "second"]
+
+
+def test_file_tags_and_where_clause():
+    """Test file-name tags and the translation of request filters."""
+    assert metadata.parse_file_tags("innovate_q3_2025.txt") == {"company": "innovate", "quarter": "Q3", "year": 2025}
+    assert metadata.parse_file_tags("notes.txt") == {}
+
+    assert metadata.build_where({"company": "Innovate"}) == {"company": {"$eq": "innovate"}}
+    assert metadata.build_where({"quarter": ["q3", "q4"], "year": {"$gte": 2024}}) == {
+        "$and": [{"quarter": {"$in": ["Q3", "Q4"]}}, {"year": {"$gte": 2024}}]
+    }
+    for bad in ({"password": "x"}, {"year": {"$regex": ".*"}}):
+        try:
+            metadata.build_where(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+
+def test_synced_chunks_carry_metadata_and_filter():
+    """Test that ingestion stores chunk metadata and retrieval honours filters."""
+    from langchain_community.vectorstores import Chroma
+    from chains.qa_chain import retrieve_documents
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        docs_dir = Path(tmpdir) / "documents"
+        docs_dir.mkdir()
+        (docs_dir / "acme_q3_2025.txt").write_text("# Results\nAcme revenue was $10M.")
+        (docs_dir / "globex_q3_2025.txt").write_text("# Results\nGlobex revenue was $20M.")
+        store = Chroma(
+            collection_name="metadata_test",
+            persist_directory=str(Path(tmpdir) / "chroma"),
+            embedding_function=FakeEmbeddings()
+        )
+        vector_store.sync_vector_store(store, str(docs_dir), IngestionManifest(str(Path(tmpdir) / "manifest.json")))
+
+        docs = retrieve_documents(store, "revenue", k=4, filters={"company": "Acme", "quarter": "q3"})
+        assert [doc.metadata["source"] for doc in docs] == ["acme_q3_2025.txt"]
+        meta = docs[0].metadata
+        assert (meta["year"], meta["section"], meta["chunk_index"], meta["start"]) == (2025, "Results", 0, 0)
+        assert meta["ingested_at"] > 0
+
+
 if __name__ == "__main__":
     import pytest
     pytest.main([__file__, "-v"])
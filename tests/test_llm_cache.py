@@ -0,0 +1,59 @@
+"""Tests for the LLM response cache."""
+import pytest
+from chains.llm_cache import ResponseCache, make_cache_key
+
+
+def test_cache_key_normalizes_whitespace():
+    """Test that prompts differing only in spacing share a key."""
+    a = make_cache_key("Summarize  this\ntext ", "gemini-2.5-flash", {"temperature": 0.3})
+    b = make_cache_key("Summarize this text", "gemini-2.5-flash", {"temperature": 0.3})
+    c = make_cache_key("Summarize this text", "gemini-2.5-flash", {"temperature": 0.7})
+    assert a == b
+    assert a != c
+
+
+def test_memory_tier_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    """Test TTL expiry."""
+    cache = ResponseCache(ttl=-1)
+    cache.set("a", "1")
+    assert cache.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Test that the SQLite tier serves entries to a fresh cache instance."""
+    path = str(tmp_path / "llm_cache.sqlite3")
+    ResponseCache(disk_path=path).set("a", "cached answer")
+
+    cache = ResponseCache(disk_path=path)
+    assert cache.get("a") == "cached answer"
+    assert cache.stats()["disk_hits"] == 1
+
+
+
+def test_disk_tier_evicts_oldest_in_batches(tmp_path):
+    """Test that the disk tier stays within max_disk_entries, dropping the oldest entries."""
+    cache = ResponseCache(max_entries=1, disk_path=str(tmp_path / "llm_cache.sqlite3"), max_disk_entries=200)
+    for i in range(250):
+        cache.set(f"k{i}", str(i))
+    cache.set("k249", "rewritten")
+
+    assert cache.stats()["disk_entries"] == cache._count_disk() <= 200
+    assert cache.get("k0") is None
+    assert cache.get("k249") == "rewritten"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
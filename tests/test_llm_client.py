@@ -0,0 +1,216 @@
+"""Tests for the shared Gemini client limits."""
+import asyncio
+import threading
+import time
+import pytest
+from google.api_core import exceptions as google_exceptions
+import config
+from chains.llm_client import (
+    CircuitOpenError, DeadlineExceededError, LLMClient, TokenBucket, classify_error, deadline
+)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+
+
+def test_retries_transient_errors_only():
+    """Test that 503s and 429s are retried, client errors are not, and retries are counted by class."""
+    client = LLMClient(max_retries=3)
+    errors = [RuntimeError("503 Service Unavailable"), RuntimeError("429 Resource has been exhausted")]
+
+    def flaky(timeout):
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert client.call(flaky) == "ok"
+
+    calls = []
+
+    def bad_request(timeout):
+        calls.append(timeout)
+        raise ValueError("400 Invalid argument: prompt is empty")
+
+    with pytest.raises(ValueError):
+        client.call(bad_request)
+    assert len(calls) == 1
+    assert 0 < calls[0] <= client.timeout
+
+    stats = client.stats()
+    assert stats["retries"] == {"unavailable": 1, "rate_limit": 1}
+    assert stats["attempts"] == 4 and stats["succeeded"] == 1 and stats["failed"] == 1
+    assert classify_error(asyncio.TimeoutError()) == "timeout"
+
+
+def test_classify_error_uses_status_not_message_words():
+    """Test that api_core types and leading status codes decide the class, not numbers inside a message."""
+    assert classify_error(google_exceptions.ResourceExhausted("quota")) == "rate_limit"
+    assert classify_error(google_exceptions.ServiceUnavailable("try later")) == "unavailable"
+    assert classify_error(google_exceptions.DeadlineExceeded("slow")) == "timeout"
+    assert classify_error(google_exceptions.InvalidArgument("max 500 tokens, 429 given; connection field")) == "client"
+    assert classify_error(ValueError("prompt must be under 500 characters")) == "client"
+    assert classify_error(RuntimeError("400 Bad request: connection 503 is not a model")) == "client"
+    assert classify_error(RuntimeError("503 Service Unavailable")) == "unavailable"
+    assert classify_error(RuntimeError("<AioRpcError status = StatusCode.RESOURCE_EXHAUSTED>")) == "rate_limit"
+    assert classify_error(ConnectionResetError()) == "unavailable"
+
+
+def test_concurrency_limit_is_shared_by_threads_and_event_loop():
+    """Test that sync and async calls together never exceed max_concurrency and that queueing is measured."""
+    client = LLMClient(max_concurrency=2)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def enter():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+
+    def leave():
+        with lock:
+            active[0] -= 1
+
+    def blocking_call(timeout):
+        enter()
+        time.sleep(0.05)
+        leave()
+        return "sync"
+
+    async def async_call():
+        enter()
+        await asyncio.sleep(0.05)
+        leave()
+        return "async"
+
+    async def run():
+        return await asyncio.gather(*[client.call_async(async_call) for _ in range(4)])
+
+    threads = [threading.Thread(target=client.call, args=(blocking_call,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert asyncio.run(run()) == ["async"] * 4
+    for thread in threads:
+        thread.join()
+
+    stats = client.stats()
+    assert peak[0] == 2
+    assert stats["attempts"] == 6 and stats["in_flight"] == 0 and stats["waiting"] == 0
+    assert stats["queued"] >= 3 and stats["max_queue_ms"] >= 40
+
+
+def test_token_bucket_reserves_and_refills():
+    """Test that a drained bucket makes the next caller wait for the refill, or refuses past max_wait."""
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.reserve(600) == 0.0
+    assert bucket.reserve(10, max_wait=0.5) is None
+    assert bucket.reserve(10) == pytest.approx(1.0, abs=0.05)
+    bucket.charge(100)
+    assert bucket.available() < -100
+
+
+def test_circuit_breaker_fails_fast_then_probes():
+    """Test that repeated 503s open the breaker, and a successful probe after the reset closes it."""
+    client = LLMClient(max_retries=0, breaker_failures=2, breaker_reset=0.05)
+    calls = []
+
+    def down(timeout):
+        calls.append(timeout)
+        raise RuntimeError("503 Service Unavailable")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            client.call(down)
+    with pytest.raises(CircuitOpenError):
+        client.call(down)
+    assert len(calls) == 2
+    assert client.stats()["circuit"]["state"] == "open"
+
+    time.sleep(0.06)
+    assert client.call(lambda timeout: "ok") == "ok"
+    assert client.stats()["circuit"] == {"state": "closed", "consecutive_failures": 0, "times_opened": 1}
+    assert client.stats()["rejected"] == 1
+
+
+def test_deadline_bounds_attempts_and_queueing():
+    """Test that a request deadline cancels a slow attempt and bounds the wait for a slot."""
+    client = LLMClient(max_concurrency=1, max_retries=3)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def run():
+        started = time.perf_counter()
+        with deadline(0.05):
+            with pytest.raises(asyncio.TimeoutError):
+                await client.call_async(slow)
+        elapsed = time.perf_counter() - started
+
+        holder = asyncio.ensure_future(client.call_async(lambda: asyncio.sleep(0.2)))
+        await asyncio.sleep(0.01)
+        with deadline(0.05):
+            with pytest.raises(DeadlineExceededError):
+                await client.call_async(slow)
+        await holder
+        return elapsed
+
+    assert asyncio.run(run()) < 0.5
+    assert client.stats()["deadline_exceeded"] == 1
+
+
+def test_calls_that_never_start_refund_the_rate_limit():
+    """Test that timing out or being cancelled while waiting for a slot gives back the reserved budget."""
+    client = LLMClient(max_concurrency=1, requests_per_minute=60, tokens_per_minute=6000)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    async def run():
+        holder = asyncio.ensure_future(client.call_async(lambda: asyncio.sleep(0.2), tokens=1000))
+        await asyncio.sleep(0.01)
+        with deadline(0.05):
+            with pytest.raises(DeadlineExceededError):
+                await client.call_async(slow, tokens=1000)
+        waiting = asyncio.ensure_future(client.call_async(slow, tokens=1000))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await holder
+
+    asyncio.run(run())
+    # Only the call that ran keeps its reservation
+    assert 58.5 < client.requests.available() < 60
+    assert 4500 < client.tokens.available() < 5500
+
+
+def test_stream_retries_before_first_piece_and_frees_slot_on_close():
+    """Test that a stream failing to start is retried and that closing it early releases its slot."""
+    client = LLMClient(max_concurrency=1, max_retries=1)
+    starts = []
+
+    async def pieces():
+        for piece in ("a", "b", "c"):
+            yield piece
+
+    async def start():
+        starts.append(1)
+        if len(starts) == 1:
+            raise RuntimeError("503 Service Unavailable")
+        return pieces()
+
+    async def run():
+        stream = client.stream_async(start)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == "a"
+    assert len(starts) == 2
+    assert client.stats()["in_flight"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,128 @@
+"""Tests for request instrumentation and the /metrics endpoint."""
+import asyncio
+import re
+import threading
+import httpx
+import pytest
+from fastapi import FastAPI
+import config
+from chains import gemini_helper, llm_cache, qa_chain
+from router.routes import router
+from utils.metrics import REGISTRY, MetricsMiddleware, MetricsRegistry, span
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    REGISTRY.clear()
+    yield
+    REGISTRY.clear()
+
+
+def _sample(text: str, name: str, **labels) -> float:
+    """Value of the first sample of name whose labels include the given ones."""
+    for line in text.splitlines():
+        match = re.match(r"(\w+)(?:\{(.*)\})? (\S+)$", line)
+        if match and match.group(1) == name:
+            found = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2) or ""))
+            if all(found.get(key) == str(value) for key, value in labels.items()):
+                return float(match.group(3))
+    raise AssertionError(f"No sample {name} {labels}")
+
+
+def test_histogram_and_counter_exposition():
+    """Test cumulative buckets, sum/count and label escaping in the text format."""
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo latency.", ("stage",), buckets=(0.1, 1.0))
+    calls = registry.counter("demo_total", "Demo calls.", ("outcome",))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.labels("llm").observe(value)
+    calls.labels('say "hi"').inc(2)
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert [_sample(text, "demo_seconds_bucket", le=le) for le in ("0.1", "1.0", "+Inf")] == [1, 3, 4]
+    assert _sample(text, "demo_seconds_count") == 4 and _sample(text, "demo_seconds_sum") == 4.05
+    assert 'demo_total{outcome="say \\"hi\\""} 2' in text
+    with pytest.raises(ValueError):
+        calls.labels("ok", "extra")
+
+
+def test_span_counts_errors():
+    """Test that a span records its duration and counts an exception leaving it."""
+    with pytest.raises(RuntimeError):
+        with span("json_parse"):
+            raise RuntimeError("bad json")
+    text = REGISTRY.render()
+    assert _sample(text, "rag_stage_duration_seconds_count", endpoint="none", stage="json_parse") == 1
+    assert _sample(text, "rag_errors_total", stage="json_parse") == 1
+
+
+def test_qa_request_reports_stages_and_llm_calls(monkeypatch):
+    """Test per-stage histograms, LLM/cache counters and request latency on /metrics."""
+    class Embeddings:
+        def embed_query(self, text):
+            return [1.0, 0.0]
+
+    class Doc:
+        page_content = "Innovate Inc reported Q3 revenue of $12M."
+        metadata = {}
+
+    class Store:
+        _embedding_function = Embeddings()
+
+        def similarity_search_by_vector(self, embedding, k=4, filter=None):
+            return [Doc()]
+
+    class Response:
+        text = "Revenue was $12M."
+
+    class Model:
+        async def generate_content_async(self, prompt, generation_config=None):
+            return Response()
+
+    monkeypatch.setattr(config, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(config, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(qa_chain, "get_vector_store", lambda: Store())
+    index_lookups = []
+
+    def get_index():
+        # Lookups may reload the BM25 index or load the cross-encoder, so they must stay off the event loop
+        index_lookups.append(threading.current_thread())
+        return None
+
+    monkeypatch.setattr(qa_chain, "get_bm25_index", get_index)
+    monkeypatch.setattr(qa_chain, "get_reranker", get_index)
+    monkeypatch.setattr(llm_cache, "_response_cache", llm_cache.ResponseCache(max_entries=16))
+    monkeypatch.setattr(gemini_helper, "_model_cache_fresh", lambda: True)
+    monkeypatch.setattr(gemini_helper, "get_best_available_model", lambda model=None: "fake-model")
+    monkeypatch.setattr(gemini_helper, "get_generative_model", lambda name: Model())
+
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, prefix="/api/v1", endpoints=[route.path for route in router.routes])
+    app.include_router(router, prefix="/api/v1")
+
+    async def run():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            for _ in range(2):
+                response = await client.post("/api/v1/qa", json={"question": "What was Q3 revenue?"})
+                assert response.json()["answer"] == "Revenue was $12M."
+            await client.post("/api/v1/qa", json={"question": ""})
+            return await client.get("/api/v1/metrics")
+
+    response = asyncio.run(run())
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for stage in ("guardrails", "embedding", "vector_search", "prompt_build"):
+        assert _sample(text, "rag_stage_duration_seconds_count", endpoint="qa", stage=stage) >= 2
+    assert _sample(text, "rag_stage_duration_seconds_count", endpoint="qa", stage="llm_call") == 1
+    assert _sample(text, "rag_llm_calls_total", endpoint="qa", outcome="ok") == 1
+    assert _sample(text, "rag_llm_calls_total", endpoint="qa", outcome="cached") == 1
+    assert _sample(text, "rag_cache_lookups_total", cache="llm_response", result="hit") == 1
+    assert _sample(text, "rag_request_duration_seconds_count", endpoint="qa", status=200) == 2
+    assert _sample(text, "rag_request_duration_seconds_count", endpoint="qa", status=400) == 1
+    assert _sample(text, "rag_errors_total", endpoint="qa", stage="guardrails") == 1
+    assert len(index_lookups) == 4 and threading.main_thread() not in index_lookups
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
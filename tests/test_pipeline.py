@@ -0,0 +1,54 @@
+"""Tests for the streaming ingestion pipeline."""
+import numpy as np
+import pytest
+from ingestion.pipeline import IngestionPipeline
+
+
+class FakeCollection:
+    """Records upsert batches instead of writing to Chroma."""
+
+    def __init__(self):
+        self.batches = []
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        self.batches.append(list(ids))
+
+
+def fake_embed(texts):
+    return np.ones((len(texts), 3), dtype=np.float32)
+
+
+def prepare(path, text):
+    chunks = text.split("|")
+    return [f"{path}-{i}" for i in range(len(chunks))], chunks, None
+
+
+def test_pipeline_writes_fixed_size_batches():
+    """Test that every chunk is written in bounded batches and files are reported once."""
+    documents = ((f"doc{i}", "|".join(f"chunk {j}" for j in range(7))) for i in range(10))
+    collection = FakeCollection()
+    written = {}
+
+    pipeline = IngestionPipeline(collection, fake_embed, embed_batch_size=4, upsert_batch_size=16, queue_size=2)
+    stats = pipeline.run(documents, prepare, lambda path, ids: written.setdefault(path, ids))
+
+    assert all(len(batch) <= 16 for batch in collection.batches)
+    assert sum(len(batch) for batch in collection.batches) == 70
+    assert len(written) == 10 and written["doc3"] == [f"doc3-{j}" for j in range(7)]
+    assert stats["stages"]["upsert"]["items"] == 70
+    assert stats["stages"]["load"]["items"] == 10
+
+
+def test_pipeline_surfaces_stage_errors():
+    """Test that a failing stage stops the pipeline and re-raises."""
+    def failing_embed(texts):
+        raise RuntimeError("encoder crashed")
+
+    documents = ((f"doc{i}", "a|b|c") for i in range(100))
+    pipeline = IngestionPipeline(FakeCollection(), failing_embed, embed_batch_size=2, upsert_batch_size=4, queue_size=1)
+    with pytest.raises(RuntimeError):
+        pipeline.run(documents, prepare)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,94 @@
+"""Tests for cross-encoder re-ranking."""
+import time
+import pytest
+from langchain.schema import Document
+import config
+from chains.reranker import Reranker
+
+
+class OverlapCrossEncoder:
+    """Scores a (query, passage) pair by shared words, like a tiny cross-encoder."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=None):
+        time.sleep(self.delay)
+        self.pairs += len(pairs)
+        return [len(set(query.lower().split()) & set(text.lower().split())) for query, text in pairs]
+
+
+def _docs():
+    return [
+        Document(page_content="Globex headcount grew in Q3", metadata={"source": "globex.txt"}),
+        Document(page_content="Acme pricing strategy", metadata={"source": "acme.txt"}),
+        Document(page_content="Acme revenue in Q3 was $10M", metadata={"source": "acme.txt"}),
+        Document(page_content="Market outlook", metadata={"source": "outlook.txt"}),
+    ]
+
+
+def test_rerank_orders_by_score_and_caches():
+    """Test top-k by cross-encoder score and per (query, chunk) caching."""
+    model = OverlapCrossEncoder()
+    reranker = Reranker(model, batch_size=2)
+    docs = _docs()
+
+    top = reranker.rerank("acme revenue in q3", docs, k=2)
+    assert [doc.page_content for doc in top] == ["Acme revenue in Q3 was $10M", "Globex headcount grew in Q3"]
+    assert model.pairs == 4
+
+    # The same question (modulo case and spacing) is answered from the cache
+    reranker.rerank("Acme  revenue in Q3", docs, k=2)
+    assert model.pairs == 4
+    stats = reranker.stats()
+    assert stats["cache_hits"] == 4 and stats["reranked"] == 2
+
+    # Candidates shared between questions are scored once per question
+    batches = reranker.rerank_many(["acme pricing", "acme revenue in q3"], [docs[:2], docs[1:]], k=1)
+    assert [[doc.page_content for doc in batch] for batch in batches] == [["Acme pricing strategy"], ["Acme revenue in Q3 was $10M"]]
+    assert model.pairs == 6
+
+
+def test_rerank_falls_back_over_budget():
+    """Test that scoring which would exceed the budget keeps retrieval order."""
+    model = OverlapCrossEncoder(delay=0.05)
+    reranker = Reranker(model, batch_size=2, budget_ms=40)
+    docs = _docs()
+
+    # The first batch runs past the budget, so the rest is not scored
+    assert reranker.rerank("acme revenue in q3", docs, k=1, fallback_k=3) == docs[:3]
+    assert model.pairs == 2 and reranker.stats()["stopped_at_budget"] == 1
+
+    # Once the cost per pair is known, an over-budget call is skipped up front
+    assert reranker.rerank("globex outlook", docs, k=1) == docs[:1]
+    assert model.pairs == 2 and reranker.stats()["skipped_over_budget"] == 1
+
+
+def test_retrieval_over_fetches_and_reranks(monkeypatch):
+    """Test that retrieval fetches RERANK_CANDIDATES and returns the re-ranked top k."""
+    from chains.qa_chain import retrieve_documents, retrieve_documents_batch
+
+    class Store:
+        def as_retriever(self, search_kwargs):
+            self.k = search_kwargs["k"]
+            return self
+
+        def get_relevant_documents(self, question):
+            return _docs()[:self.k]
+
+    monkeypatch.setattr(config, "RERANK_CANDIDATES", 30)
+    monkeypatch.setattr(config, "RERANK_TOP_K", 2)
+    store = Store()
+    docs = retrieve_documents(store, "acme revenue in q3", reranker=Reranker(OverlapCrossEncoder()))
+    assert store.k == 30
+    assert [doc.page_content for doc in docs] == ["Acme revenue in Q3 was $10M", "Globex headcount grew in Q3"]
+
+    # Without a re-ranker, retrieval order and RETRIEVAL_K are unchanged
+    assert retrieve_documents(store, "acme revenue in q3", k=3) == _docs()[:3] and store.k == 3
+    batches = retrieve_documents_batch(store, ["acme pricing"], k=1, reranker=Reranker(OverlapCrossEncoder()))
+    assert [doc.page_content for doc in batches[0]] == ["Acme pricing strategy"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,102 @@
+"""Tests for the semantic answer cache."""
+import asyncio
+import re
+import numpy as np
+import pytest
+import config
+from chains import qa_chain, semantic_cache
+from chains.semantic_cache import SemanticCache, make_scope
+
+_STOPWORDS = {"what", "was", "the", "in", "is", "did", "for", "how", "much"}
+
+
+class BagOfWordsEmbeddings:
+    """Hashed bag of content words, so paraphrases embed close together."""
+
+    def embed_query(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            if word not in _STOPWORDS:
+                vector[sum(map(ord, word)) % 64] += 1.0
+        return vector.tolist()
+
+
+def _vector(text):
+    return np.array(BagOfWordsEmbeddings().embed_query(text))
+
+
+def test_similar_questions_hit_within_scope_and_version():
+    """Test threshold, figure guard, scope, LRU eviction and version invalidation."""
+    cache = SemanticCache(max_entries=2, threshold=0.9)
+    scope = make_scope(filters=None, k=None, weights=None)
+    result = {"answer": "Revenue was $12M.", "source_documents": []}
+    cache.set(_vector("Q3 revenue?"), "Q3 revenue?", scope, "v1", result, cost_ms=800.0)
+
+    hit = cache.get(_vector("What was revenue in Q3"), "What was revenue in Q3", scope, "v1")
+    assert hit is not None and hit.result == result and hit.similarity > 0.99
+    hit.result["answer"] = "changed"
+    assert cache.get(_vector("Q3 revenue"), "Q3 revenue", scope, "v1").result["answer"] == "Revenue was $12M."
+
+    # Different figures, retrieval options or a weak match are misses
+    assert cache.get(_vector("Q4 revenue?"), "Q4 revenue?", scope, "v1") is None
+    assert cache.get(_vector("Q3 revenue?"), "Q3 revenue?", make_scope(filters={"company": "acme"}, k=None, weights=None), "v1") is None
+    assert cache.get(_vector("Q3 market share?"), "Q3 market share?", scope, "v1") is None
+
+    # The least recently used entry is evicted
+    cache.set(_vector("market share"), "market share", scope, "v1", result, 500.0)
+    cache.set(_vector("headcount"), "headcount", scope, "v1", result, 500.0)
+    assert cache.get(_vector("Q3 revenue?"), "Q3 revenue?", scope, "v1") is None
+    assert cache.get(_vector("headcount"), "headcount", scope, "v1") is not None
+
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["saved_ms"] == 2100.0 and stats["evictions"] == 1
+
+    # A new corpus version empties the cache
+    assert cache.get(_vector("headcount"), "headcount", scope, "v2") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["invalidations"] == 1
+
+
+def test_paraphrased_question_skips_retrieval_and_gemini(monkeypatch):
+    """Test that /qa answers a paraphrase from the cache until the corpus changes."""
+    calls = {"retrieve": 0, "gemini": 0}
+    version = {"value": "v1"}
+
+    class Store:
+        _embedding_function = BagOfWordsEmbeddings()
+
+    def fake_retrieve(vectorstore, question, **kwargs):
+        calls["retrieve"] += 1
+        return []
+
+    async def fake_gemini(prompt, model=None, temperature=0.4, use_cache=True):
+        calls["gemini"] += 1
+        return "Revenue was $12M."
+
+    monkeypatch.setattr(config, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(config, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(semantic_cache, "_semantic_cache", None)
+    monkeypatch.setattr(qa_chain, "get_vector_store", lambda: Store())
+    monkeypatch.setattr(qa_chain, "retrieve_documents", fake_retrieve)
+    monkeypatch.setattr(qa_chain, "ask_gemini_async", fake_gemini)
+    monkeypatch.setattr(qa_chain, "corpus_version", lambda: version["value"])
+
+    async def ask(question, **kwargs):
+        return await qa_chain.answer_question_async(question, **kwargs)
+
+    first = asyncio.run(ask("Q3 revenue?"))
+    second = asyncio.run(ask("what was revenue in Q3"))
+    assert second == first and calls == {"retrieve": 1, "gemini": 1}
+
+    # Bypassed with use_cache=False; a different k is another scope
+    asyncio.run(ask("what was revenue in Q3", use_cache=False))
+    asyncio.run(ask("what was revenue in Q3", k=8))
+    assert calls["gemini"] == 3
+
+    version["value"] = "v2"
+    asyncio.run(ask("what was revenue in Q3"))
+    assert calls["gemini"] == 4
+    assert semantic_cache.semantic_cache_stats()["hits"] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,93 @@
+"""Tests for the map-reduce summary chain."""
+import asyncio
+import time
+import pytest
+import config
+from chains import gemini_helper, llm_client, summary_chain
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """Replace Gemini with a 100 ms fake and record the prompts it sees."""
+    prompts = []
+
+    async def fake_generate_async(prompt, model=None, temperature=0.4, use_cache=True):
+        prompts.append(prompt)
+        await asyncio.sleep(0.1)
+        return "Section summary."
+
+    async def fake_ask_async(prompt, model=None, temperature=0.4, use_cache=True):
+        return await fake_generate_async(prompt)
+
+    monkeypatch.setattr(config, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(summary_chain, "generate_text_async", fake_generate_async)
+    monkeypatch.setattr(summary_chain, "ask_gemini_async", fake_ask_async)
+    return prompts
+
+
+def test_map_phase_runs_concurrently(fake_gemini):
+    """Test that chunk summaries are fanned out instead of run one by one."""
+    text = ("Revenue grew in every region this quarter. " * 70 + "\n\n") * 20
+
+    start = time.perf_counter()
+    summary = asyncio.run(summary_chain.summarize_text_async(text))
+    elapsed = time.perf_counter() - start
+
+    assert summary == "Section summary."
+    assert len(fake_gemini) > 10
+    # Serial execution would take one 100 ms round trip per prompt
+    assert elapsed < 0.1 * len(fake_gemini) / 2
+
+
+def test_chunk_retries_after_rate_limit(fake_gemini, monkeypatch):
+    """Test that a rate-limited chunk call is retried by the shared LLM client."""
+    attempts = []
+
+    class Response:
+        text = "Recovered summary."
+
+    class FlakyModel:
+        async def generate_content_async(self, prompt, generation_config=None):
+            attempts.append(prompt)
+            if len(attempts) == 1:
+                raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+            return Response()
+
+    monkeypatch.setattr(llm_client, "_client", llm_client.LLMClient(max_retries=2))
+    monkeypatch.setattr(gemini_helper, "_model_cache_fresh", lambda: True)
+    monkeypatch.setattr(gemini_helper, "get_best_available_model", lambda model=None: "fake-model")
+    monkeypatch.setattr(gemini_helper, "get_generative_model", lambda name: FlakyModel())
+    monkeypatch.setattr(summary_chain, "generate_text_async", gemini_helper.generate_text_async)
+    result = asyncio.run(summary_chain._map_prompts_async(["chunk prompt"], use_cache=False))
+    assert result == ["Recovered summary."]
+    assert len(attempts) == 2
+    assert llm_client.llm_client_stats()["retries"] == {"rate_limit": 1}
+
+
+def test_failed_chunk_fails_the_summary(fake_gemini, monkeypatch):
+    """Test that a chunk summary failing after retries fails the request instead of dropping a section."""
+    async def failing_generate_async(prompt, model=None, temperature=0.4, use_cache=True):
+        if "text chunk (2/" in prompt:
+            raise RuntimeError("400 Invalid argument")
+        return "Section summary."
+
+    monkeypatch.setattr(summary_chain, "generate_text_async", failing_generate_async)
+    text = ("Revenue grew in every region this quarter. " * 70 + "\n\n") * 5
+
+    summary = asyncio.run(summary_chain.summarize_text_async(text))
+    assert summary.startswith("Error generating summary: 1 of ")
+    assert "chunk summaries failed" in summary
+
+
+def test_group_summaries_shrinks_every_level():
+    """Test that each tree-reduce level at least halves the summary count."""
+    summaries = ["x" * 1000] * 9
+    groups = summary_chain.group_summaries(summaries, max_chars=3000)
+    assert all(len(g) >= 2 for g in groups)
+    assert sum(len(g) for g in groups) == 9
+    assert len(groups) <= 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,184 @@
+"""Tests for the in-process vector indexes."""
+import tempfile
+from pathlib import Path
+import numpy as np
+import pytest
+import config
+from ingestion import bm25, vector_index, vector_store
+from ingestion.manifest import IngestionManifest
+from ingestion.metadata import MetadataColumns, build_where
+from tests.test_ingestion import FakeEmbeddings
+
+
+def _clustered(n, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dim))
+    return (centers[rng.integers(0, 16, n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def _exact(vectors, queries, k, rows=None):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    if rows is not None:
+        mask = np.full(len(vectors), -np.inf)
+        mask[rows] = 0
+        scores = scores + mask
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def test_numpy_index_is_exact():
+    """Test exact top-k and filtered search."""
+    vectors = _clustered(2000, 32)
+    queries = _clustered(20, 32, seed=1)
+    index = vector_index.NumpyIndex()
+    index.build(vectors)
+
+    indices, scores = index.search(queries, 5)
+    assert (indices == _exact(vectors, queries, 5)).all()
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+    rows = np.arange(0, 2000, 7)
+    indices, _ = index.search(queries, 5, rows)
+    assert (indices == _exact(vectors, queries, 5, rows)).all()
+
+
+def test_hnsw_recall_and_filters():
+    """Test HNSW recall against exact search, with and without filters."""
+    vectors = _clustered(3000, 32)
+    queries = _clustered(50, 32, seed=1)
+    index = vector_index.HNSWIndex(m=16, ef_construction=100, ef_search=64)
+    index.build(vectors)
+
+    indices, _ = index.search(queries, 10)
+    truth = _exact(vectors, queries, 10)
+    recall = np.mean([len(set(a) & set(b)) / 10 for a, b in zip(indices, truth)])
+    assert recall > 0.9
+
+    for rows in (np.arange(0, 3000, 2), np.arange(0, 3000, 50)):
+        indices, _ = index.search(queries, 4, rows)
+        assert set(indices.ravel()) <= set(rows)
+
+    # A large k raises ef for good; smaller queries never lower it under a concurrent search
+    index.search(queries, 100)
+    index.search(queries, 4)
+    assert index.index.ef == 100
+
+
+def test_metadata_columns_match_chroma_semantics():
+    """Test where-clause evaluation over the metadata columns."""
+    metadatas = [
+        {"company": "acme", "year": 2024, "quarter": "Q3"},
+        {"company": "acme", "year": 2025, "quarter": "Q4"},
+        {"company": "globex", "year": 2025},
+        {"source": "notes.txt"},
+    ]
+    columns = MetadataColumns(metadatas)
+
+    def rows(filters):
+        return list(columns.rows(build_where(filters)))
+
+    assert rows({"company": "Acme"}) == [0, 1]
+    assert rows({"year": {"$gte": 2025}}) == [1, 2]
+    assert rows({"quarter": ["q4", "q1"]}) == [1]
+    assert rows({"company": {"$ne": "acme"}}) == [2]
+    assert rows({"company": "acme", "year": 2025}) == [1]
+    assert rows({"company": "initech"}) == []
+    assert columns.rows(None) is None
+
+
+def _synced_chroma(tmpdir):
+    from langchain_community.vectorstores import Chroma
+
+    docs_dir = Path(tmpdir) / "documents"
+    docs_dir.mkdir()
+    (docs_dir / "acme_q3_2025.txt").write_text("Acme revenue was $10M.")
+    (docs_dir / "globex_q3_2025.txt").write_text("Globex revenue was $20M.")
+    chroma = Chroma(
+        collection_name="index_test",
+        persist_directory=str(Path(tmpdir) / "chroma"),
+        embedding_function=FakeEmbeddings()
+    )
+    manifest = IngestionManifest(str(Path(tmpdir) / "manifest.json"))
+    vector_store.sync_vector_store(chroma, str(docs_dir), manifest)
+    return chroma, docs_dir, manifest
+
+
+def test_indexed_store_serves_retrieval(monkeypatch):
+    """Test that chains retrieve through the index and sync refreshes it."""
+    from chains.qa_chain import retrieve_documents, retrieve_documents_batch
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        chroma, docs_dir, manifest = _synced_chroma(tmpdir)
+        monkeypatch.setattr(config, "VECTOR_INDEX_DIR", str(Path(tmpdir) / "index"))
+        for store_type in ("numpy", "hnsw"):
+            store = vector_index.wrap_vector_store(chroma, store_type)
+            docs = retrieve_documents(store, "revenue", k=4, filters={"company": "globex"})
+            assert [doc.metadata["source"] for doc in docs] == ["globex_q3_2025.txt"]
+            assert len(retrieve_documents(store, "revenue", k=4)) == 2
+            assert [len(hits) for hits in retrieve_documents_batch(store, ["a", "b"], k=1)] == [1, 1]
+
+        # Writes go to Chroma; a registry sync rebuilds the index
+        (docs_dir / "initech_q3_2025.txt").write_text("Initech revenue was $5M.")
+        monkeypatch.setattr(config, "INGEST_MANIFEST_PATH", manifest.path)
+        monkeypatch.setattr(config, "BM25_INDEX_PATH", str(Path(tmpdir) / "bm25"))
+        monkeypatch.setattr(bm25, "_bm25_index", None)
+        registry = vector_store.VectorStoreRegistry()
+        registry.swap(store)
+        assert registry.sync(str(docs_dir))["added"] == 1
+        assert not store.stats()["stale"]
+        assert len(retrieve_documents(store, "revenue", k=4)) == 3
+
+        # Direct writes are not indexed on the query path, only by an explicit refresh
+        store.add_texts(["Umbrella revenue was $7M."], metadatas=[{"source": "umbrella.txt"}], ids=["umbrella-0"])
+        assert store.stats()["stale"]
+        assert len(retrieve_documents(store, "revenue", k=4)) == 3
+        store.refresh()
+        assert len(retrieve_documents(store, "revenue", k=4)) == 4
+
+
+def test_from_texts_builds_an_indexed_store():
+    """Test that from_texts builds the Chroma store and serves searches through the index."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = vector_index.IndexedVectorStore.from_texts(
+            ["Acme revenue was $10M.", "Globex revenue was $20M."],
+            FakeEmbeddings(),
+            metadatas=[{"company": "acme"}, {"company": "globex"}],
+            collection_name="from_texts_test",
+            persist_directory=str(Path(tmpdir) / "chroma")
+        )
+        assert isinstance(store, vector_index.IndexedVectorStore)
+        assert store.stats()["rows"] == 2 and not store.stats()["stale"]
+        docs = store.similarity_search("revenue", k=2, filter={"company": "globex"})
+        assert [doc.metadata["company"] for doc in docs] == ["globex"]
+
+
+def test_snapshot_is_mapped_and_swapped(monkeypatch):
+    """Test that workers map a matching snapshot and pick up newly published ones."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        chroma, docs_dir, manifest = _synced_chroma(tmpdir)
+        monkeypatch.setattr(config, "VECTOR_INDEX_DIR", str(Path(tmpdir) / "index"))
+        monkeypatch.setattr(config, "VECTOR_SNAPSHOT_CHECK_INTERVAL", 0)
+        signature = {"value": manifest.signature()}
+
+        first = vector_index.wrap_vector_store(chroma, "numpy", signature_fn=lambda: signature["value"])
+        assert isinstance(first.index.vectors, np.memmap)
+        version = first.stats()["snapshot"]
+
+        # A second worker maps the published snapshot instead of reading Chroma
+        second = vector_index.wrap_vector_store(chroma, "numpy", signature_fn=lambda: signature["value"])
+        assert second.stats()["snapshot"] == version and second.stats()["last_build_ms"] is None
+        assert second.similarity_search("revenue", k=1, filter={"company": "acme"})[0].metadata["company"] == "acme"
+
+        # The first worker rebuilds after new writes; the second swaps to it on its next search
+        (docs_dir / "initech_q3_2025.txt").write_text("Initech revenue was $5M.")
+        vector_store.sync_vector_store(chroma, str(docs_dir), manifest)
+        signature["value"] = manifest.signature()
+        first.refresh()
+        assert first.stats()["snapshot"] != version
+        assert len(second.similarity_search("revenue", k=4)) == 3
+        assert second.stats()["snapshot"] == first.stats()["snapshot"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
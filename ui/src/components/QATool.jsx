@@ -1,6 +1,7 @@
 import React, { useState } from 'react'
 import axios from 'axios'
 import toast from 'react-hot-toast'
+import { postEventStream } from '../utils/eventStream'
 
 function QATool({ autonomous = true }) {
   const [question, setQuestion] = useState('')
@@ -21,11 +22,8 @@ function QATool({ autonomous = true }) {
     setSourceDocs([])
 
     try {
-      const endpoint = autonomous ? '/api/v1/auto' : '/api/v1/qa'
-      const payload = autonomous ? { question } : { question }
-      const response = await axios.post(endpoint, payload)
-
       if (autonomous) {
+        const response = await axios.post('/api/v1/auto', { question })
         const route = response.data.route
         if (route === 'qa') {
           setAnswer(response.data.result.answer)
@@ -40,8 +38,14 @@ function QATool({ autonomous = true }) {
           setAnswer('Unknown route response')
         }
       } else {
-        setAnswer(response.data.answer)
-        setSourceDocs(response.data.source_documents || [])
+        // Stream sources first, then the answer as it is generated
+        let streamError = null
+        await postEventStream('/api/v1/qa/stream', { question }, (event, data) => {
+          if (event === 'sources') setSourceDocs(data || [])
+          else if (event === 'token') setAnswer((prev) => prev + data)
+          else if (event === 'error') streamError = data
+        })
+        if (streamError) throw new Error(streamError)
       }
       toast.success('Question answered successfully!')
     } catch (error) {
@@ -102,7 +106,7 @@ function QATool({ autonomous = true }) {
         </button>
       </form>
 
-      {loading && (
+      {loading && !answer && (
         <div className="flex flex-col items-center justify-center py-12 space-y-4">
           <div className="relative">
             <div className="w-16 h-16 border-4 border-blue-200 border-t-blue-600 rounded-full animate-spin"></div>
@@ -114,7 +118,7 @@ function QATool({ autonomous = true }) {
         </div>
       )}
 
-      {answer && !loading && (
+      {answer && (
         <div className="mt-8 space-y-6 animate-fade-in">
           <div className="bg-gradient-to-br from-blue-50 to-indigo-50 rounded-2xl p-6 border-2 border-blue-100">
             <div className="flex items-center space-x-2 mb-4">
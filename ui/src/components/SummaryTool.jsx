@@ -1,6 +1,7 @@
 import React, { useState } from 'react'
 import axios from 'axios'
 import toast from 'react-hot-toast'
+import { postEventStream } from '../utils/eventStream'
 
 function SummaryTool({ autonomous = true }) {
   const [text, setText] = useState('')
@@ -19,11 +20,8 @@ function SummaryTool({ autonomous = true }) {
     setSummary('')
 
     try {
-      const endpoint = autonomous ? '/api/v1/auto' : '/api/v1/summary'
-      const payload = autonomous ? { text } : { text: text, max_length: 500 }
-      const response = await axios.post(endpoint, payload)
-
       if (autonomous) {
+        const response = await axios.post('/api/v1/auto', { text })
         const route = response.data.route
         if (route === 'summary') {
           setSummary(response.data.result.summary)
@@ -35,7 +33,13 @@ function SummaryTool({ autonomous = true }) {
           setSummary('Unknown route response')
         }
       } else {
-        setSummary(response.data.summary)
+        // Stream the summary as it is generated
+        let streamError = null
+        await postEventStream('/api/v1/summary/stream', { text: text, max_length: 500 }, (event, data) => {
+          if (event === 'token') setSummary((prev) => prev + data)
+          else if (event === 'error') streamError = data
+        })
+        if (streamError) throw new Error(streamError)
       }
       toast.success('Summary generated successfully!')
     } catch (error) {
@@ -150,7 +154,7 @@ function SummaryTool({ autonomous = true }) {
         </button>
       </form>
 
-      {loading && (
+      {loading && !summary && (
         <div className="flex flex-col items-center justify-center py-12 space-y-4">
           <div className="relative">
             <div className="w-16 h-16 border-4 border-purple-200 border-t-purple-600 rounded-full animate-spin"></div>
@@ -162,7 +166,7 @@ function SummaryTool({ autonomous = true }) {
         </div>
       )}
 
-      {summary && !loading && (
+      {summary && (
         <div className="mt-8 animate-fade-in">
           <div className="bg-gradient-to-br from-purple-50 to-pink-50 rounded-2xl p-6 border-2 border-purple-100">
             <div className="flex items-center space-x-2 mb-4">
@@ -0,0 +1,45 @@
+// POST a JSON payload and read a Server-Sent Events response.
+// EventSource only supports GET, so the stream is parsed from fetch().
+export async function postEventStream(url, payload, onEvent) {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(payload),
+  })
+
+  if (!response.ok) {
+    let detail = response.statusText
+    try {
+      detail = (await response.json()).detail || detail
+    } catch (_) {
+      // Non-JSON error body
+    }
+    throw new Error(detail)
+  }
+
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  const dispatch = (block) => {
+    let event = 'message'
+    const dataLines = []
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim()
+      else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim())
+    }
+    if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')))
+  }
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      dispatch(buffer.slice(0, boundary))
+      buffer = buffer.slice(boundary + 2)
+    }
+  }
+  if (buffer.trim()) dispatch(buffer)
+}
@@ -0,0 +1,151 @@
+"""Async execution helpers that keep blocking work off the event loop."""
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+import config
+
+# Bounded pool for CPU-bound embedding / vector search work
+_embedding_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_embedding_executor() -> ThreadPoolExecutor:
+    """Get or create the bounded embedding worker pool."""
+    global _embedding_executor
+    if _embedding_executor is None:
+        with _executor_lock:
+            if _embedding_executor is None:
+                _embedding_executor = ThreadPoolExecutor(
+                    max_workers=max(1, config.EMBEDDING_WORKERS),
+                    thread_name_prefix="embedding"
+                )
+    return _embedding_executor
+
+
+def process_context():
+    """Multiprocessing context for worker pools (and queues shared with their workers)."""
+    # forkserver avoids forking a parent that already runs model / gRPC threads
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+
+
+def new_process_pool(workers: int, initializer: Callable = None, initargs: tuple = ()) -> ProcessPoolExecutor:
+    """Create a process pool for CPU-bound pure-Python work (parsing, chunking)."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=process_context(), initializer=initializer, initargs=initargs)
+
+
+async def run_in_embedding_pool(fn: Callable, *args, **kwargs) -> Any:
+    """Run CPU-bound work (sentence-transformers encoding, vector search) in the embedding pool."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (the metrics endpoint label) into the worker, as asyncio.to_thread does
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_embedding_executor(), functools.partial(context.run, fn, *args, **kwargs))
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run blocking I/O in the default thread pool."""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+async def map_in_order(fn: Callable[[Any], Awaitable[Any]], items: Iterable[Any], limit: int) -> AsyncIterator[Any]:
+    """
+    Run fn over items with at most limit calls in flight, yielding results in input order.
+    
+    A call that raises yields its exception in place of a result, so one bad
+    item does not stop the rest. Unfinished calls are cancelled if the
+    consumer stops early (e.g. the client disconnects).
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+    
+    async def run(item):
+        async with semaphore:
+            return await fn(item)
+    
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        for task in tasks:
+            try:
+                yield await task
+            except Exception as e:
+                yield e
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def shutdown_executors() -> None:
+    """Shut down worker pools (called on application shutdown)."""
+    global _embedding_executor
+    with _executor_lock:
+        if _embedding_executor is not None:
+            _embedding_executor.shutdown(wait=False)
+            _embedding_executor = None
+
+
+class EndpointLimiter:
+    """
+    Per-endpoint concurrency limits.
+    
+    Requests beyond an endpoint's limit wait for a slot instead of piling more
+    concurrent Gemini calls onto the worker. Semaphores are kept per event
+    loop because asyncio primitives cannot be shared across loops.
+    """
+    
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = dict(limits)
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._in_flight = {name: 0 for name in self.limits}
+        self._waiting = {name: 0 for name in self.limits}
+        self._completed = {name: 0 for name in self.limits}
+    
+    def _semaphore(self, name: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        per_loop = self._semaphores.get(loop)
+        if per_loop is None:
+            per_loop = {n: asyncio.Semaphore(max(1, limit)) for n, limit in self.limits.items()}
+            self._semaphores[loop] = per_loop
+        return per_loop[name]
+    
+    @asynccontextmanager
+    async def limit(self, name: str):
+        """Hold one of the endpoint's slots for the duration of the block."""
+        semaphore = self._semaphore(name)
+        self._waiting[name] += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[name] -= 1
+        self._in_flight[name] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[name] -= 1
+            self._completed[name] += 1
+            semaphore.release()
+    
+    def stats(self) -> dict:
+        """Limit, in-flight, waiting and completed counts per endpoint."""
+        return {
+            name: {
+                "limit": self.limits[name],
+                "in_flight": self._in_flight[name],
+                "waiting": self._waiting[name],
+                "completed": self._completed[name],
+            }
+            for name in self.limits
+        }
+
+
+endpoint_limiter = EndpointLimiter({
+    "qa": config.QA_MAX_CONCURRENCY,
+    "summary": config.SUMMARY_MAX_CONCURRENCY,
+    "extract": config.EXTRACT_MAX_CONCURRENCY,
+    "auto": config.AUTO_MAX_CONCURRENCY,
+    "batch": config.BATCH_MAX_CONCURRENCY,
+})
@@ -1,8 +1,18 @@
 """Guardrails for prompt injection detection."""
+import json
+import os
 import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from fastapi import HTTPException
 import config
 
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
 
 # Common prompt injection patterns
 INJECTION_PATTERNS = [
@@ -37,6 +47,221 @@ BLOCK_PATTERNS = [
 ]
 
 
+# The only non-ASCII characters that IGNORECASE matches against ASCII letters;
+# folding them keeps the literal prefilter exact for Unicode input
+_ASCII_CASE_FOLD = {"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"}
+
+
+def _fold(text: str) -> str:
+    """Lowercase text so every IGNORECASE match of an ASCII literal is a substring match."""
+    if not text.isascii():
+        # str.translate is slow on large strings; replace only what is present
+        for char, ascii_char in _ASCII_CASE_FOLD.items():
+            if char in text:
+                text = text.replace(char, ascii_char)
+    return text.lower()
+
+
+class GuardrailMatch(NamedTuple):
+    """Which rule matched, and the text it matched."""
+    rule_set: str
+    rule_id: str
+    pattern: str
+    matched: str
+
+
+class _Rule:
+    def __init__(self, rule_id: str, pattern: str):
+        self.rule_id = rule_id
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.IGNORECASE)
+        self.triggers = _required_literals(pattern)
+
+
+def _required_literals(pattern: str) -> Tuple[str, ...]:
+    """
+    Lowercase literals of which at least one occurs in every match of pattern.
+    
+    An empty tuple means no such literal was found and the rule always runs.
+    """
+    try:
+        options = _literal_options(sre_parse.parse(pattern, re.IGNORECASE))
+    except Exception:
+        return ()
+    if not options or not all(option.isascii() for option in options):
+        return ()
+    return tuple(option.lower() for option in options)
+
+
+def _literal_options(subpattern) -> Optional[List[str]]:
+    # Best "one of these literals is required" set in a parsed sequence:
+    # the longest run of literals, or the required literals of a group/branch
+    best = None
+    run = []
+    
+    def consider(options):
+        nonlocal best
+        if options and (best is None or min(map(len, options)) > min(map(len, best))):
+            best = options
+    
+    for op, av in list(subpattern) + [(None, None)]:
+        if op == sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            consider(["".join(run)])
+            run = []
+        if op == sre_parse.SUBPATTERN:
+            consider(_literal_options(av[-1]))
+        elif op == sre_parse.BRANCH:
+            branches = [_literal_options(branch) for branch in av[1]]
+            if all(branches):
+                consider([option for options in branches for option in options])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            consider(_literal_options(av[2]))
+    return best
+
+
+class GuardrailEngine:
+    """
+    Precompiled guardrail rules with a literal prefilter.
+    
+    Each rule set (e.g. "injection", "block") is a list of regexes matched
+    case-insensitively. For every rule the literals that any match must
+    contain are derived from the parsed pattern; a check case-folds the
+    input once, tests those literals with fast substring searches and only
+    runs the regexes whose literals are present.
+    
+    Rule sets can be hot-reloaded from a JSON file mapping set names to
+    lists of patterns (strings or {"id": ..., "pattern": ...} objects).
+    """
+    
+    def __init__(self, rule_sets: Dict[str, list], rules_file: Optional[str] = None, reload_interval: float = 2.0):
+        self.rules_file = rules_file
+        self.reload_interval = reload_interval
+        self._defaults = rule_sets
+        self._rule_sets = self._compile(rule_sets)
+        self._lock = threading.Lock()
+        self._file_mtime = None
+        self._next_reload_check = 0.0
+        self._stats = {"checks": 0, "matches": 0, "regex_runs": 0, "reloads": 0, "reload_errors": 0}
+        self._rule_hits: Dict[str, int] = {}
+        if rules_file:
+            self.reload_if_changed(force=True)
+    
+    @staticmethod
+    def _compile(rule_sets: Dict[str, list]) -> Dict[str, List[_Rule]]:
+        compiled = {}
+        for name, patterns in rule_sets.items():
+            rules = []
+            for i, entry in enumerate(patterns):
+                if isinstance(entry, dict):
+                    rules.append(_Rule(entry.get("id") or f"{name}:{i}", entry["pattern"]))
+                else:
+                    rules.append(_Rule(f"{name}:{i}", entry))
+            compiled[name] = rules
+        return compiled
+    
+    def match(self, rule_set: str, text: str) -> Optional[GuardrailMatch]:
+        """
+        Find the first rule in rule_set that matches text.
+        
+        Args:
+            rule_set: Rule set name, e.g. "injection" or "block".
+            text: Input to check.
+        
+        Returns:
+            The matching rule, or None.
+        """
+        self.reload_if_changed()
+        rules = self._rule_sets.get(rule_set, [])
+        self._stats["checks"] += 1
+        if not text or not rules:
+            return None
+        
+        lowered = _fold(text)
+        for rule in rules:
+            if rule.triggers and not any(t in lowered for t in rule.triggers):
+                continue
+            self._stats["regex_runs"] += 1
+            found = rule.regex.search(text)
+            if found:
+                self._stats["matches"] += 1
+                self._rule_hits[rule.rule_id] = self._rule_hits.get(rule.rule_id, 0) + 1
+                return GuardrailMatch(rule_set, rule.rule_id, rule.pattern, found.group(0))
+        return None
+    
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Reload rules from rules_file if its mtime changed (checked at most every reload_interval)."""
+        if not self.rules_file:
+            return False
+        now = time.monotonic()
+        if not force and now < self._next_reload_check:
+            return False
+        with self._lock:
+            self._next_reload_check = now + self.reload_interval
+            try:
+                mtime = os.stat(self.rules_file).st_mtime_ns
+            except OSError:
+                return False
+            if not force and mtime == self._file_mtime:
+                return False
+            try:
+                with open(self.rules_file, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                # Sets missing from the file keep the built-in rules
+                self._rule_sets = self._compile({**self._defaults, **loaded})
+            except Exception as e:
+                self._stats["reload_errors"] += 1
+                print(f"⚠️  Could not load guardrail rules from {self.rules_file}: {str(e)}")
+                return False
+            finally:
+                self._file_mtime = mtime
+            self._stats["reloads"] += 1
+            print(f"🛡️  Loaded guardrail rules from {self.rules_file}")
+            return True
+    
+    def stats(self) -> dict:
+        """Check/match counters, hits per rule and rule counts per set."""
+        return {
+            **self._stats,
+            "rules": {name: len(rules) for name, rules in self._rule_sets.items()},
+            "rule_hits": dict(self._rule_hits),
+        }
+
+
+_engine: Optional[GuardrailEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_guardrail_engine() -> GuardrailEngine:
+    """Get or create the shared guardrail engine."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = GuardrailEngine(
+                    {"injection": INJECTION_PATTERNS, "block": BLOCK_PATTERNS},
+                    rules_file=config.GUARDRAIL_RULES_FILE or None,
+                    reload_interval=config.GUARDRAIL_RELOAD_INTERVAL
+                )
+    return _engine
+
+
+def guardrail_stats() -> dict:
+    return get_guardrail_engine().stats()
+
+
+def find_prompt_injection(text: str) -> Optional[GuardrailMatch]:
+    """Return the injection rule that matches text, or None."""
+    return get_guardrail_engine().match("injection", text)
+
+
+def find_blocked_pattern(prompt: str) -> Optional[GuardrailMatch]:
+    """Return the block rule that matches prompt, or None."""
+    return get_guardrail_engine().match("block", prompt)
+
+
 def check_prompt_injection(text: str) -> bool:
     """
     Check if text contains potential prompt injection patterns.
@@ -47,16 +272,7 @@ def check_prompt_injection(text: str) -> bool:
     Returns:
         True if injection pattern detected, False otherwise.
     """
-    if not text:
-        return False
-    
-    text_lower = text.lower()
-    
-    for pattern in INJECTION_PATTERNS:
-        if re.search(pattern, text_lower, re.IGNORECASE):
-            return True
-    
-    return False
+    return find_prompt_injection(text) is not None
 
 
 def is_prompt_safe(prompt: str) -> bool:
@@ -64,12 +280,7 @@ def is_prompt_safe(prompt: str) -> bool:
     Lightweight safety check against explicit block patterns.
     Returns False if a known dangerous signature is detected.
     """
-    if not prompt:
-        return True
-    for pattern in BLOCK_PATTERNS:
-        if re.search(pattern, prompt, re.IGNORECASE):
-            return False
-    return True
+    return find_blocked_pattern(prompt) is None
 
 
 def validate_input(text: str, input_type: str = "query") -> None:
@@ -92,7 +303,9 @@ def validate_input(text: str, input_type: str = "query") -> None:
             detail=f"{input_type.capitalize()} cannot be empty."
         )
     
-    if check_prompt_injection(text):
+    injection = find_prompt_injection(text)
+    if injection:
+        print(f"🛡️  Guardrails blocked {input_type} input (rule {injection.rule_id}: {injection.matched[:50]!r})")
         raise HTTPException(
             status_code=403,
             detail="Input contains potentially malicious patterns. Request blocked by guardrails."
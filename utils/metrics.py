@@ -0,0 +1,326 @@
+"""Request-stage timing spans, counters and a Prometheus text exposition."""
+import contextvars
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Upper bounds in seconds; spans range from sub-millisecond lookups to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Endpoint of the request being served; copied into worker threads with the context
+_endpoint = contextvars.ContextVar("metrics_endpoint", default="none")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramChild:
+    """Bucket counts, sum and count for one label combination."""
+
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Cumulative bucket counts (last one is +Inf, i.e. the total count) and the sum."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _Family:
+    """A metric with a fixed set of label names; children are created on first use and cached."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._new_child()
+                    self._children[values] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Family):
+    """Monotonic counter family."""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._items()
+        ]
+
+
+class Histogram(_Family):
+    """Histogram family with fixed bucket bounds (seconds)."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) per label combination."""
+        totals = {}
+        for values, child in self._items():
+            cumulative, total = child.snapshot()
+            totals[values] = (cumulative[-1], total)
+        return totals
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._items():
+            cumulative, total = child.snapshot()
+            for bound, count in zip(self.buckets + (float("inf"),), cumulative):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {count}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+
+    def register(self, family: _Family) -> _Family:
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Drop every recorded sample (used by tests)."""
+        for family in self._families.values():
+            family.clear()
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_duration_seconds", "Time spent in one stage of a request.", ("endpoint", "stage")
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "rag_request_duration_seconds", "End-to-end request latency by response status.", ("endpoint", "status")
+)
+LLM_CALLS = REGISTRY.counter(
+    "rag_llm_calls_total", "Gemini calls by outcome (ok, error, cached).", ("endpoint", "outcome")
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result (hit, miss).", ("cache", "result")
+)
+ERRORS = REGISTRY.counter(
+    "rag_errors_total", "Exceptions raised inside a stage.", ("endpoint", "stage")
+)
+LLM_RETRIES = REGISTRY.counter(
+    "rag_llm_retries_total", "Gemini call attempts retried, by error class.", ("endpoint", "error")
+)
+
+
+class span:
+    """
+    Time a block of work as one stage of the current request.
+
+    The duration lands in rag_stage_duration_seconds under the endpoint set
+    by MetricsMiddleware; an exception leaving the block also counts in
+    rag_errors_total. Costs about a microsecond, so it can wrap hot paths.
+    """
+
+    __slots__ = ("_stage", "_start")
+
+    def __init__(self, stage: str):
+        self._stage = stage
+
+    def __enter__(self) -> "span":
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        elapsed = perf_counter() - self._start
+        endpoint = _endpoint.get()
+        STAGE_SECONDS.labels(endpoint, self._stage).observe(elapsed)
+        if exc_type is not None:
+            ERRORS.labels(endpoint, self._stage).inc()
+        return False
+
+
+def current_endpoint() -> str:
+    return _endpoint.get()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that labels the request's spans with its endpoint and times the request.
+
+    The endpoint label is the path below ``prefix`` with slashes as
+    underscores ("/api/v1/qa/stream" -> "qa_stream"); paths not in
+    ``endpoints`` are labelled "other" to keep label values bounded. The
+    request is timed until its last body chunk is sent, so streamed
+    responses count in full, and labelled with the response status code.
+    """
+
+    def __init__(self, app, prefix: str = "", endpoints: Iterable[str] = ()):
+        self.app = app
+        self.prefix = prefix.rstrip("/")
+        self.endpoints = {self.prefix + path for path in endpoints}
+
+    def endpoint_label(self, path: str) -> str:
+        if path not in self.endpoints:
+            return "other"
+        return path[len(self.prefix):].strip("/").replace("/", "_") or "root"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self.endpoint_label(scope["path"])
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        token = _endpoint.set(endpoint)
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.labels(endpoint, status).observe(perf_counter() - started)
+            _endpoint.reset(token)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record a duration measured outside a span (e.g. time queued for an LLM slot)."""
+    STAGE_SECONDS.labels(_endpoint.get(), stage).observe(seconds)
+
+
+def record_llm_retry(error_class: str) -> None:
+    LLM_RETRIES.labels(_endpoint.get(), error_class).inc()
+
+
+def record_llm_call(outcome: str) -> None:
+    LLM_CALLS.labels(_endpoint.get(), outcome).inc()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def record_cache_lookups(cache: str, hits: int, misses: int) -> None:
+    """Count several lookups at once (e.g. one per re-ranked pair)."""
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    return REGISTRY.render()